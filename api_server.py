@@ -0,0 +1,248 @@
+# api_server.py
+# Read-only JSON API over job health, for tooling that would otherwise scrape the report:
+#   python api_server.py --port 8788
+#   curl 'http://localhost:8788/api/jobs?repo=containers/urunc&intent=REQUIRED'
+# Endpoints (all GET):
+#   /api/jobs            one summary per job (?repo=, ?intent=)
+#   /api/jobs/history    one job's runs, newest first, and its daily trend (?job=, ?repo=, ?limit=, ?days=)
+#   /api/tiers           jobs, passing, failing and flaky jobs per tier (?repo=)
+#   /api/pr              each repository's latest mainline commit and PR, and the suspected
+#                        PRs of every job failing there (see regressions.py) (?repo=)
+# Every response carries a strong ETag derived from the database's data version, so a
+# polling client sends If-None-Match and gets a 304 until something is written.
+import argparse
+import json
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, parse_qsl
+import metrics
+from cache import TTLCache
+from config import (
+    API_PORT, API_POOL_SIZE, API_CACHE_MAX_ENTRIES, API_CACHE_TTL_SECONDS, API_HISTORY_MAX_RUNS,
+    DEFAULT_REPOSITORY
+)
+from database import init_db, ReadOnlyPool, query_job_overview, query_job_runs, query_rollups
+from flakiness import assess
+from normalizer import INTENT_ORDER, get_intent_label
+from regressions import find_all_suspects, latest_integrations
+
+# data_version restarts with every process, so ETags carry the process' start time too
+BOOT_ID = f"{time.time_ns():x}"
+ENDPOINTS = {}  # path -> render(conn, query, now)
+
+class ApiError(Exception):
+    """A request the API cannot answer; becomes a JSON error response with `status`."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def endpoint(path):
+    def register(render):
+        ENDPOINTS[path] = render
+        return render
+    return register
+
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+def _int_param(query, name, default, maximum=None):
+    try:
+        value = int(_param(query, name, default))
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    if value < 1:
+        raise ApiError(400, f"{name} must be positive")
+    return min(value, maximum) if maximum else value
+
+def _job_summaries(conn, query, now):
+    """query_job_overview rows as summaries, filtered by ?repo= and ?intent=."""
+    repo, intent = _param(query, "repo"), _param(query, "intent")
+    for job in query_job_overview(conn):
+        label = get_intent_label(job['name'])[0]
+        if (repo and job['repo'] != repo) or (intent and label != intent):
+            continue
+        flakiness = assess(job['outcomes'], job['flaky_commits'], job['last_flake_epoch'], now)
+        yield {
+            "repo": job['repo'],
+            "job_name": job['job_name'],
+            "workflow": job['name'],
+            "intent": label,
+            "last_conclusion": job['last_conclusion'],
+            "last_run_id": job['last_run_id'],
+            "last_run_url": job['url'],
+            "last_created_at": job['created_at'],
+            "branch": job['branch'],
+            "recent": job['recent'],
+            "stability": round(job['recent_successes'] / len(job['recent']), 3) if job['recent'] else None,
+            "total_runs": job['total_runs'],
+            "total_successes": job['total_successes'],
+            "flakiness": {
+                "flaky": flakiness.flaky,
+                "flip_rate": round(flakiness.flip_rate, 3),
+                "failure_rate": round(flakiness.failure_rate, 3),
+                "runs": flakiness.runs,
+                "flaky_commits": flakiness.flaky_commits,
+            },
+        }
+
+@endpoint("/api/jobs")
+def jobs(conn, query, now):
+    return {"jobs": list(_job_summaries(conn, query, now))}
+
+@endpoint("/api/jobs/history")
+def job_history(conn, query, now):
+    job_name = _param(query, "job")
+    if not job_name:
+        raise ApiError(400, "job is required")
+    repo = _param(query, "repo", DEFAULT_REPOSITORY)
+    limit = _int_param(query, "limit", 50, API_HISTORY_MAX_RUNS)
+    days = _int_param(query, "days", 30)
+    runs = query_job_runs(conn, repo, job_name, limit)
+    if not runs:
+        raise ApiError(404, f"no runs of {job_name} in {repo}")
+    daily = query_rollups(conn, 'daily', since_epoch=now - days * 86400, jobs=[(repo, job_name)])
+    return {
+        "repo": repo,
+        "job_name": job_name,
+        "runs": [dict(run) for run in runs],
+        "daily": [dict(bucket) for bucket in daily],
+    }
+
+@endpoint("/api/tiers")
+def tiers(conn, query, now):
+    counts = {label: {"intent": label, "jobs": 0, "passing": 0, "failing": 0, "flaky": 0} for label in INTENT_ORDER}
+    for job in _job_summaries(conn, {"repo": query.get("repo")}, now):
+        tier = counts[job["intent"]]
+        tier["jobs"] += 1
+        tier["passing"] += job["last_conclusion"] == "success"
+        tier["failing"] += job["last_conclusion"] == "failure"
+        tier["flaky"] += job["flakiness"]["flaky"]
+    return {"tiers": [tier for tier in counts.values() if tier["jobs"]]}
+
+def _pull(pull):
+    return pull._asdict() if pull else None
+
+@endpoint("/api/pr")
+def latest_pr(conn, query, now):
+    repo = _param(query, "repo")
+    mainline = [
+        {
+            "repo": integration.repo,
+            "commit": integration.commit._asdict(),
+            "pr": _pull(integration.pull),
+            "ci_impact": integration.ci_impact,
+        }
+        for integration in latest_integrations(conn) if not repo or integration.repo == repo
+    ]
+    suspects = [
+        {
+            "repo": suspects.repo,
+            "job_name": suspects.job_name,
+            "first_failing_sha": suspects.fail_sha,
+            "last_passing_sha": suspects.pass_sha,
+            "first_failing_run_url": suspects.fail_url,
+            "commits": [commit.sha for commit in suspects.commits],
+            "prs": [_pull(pull) for pull in suspects.pulls],
+        }
+        for suspects in find_all_suspects(conn) if not repo or suspects.repo == repo
+    ]
+    return {"mainline": mainline, "suspects": suspects}
+
+class ApiHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so polling clients reuse their connection; without TCP_NODELAY the body,
+    # written after the headers, would wait out the client's delayed ACK on every response
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    # Set by serve()
+    pool = None
+    cache = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _version(self):
+        """
+        The state every response is derived from: the database's data version, and the
+        day (history windows and the flakiness lookback move daily).
+        """
+        return self.pool.data_version(), int(time.time()) // 86400
+
+    def _send(self, status, etag=None, body=None):
+        self.send_response(status)
+        if etag:
+            self.send_header("ETag", etag)
+            # Cached copies must be revalidated, which is what the 304s are for
+            self.send_header("Cache-Control", "no-cache")
+        if body is not None:
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body is not None:
+            self.wfile.write(body)
+
+    def _render(self, render, query, day):
+        with metrics.span(f"api.{render.__name__}"):
+            with self.pool.connection() as conn:
+                # Evaluated as of the end of the day, so a response never changes under its ETag
+                payload = render(conn, query, (day + 1) * 86400)
+        return json.dumps(payload, separators=(",", ":")).encode()
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip("/")
+        render = ENDPOINTS.get(path)
+        if render is None:
+            metrics.incr("api_requests_total", endpoint="none", status=404)
+            return self._send(404, body=b'{"error":"not found"}')
+
+        version = self._version()
+        etag = f'"{BOOT_ID}.{".".join(f"{part:x}" for part in version)}"'
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            metrics.incr("api_requests_total", endpoint=render.__name__, status=304)
+            return self._send(304, etag)
+
+        # Keyed on the version, so entries of older versions just age out of the LRU
+        key = (version, path, tuple(sorted(parse_qsl(parsed.query))))
+        try:
+            body = self.cache.get_or_compute(
+                key, lambda: self._render(render, parse_qs(parsed.query), version[1])
+            )
+        except ApiError as e:
+            metrics.incr("api_requests_total", endpoint=render.__name__, status=e.status)
+            return self._send(e.status, body=json.dumps({"error": str(e)}).encode())
+        metrics.incr("api_requests_total", endpoint=render.__name__, status=200)
+        self._send(200, etag, body)
+
+def serve(port=API_PORT, pool_size=API_POOL_SIZE):
+    """Starts the API on a background thread. Returns (server, url)."""
+    handler = type("BoundHandler", (ApiHandler,), {
+        "pool": ReadOnlyPool(pool_size),
+        "cache": TTLCache(maxsize=API_CACHE_MAX_ENTRIES, ttl=API_CACHE_TTL_SECONDS),
+    })
+    server = ThreadingHTTPServer(("", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://localhost:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only JSON API over job health")
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    metrics.configure("api_server")
+    # Read-only connections cannot create or migrate the database
+    init_db()
+    server, url = serve(args.port)
+    print(f"Serving the JSON API at {url}/api/jobs")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    while not stopping.wait(60):
+        metrics.flush()
+    server.shutdown()
+    metrics.flush()
@@ -0,0 +1,331 @@
+# benchmark.py
+# Micro-benchmarks for the pipeline, run against a throwaway database:
+#   python benchmark.py ingest --rows 100000
+#   python benchmark.py summary --jobs 1000 --runs-per-job 1000
+#   python benchmark.py normalize --rows 1000000
+#   python benchmark.py snapshot --rows 1000000
+#   python benchmark.py pipeline --scales 10000,100000,1000000 --output bench.json
+#   python benchmark.py startup
+#   python benchmark.py api --rows 100000 --clients 8
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+import database
+
+def synthetic_runs(count, start_id=1):
+    """Yields `count` GitHub-shaped job rows spread over a handful of jobs."""
+    base = datetime(2026, 1, 1)
+    jobs = ["unit-test (amd64)", "unit-test (arm64)", "lint", "e2e (fedora)", "build (amd64)", "benchmarks"]
+    for i in range(count):
+        run_id = start_id + i
+        created_at = (base + timedelta(minutes=run_id)).isoformat()
+        yield {
+            "id": run_id,
+            "name": "CI",
+            "job_name": jobs[i % len(jobs)],
+            "status": "completed",
+            "conclusion": "failure" if i % 7 == 0 else "success",
+            "created_at": created_at,
+            "updated_at": created_at,
+            "head_sha": f"{run_id:040x}",
+            "head_branch": "main",
+            "html_url": f"https://github.com/containers/urunc/actions/runs/{run_id}",
+        }
+
+def _timed(label, rows, fn):
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {rows:>9,} rows  {elapsed:8.3f}s  {rows / elapsed:>12,.0f} rows/s  {result}")
+    return elapsed
+
+def _save_one_by_one(runs):
+    for run in runs:
+        database.save_run(run)
+
+def bench_ingest(rows=100_000, single_rows=2_000):
+    """Times save_runs on a fresh and on an already-populated table, against the per-row save_run."""
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        _timed("save_runs (insert)", rows, lambda: database.save_runs(synthetic_runs(rows)))
+        _timed("save_runs (unchanged)", rows, lambda: database.save_runs(synthetic_runs(rows)))
+        _timed("save_run loop (insert)", single_rows,
+               lambda: _save_one_by_one(synthetic_runs(single_rows, start_id=rows + 1)))
+
+def _synthetic_frame(jobs, runs_per_job):
+    import numpy as np
+    import pandas as pd
+
+    n = jobs * runs_per_job
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        "job_name": np.repeat([f"job-{j:04d}" for j in range(jobs)], runs_per_job),
+        "created_epoch": np.tile(np.arange(runs_per_job, dtype=np.int64) * 60, jobs),
+        "conclusion": np.where(rng.random(n) < 0.15, "failure", "success"),
+        "intent": "CI",
+    })
+
+def _summarize_per_tile(df, history=5, window=10):
+    """The dashboard's previous per-tile filtering loop, kept as the baseline."""
+    out = []
+    for job in df.sort_values("created_epoch", ascending=False)["job_name"].unique():
+        j_data = df[df["job_name"] == job].sort_values("created_epoch", ascending=False)
+        rate = int((j_data.head(window)["conclusion"] == "success").mean() * 100)
+        out.append((job, j_data.iloc[0]["conclusion"], j_data.head(history)["conclusion"].tolist(), rate))
+    return out
+
+def bench_summary(jobs=1_000, runs_per_job=1_000, loop_jobs=100):
+    """Times summarize_jobs against the per-tile loop (the loop runs on the first `loop_jobs` jobs)."""
+    from normalizer import summarize_jobs
+
+    df = _synthetic_frame(jobs, runs_per_job)
+    _timed("summarize_jobs", len(df), lambda: f"{len(summarize_jobs(df))} jobs")
+    subset = df[df["job_name"] < f"job-{loop_jobs:04d}"]
+    _timed("per-tile loop", len(subset), lambda: f"{len(_summarize_per_tile(subset))} jobs")
+
+def bench_normalize(rows=1_000_000):
+    """Times rule-engine categorization against the per-row apply, and the memory categoricals save."""
+    import pandas as pd
+    from normalizer import get_intent_label, normalize_workflow_data
+
+    df = pd.DataFrame(synthetic_runs(rows))
+    df["name"] = df["job_name"]
+    df["branch"] = df["head_branch"]
+    plain = df.copy()
+    _timed("apply per row", rows, lambda: len(plain["name"].apply(lambda n: get_intent_label.__wrapped__(n))))
+    _timed("normalize_workflow_data", rows, lambda: len(normalize_workflow_data(df)))
+
+    cols = ["intent", "conclusion", "branch", "status"]
+    plain["intent"] = df["intent"].astype(str)
+    before = plain[cols].memory_usage(deep=True, index=False).sum()
+    after = df[cols].memory_usage(deep=True, index=False).sum()
+    print(f"{'label columns memory':<28} {before / 2**20:8.1f} MiB -> {after / 2**20:.1f} MiB")
+
+def bench_snapshot(rows=1_000_000):
+    """Times a cold full-history load from SQLite against the memory-mapped snapshot."""
+    import snapshot
+    from normalizer import normalize_workflow_data
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_PATH = os.path.join(tmp, "bench.db")
+        database.init_db()
+        database.save_runs(synthetic_runs(rows))
+        path = os.path.join(tmp, "snapshot")
+        _timed("read_sql + normalize", rows, lambda: len(normalize_workflow_data(database.get_all_runs())))
+        _timed("export_snapshot", rows, lambda: snapshot.export_snapshot(path))
+        _timed("load_snapshot", rows, lambda: len(snapshot.load_snapshot(path)))
+        database.save_runs(synthetic_runs(1_000, start_id=rows + 1))
+        with database.get_db_connection() as conn:
+            _timed("load_snapshot + delta", rows, lambda: len(snapshot.load_snapshot(path, conn=conn)))
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_pipeline(scales=(10_000, 100_000, 1_000_000), output=None, seed=0):
+    """
+    Times every pipeline stage on seeded workloads of each size (in runs) and returns
+    the results; with `output`, also writes them as JSON for comparing revisions.
+    """
+    import dashboard_data
+    import export_report
+    from normalizer import INTENT_ORDER, normalize_workflow_data
+    from notifier import evaluate_alerts
+    from workload import generate_runs
+
+    results = []
+    cwd = os.getcwd()
+    for scale in scales:
+        # 4 workflows x 5 jobs, so a scale is 20 jobs with scale / 20 runs each
+        shape = dict(repos=1, workflows=4, jobs=5)
+        runs_per_job = max(scale // 20, 1)
+        rows = 20 * runs_per_job
+        print(f"--- {rows:,} runs ---")
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                database.DB_PATH = os.path.join(tmp, "bench.db")
+                database.init_db()
+                dashboard_data.clear_cache()
+
+                def stage(name, fn):
+                    elapsed = _timed(name, rows, fn)
+                    results.append({"scale": rows, "stage": name, "seconds": round(elapsed, 6),
+                                    "rows_per_second": round(rows / elapsed, 1)})
+
+                stage("ingest", lambda: database.save_runs(generate_runs(**shape, runs_per_job=runs_per_job, seed=seed)))
+
+                def evaluate():
+                    with database.immediate_transaction() as conn:
+                        return f"{len(evaluate_alerts(conn))} alerts"
+                stage("notifier evaluation", evaluate)
+                stage("dashboard data prep", lambda: f"{len(dashboard_data.load_job_summaries(INTENT_ORDER))} jobs")
+                raw = database.get_all_runs()
+                stage("normalize_workflow_data", lambda: len(normalize_workflow_data(raw)))
+                stage("export_report.generate", lambda: export_report.generate(force=True))
+                dashboard_data.clear_cache()
+            finally:
+                os.chdir(cwd)
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": int(time.time()),
+        "seed": seed,
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    return report
+
+def _api_load(url, paths, clients, requests_per_client, conditional):
+    """Requests/s of `clients` keep-alive clients cycling through `paths`."""
+    import requests
+    etags = {}
+    for path in paths:
+        etags[path] = requests.get(url + path, timeout=10).headers.get("ETag")
+    statuses = {}
+    lock = threading.Lock()
+
+    def client():
+        session = requests.Session()
+        seen = {}
+        for i in range(requests_per_client):
+            path = paths[i % len(paths)]
+            headers = {"If-None-Match": etags[path]} if conditional else {}
+            status = session.get(url + path, headers=headers, timeout=10).status_code
+            seen[status] = seen.get(status, 0) + 1
+        with lock:
+            for status, count in seen.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return clients * requests_per_client / (time.perf_counter() - start), statuses
+
+def bench_api(rows=100_000, clients=8, requests_per_client=250):
+    """
+    Serves api_server from a workload database and measures requests/s with cached
+    responses and with If-None-Match revalidations (304s). The clients share the
+    server's process, so this understates what the server alone sustains.
+    """
+    import requests
+    import api_server
+    from workload import generate_runs
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            database.DB_PATH = os.path.join(tmp, "bench.db")
+            database.init_db()
+            database.save_runs(generate_runs(repos=1, workflows=4, jobs=5, runs_per_job=max(rows // 20, 1)))
+            server, url = api_server.serve(port=0)
+            with database.get_db_connection() as conn:
+                repo, job_name = conn.execute("SELECT repo, job_name FROM job_health LIMIT 1").fetchone()
+            paths = ["/api/jobs", "/api/tiers", "/api/pr", f"/api/jobs/history?repo={repo}&job={job_name}&limit=100"]
+
+            for path in paths:
+                # Nothing is cached yet: this renders the response
+                start = time.perf_counter()
+                requests.get(url + path, timeout=10).raise_for_status()
+                print(f"{'uncached ' + path.split('?')[0]:<40} {(time.perf_counter() - start) * 1000:8.1f} ms")
+            for label, conditional in (("cached 200s", False), ("If-None-Match 304s", True)):
+                rate, statuses = _api_load(url, paths, clients, requests_per_client, conditional)
+                print(f"{label:<40} {rate:8,.0f} req/s  ({clients} clients)  {statuses}")
+            server.shutdown()
+        finally:
+            os.chdir(cwd)
+
+# Import-time budgets (ms) of the command-line entry points. None of them may load pandas
+# or numpy; those belong to the dashboard (dashboard_data, snapshot) only.
+STARTUP_BUDGETS_MS = {
+    "database": 25,
+    "notifier": 40,
+    "export_report": 40,
+    "collector": 150,  # requests alone is ~80 ms
+    "webhook_server": 200,
+    "daemon": 200,
+    "api_server": 80,
+}
+HEAVY_MODULES = ("pandas", "numpy")
+
+def _import_profile(module):
+    """Runs `python -X importtime -c "import <module>"` in a fresh interpreter. Returns (ms, imported names)."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    ).stderr
+    cumulative, names = None, set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, total, name = line.split("|")
+        names.add(name.strip())
+        if name.strip() == module:
+            cumulative = int(total) / 1000
+    return cumulative, names
+
+def bench_startup(budgets=STARTUP_BUDGETS_MS, repeat=5):
+    """
+    Measures each entry point's import time (best of `repeat` fresh interpreters, after
+    one warm-up run that writes the bytecode cache) and checks it against its budget.
+    Returns the modules over budget or loading pandas/numpy.
+    """
+    failed = []
+    for module, budget in budgets.items():
+        _, names = _import_profile(module)
+        best = min(_import_profile(module)[0] for _ in range(repeat))
+        heavy = [name for name in HEAVY_MODULES if name in names]
+        ok = best <= budget and not heavy
+        if not ok:
+            failed.append(module)
+        note = f"  loads {', '.join(heavy)}" if heavy else ""
+        print(f"{module:<16} {best:8.1f} ms  (budget {budget} ms)  {'ok' if ok else 'OVER'}{note}")
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="urunc CI pipeline benchmarks")
+    parser.add_argument("suite", choices=["ingest", "summary", "normalize", "snapshot", "pipeline", "startup", "api"])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--jobs", type=int, default=1_000)
+    parser.add_argument("--runs-per-job", type=int, default=1_000)
+    parser.add_argument("--scales", default="10000,100000,1000000", help="Comma-separated run counts")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent API clients")
+    parser.add_argument("--output", help="Write the pipeline results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.suite == "ingest":
+        bench_ingest(args.rows)
+    elif args.suite == "summary":
+        bench_summary(args.jobs, args.runs_per_job)
+    elif args.suite == "normalize":
+        bench_normalize(args.rows)
+    elif args.suite == "snapshot":
+        bench_snapshot(args.rows)
+    elif args.suite == "pipeline":
+        bench_pipeline([int(scale) for scale in args.scales.split(",")], args.output)
+    elif args.suite == "startup":
+        sys.exit(1 if bench_startup() else 0)
+    elif args.suite == "api":
+        bench_api(args.rows, args.clients)
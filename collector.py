@@ -1,37 +1,444 @@
 # collector.py
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
-import os
-from config import RUNS_ENDPOINT, GITHUB_TOKEN, TARGET_WORKFLOWS
-from database import init_db, save_run
+from requests.adapters import HTTPAdapter
+import metrics
+from config import (
+    GITHUB_API_BASE, GITHUB_TOKEN, TARGET_WORKFLOWS, RUNS_PER_PAGE, MAX_PAGES_PER_POLL, RERUN_CHECK_STATUSES,
+    JOB_FETCH_CONCURRENCY, RATE_LIMIT_BURST, RATE_LIMIT_RESERVE_FRACTION,
+    MAX_RETRIES, RETRY_BACKOFF_SECONDS, RETRY_MAX_SLEEP_SECONDS,
+    DEFAULT_REPOSITORY, REPOSITORIES, REPO_POLL_CONCURRENCY,
+    MAINLINE_BRANCH, COMMITS_PER_PAGE, MAX_COMMIT_PAGES_PER_POLL
+)
+from database import (
+    init_db, save_runs, get_pending_runs, get_sync_state, get_http_validators,
+    get_commit_positions, save_commits, get_commits_without_pulls, save_commit_pulls
+)
 
-def fetch_workflow_runs():
-    """Fetches latest workflow runs from GitHub Actions API."""
-    headers = {}
+# Statuses worth retrying: secondary rate limits (403/429) and transient server errors
+RETRY_STATUSES = {403, 429, 500, 502, 503, 504}
+# Advances once per collect_repositories call, rotating which repositories go first
+_rotation = itertools.count()
+
+def runs_endpoint(repo):
+    """The Actions runs endpoint of an "owner/name" repository."""
+    return f"{GITHUB_API_BASE}/repos/{repo}/actions/runs"
+
+class RateLimiter:
+    """
+    Token bucket driven by GitHub's X-RateLimit-* headers.
+    Allows bursts of up to `burst` requests, then paces the remaining budget
+    evenly until the reset time, always keeping `reserve_fraction` of the limit aside.
+    Once the reset time passes the window's budget is back in full, so the bucket
+    starts over from `burst` until the next response tells it better.
+    """
+
+    def __init__(self, burst=RATE_LIMIT_BURST, reserve_fraction=RATE_LIMIT_RESERVE_FRACTION):
+        self.burst = burst
+        self.reserve_fraction = reserve_fraction
+        self.tokens = float(burst)
+        self.rate = float(burst)  # tokens/second until the first response tells us better
+        self.reset_at = None  # Epoch the current window resets at, once a response said so
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        if self.reset_at is not None and time.time() >= self.reset_at:
+            self.tokens, self.rate, self.reset_at = float(self.burst), float(self.burst), None
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self):
+        """Blocks until a request may be sent."""
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate if self.rate > 0 else RETRY_MAX_SLEEP_SECONDS
+                if self.reset_at is not None:
+                    # An exhausted budget comes back at the reset, not a token at a time
+                    wait = min(wait, max(0.0, self.reset_at - time.time()))
+            time.sleep(min(wait, RETRY_MAX_SLEEP_SECONDS))
+
+    def refund(self):
+        """Gives back the token of a request GitHub did not charge for (a 304 Not Modified)."""
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+    def update(self, headers):
+        """Re-derives the refill rate from the budget left in the current window."""
+        remaining = headers.get("X-RateLimit-Remaining")
+        reset = headers.get("X-RateLimit-Reset")
+        if remaining is None or reset is None:
+            return
+        reserve = int(int(headers.get("X-RateLimit-Limit") or 0) * self.reserve_fraction)
+        spendable = max(0, int(remaining) - reserve)
+        seconds_left = max(1.0, int(reset) - time.time())
+        with self.lock:
+            self._refill()
+            self.reset_at = int(reset)
+            self.rate = spendable / seconds_left
+            self.tokens = min(self.tokens, spendable)
+
+def create_session(pool_size=JOB_FETCH_CONCURRENCY):
+    """Returns a keep-alive session whose connection pool fits the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_auth_headers():
+    """Returns the common GitHub API headers, with auth if a token is configured."""
+    headers = {"Accept": "application/vnd.github+json"}
     if GITHUB_TOKEN:
         headers["Authorization"] = f"token {GITHUB_TOKEN}"
-    
-    print(f"Fetching runs from {RUNS_ENDPOINT}...")
-    try:
-        response = requests.get(RUNS_ENDPOINT, headers=headers, params={"per_page": 50})
+    return headers
+
+def _retry_delay(response, attempt):
+    """Honours Retry-After / an exhausted rate limit, else exponential backoff with jitter."""
+    if response is not None:
+        if response.headers.get("Retry-After"):
+            return min(RETRY_MAX_SLEEP_SECONDS, float(response.headers["Retry-After"]))
+        if response.headers.get("X-RateLimit-Remaining") == "0" and response.headers.get("X-RateLimit-Reset"):
+            return min(RETRY_MAX_SLEEP_SECONDS, max(0, int(response.headers["X-RateLimit-Reset"]) - time.time()))
+    return min(RETRY_MAX_SLEEP_SECONDS, RETRY_BACKOFF_SECONDS * 2 ** attempt * (0.5 + random.random()))
+
+def request_with_retry(session, url, limiter=None, headers=None, stream=False):
+    """
+    GETs a URL, retrying with backoff on 403/429/5xx and connection errors. With `stream`
+    the body is left unread for the caller (iter_content), who must close the response.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if limiter:
+            limiter.acquire()
+        response = None
+        start = time.perf_counter()
+        try:
+            response = session.get(url, headers=headers or get_auth_headers(), timeout=30, stream=stream)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            metrics.record_http(time.perf_counter() - start, e.__class__.__name__, url)
+            if attempt == MAX_RETRIES:
+                raise
+        else:
+            metrics.record_http(time.perf_counter() - start, response.status_code, url)
+            metrics.record_rate_limit(response.headers)
+            if limiter:
+                limiter.update(response.headers)
+                if response.status_code == 304:
+                    # Conditional hits are free, so idle polls of many repositories cost no budget
+                    limiter.refund()
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response
+            response.close()
+        metrics.incr("http_retries_total")
+        time.sleep(_retry_delay(response, attempt))
+
+@metrics.timed("collect.page")
+def fetch_page(session, url, limiter=None):
+    """
+    GETs one page of results as a conditional request.
+    A 304 Not Modified answer is returned as-is: it does not count against the rate limit.
+    """
+    headers = get_auth_headers()
+    etag, last_modified = get_http_validators(url)
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+
+    response = request_with_retry(session, url, limiter, headers)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return response
+
+def job_to_row(run, job):
+    """Flattens a job from the /jobs endpoint into the row shape save_run expects."""
+    return {
+        "id": job["id"],
+        "run_id": run["id"],
+        "name": run["name"],
+        "job_name": job["name"],
+        "status": job["status"],
+        "conclusion": job["conclusion"],
+        "created_at": job.get("created_at") or job.get("started_at") or run["created_at"],
+        "updated_at": job.get("completed_at") or job.get("started_at") or run["updated_at"],
+        "head_sha": job.get("head_sha") or run.get("head_sha", ""),
+        "head_branch": run.get("head_branch", ""),
+        "html_url": job.get("html_url") or run["html_url"],
+        "repository": run.get("repository"),
+    }
+
+def fetch_run_jobs(session, run, limiter=None, endpoint=None):
+    """Fetches every job of one workflow run, following pagination."""
+    url = run.get("jobs_url") or f"{endpoint or runs_endpoint(DEFAULT_REPOSITORY)}/{run['id']}/jobs"
+    url = f"{url}?per_page=100"
+    jobs = []
+    while url:
+        response = request_with_retry(session, url, limiter)
         response.raise_for_status()
-        data = response.json()
-        
-        runs = data.get("workflow_runs", [])
-        print(f"Found {len(runs)} runs.")
-        
-        for run in runs:
-            # Filter by workflow name if specified in config
-            if TARGET_WORKFLOWS and run["name"] not in TARGET_WORKFLOWS:
+        jobs.extend(response.json().get("jobs", []))
+        url = response.links.get("next", {}).get("url")
+    return [job_to_row(run, job) for job in jobs]
+
+def fetch_jobs(runs, session, limiter=None, endpoint=None, concurrency=JOB_FETCH_CONCURRENCY):
+    """
+    Fans job-list requests out over a bounded thread pool sharing one session.
+    Returns {run_id: [job rows]}; runs whose jobs could not be fetched map to None.
+    """
+    def fetch(run):
+        try:
+            return run["id"], fetch_run_jobs(session, run, limiter, endpoint)
+        except requests.exceptions.RequestException as e:
+            print(f"Error fetching jobs for run {run['id']}: {e}")
+            return run["id"], None
+
+    if not runs:
+        return {}
+    with metrics.span("collect.jobs"), ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return dict(pool.map(fetch, runs))
+
+def commit_to_row(commit):
+    """Flattens a commit from the /commits endpoint into the row shape save_commits expects."""
+    parents = commit.get("parents") or []
+    return {
+        "sha": commit["sha"],
+        "parent_sha": parents[0]["sha"] if parents else None,
+        "committed_at": commit["commit"]["committer"]["date"],
+        "author": (commit.get("author") or {}).get("login") or commit["commit"]["author"]["name"],
+        "title": commit["commit"]["message"].split("\n", 1)[0],
+        "url": commit["html_url"],
+    }
+
+def fetch_commit_pulls(session, repo, sha, limiter=None):
+    """The merged PRs GitHub associates with a mainline commit (one API call)."""
+    response = request_with_retry(session, f"{GITHUB_API_BASE}/repos/{repo}/commits/{sha}/pulls", limiter)
+    response.raise_for_status()
+    return [{
+        "number": pull["number"],
+        "title": pull["title"],
+        "author": (pull.get("user") or {}).get("login"),
+        "merged_at": pull["merged_at"],
+        "url": pull["html_url"],
+    } for pull in response.json() if pull.get("merged_at")]
+
+@metrics.timed("collect.commits")
+def fetch_commits(repo, session, limiter=None, concurrency=JOB_FETCH_CONCURRENCY):
+    """
+    Incrementally syncs the first-parent history of MAINLINE_BRANCH: pages back from the
+    head (conditionally, so an unchanged branch costs nothing) until a stored commit is
+    reached, then stores the new commits in order and fetches their PRs concurrently.
+    Returns the number of new commits.
+    """
+    url = f"{GITHUB_API_BASE}/repos/{repo}/commits?sha={MAINLINE_BRANCH}&per_page={COMMITS_PER_PAGE}"
+    fetched, head, stored, pages, validators = {}, None, {}, 0, []
+    while url and pages < MAX_COMMIT_PAGES_PER_POLL:
+        response = fetch_page(session, url, limiter)
+        pages += 1
+        if response.status_code == 304:
+            break
+        page = response.json()
+        head = head or (page[0]["sha"] if page else None)
+        fetched.update((commit["sha"], commit) for commit in page)
+        validators.append((url, response.headers.get("ETag"), response.headers.get("Last-Modified")))
+        stored = get_commit_positions(repo, list(fetched))
+        if not page or stored:
+            break
+        url = response.links.get("next", {}).get("url")
+
+    # Walk the first-parent chain back from the head to the first stored commit
+    chain, sha = [], head
+    while sha in fetched and sha not in stored:
+        chain.append(commit_to_row(fetched[sha]))
+        sha = chain[-1]["parent_sha"]
+    chain.reverse()
+    if chain or validators:
+        # The pages' validators go in with their commits: a page only answers 304 once they are stored
+        save_commits(repo, chain, stored.get(sha), validators)
+
+    shas = get_commits_without_pulls(repo)
+    if shas:
+        def fetch(sha):
+            try:
+                return sha, fetch_commit_pulls(session, repo, sha, limiter)
+            except requests.exceptions.RequestException as e:
+                print(f"Error fetching PRs of commit {sha[:7]}: {e}")
+                return sha, None
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pulls = dict(pool.map(fetch, shas))
+        save_commit_pulls(repo, {sha: found for sha, found in pulls.items() if found is not None})
+    return len(chain)
+
+def _pending_run_stubs(endpoint, repo):
+    """Rebuilds minimal run payloads for stored runs that have not finished yet."""
+    return [{
+        "id": run.workflow_run_id,
+        "name": run.name,
+        "created_at": run.created_at,
+        "updated_at": run.updated_at,
+        "head_sha": run.commit_sha,
+        "head_branch": run.branch,
+        "html_url": run.url,
+        "jobs_url": f"{endpoint}/{run.workflow_run_id}/jobs",
+        "repository": repo,
+    } for run in get_pending_runs(repo)]
+
+@metrics.timed("collect")
+def fetch_workflow_runs(repo=DEFAULT_REPOSITORY, session=None, limiter=None):
+    """
+    Incrementally fetches the workflow runs of one "owner/name" repository from the
+    GitHub Actions API.
+
+    Follows `Link` pagination from the newest run until it reaches runs that were
+    already ingested (the stored high-water mark), then fetches the job lists of
+    new or still-running runs concurrently and saves one row per job.
+    The run list is ordered by creation, so a run re-run after the walk passed it is
+    only found through the RERUN_CHECK_STATUSES listings (one conditional page each):
+    a re-run queued and finished entirely between two polls, or one beyond the newest
+    RUNS_PER_PAGE runs of a status, is missed.
+    Returns per-poll stats.
+    """
+    session = session or create_session()
+    limiter = limiter or RateLimiter()
+    endpoint = runs_endpoint(repo)
+    high_water, last_run_id = get_sync_state(endpoint)
+    stats = {
+        "pages": 0, "not_modified": 0, "rows_changed": 0, "jobs_fetched": 0, "commits_fetched": 0,
+        "rate_limit_remaining": None
+    }
+    new_high_water, new_last_run_id = high_water, last_run_id
+    changed_runs = []
+    # Stored with the runs by save_runs, so a poll that fails part-way is retried in full
+    validators = []
+
+    url = f"{endpoint}?per_page={RUNS_PER_PAGE}"
+    print(f"Fetching runs from {endpoint} (cursor: {high_water or 'none'})...")
+    try:
+        while url and stats["pages"] < MAX_PAGES_PER_POLL:
+            response = fetch_page(session, url, limiter)
+            stats["pages"] += 1
+            stats["rate_limit_remaining"] = response.headers.get("X-RateLimit-Remaining")
+            if response.status_code == 304:
+                # Unchanged since the last poll, so nothing older changed either
+                stats["not_modified"] += 1
+                break
+
+            runs = response.json().get("workflow_runs", [])
+            for run in runs:
+                if high_water and run["updated_at"] <= high_water:
+                    continue
+                if new_high_water is None or run["updated_at"] > new_high_water:
+                    new_high_water = run["updated_at"]
+                if new_last_run_id is None or run["id"] > new_last_run_id:
+                    new_last_run_id = run["id"]
+
+                # Filter by workflow name if specified in config
+                if TARGET_WORKFLOWS and run["name"] not in TARGET_WORKFLOWS:
+                    continue
+                changed_runs.append({**run, "repository": repo})
+
+            validators.append((url, response.headers.get("ETag"), response.headers.get("Last-Modified")))
+
+            # Runs are listed newest first: once a page reaches the cursor, the rest is already stored
+            if not runs or (high_water and runs[-1]["created_at"] <= high_water):
+                break
+            url = response.links.get("next", {}).get("url")
+
+        # Older runs that were re-run: they become pending runs, followed until they finish.
+        # They do not move the cursor, which only tracks the walk above.
+        walked = {run["id"] for run in changed_runs}
+        for status in RERUN_CHECK_STATUSES:
+            url = f"{endpoint}?status={status}&per_page={RUNS_PER_PAGE}"
+            response = fetch_page(session, url, limiter)
+            stats["pages"] += 1
+            if response.status_code == 304:
+                stats["not_modified"] += 1
                 continue
-            
-            save_run(run)
-            print(f"Saved run {run['id']} ({run['name']}): {run['conclusion']}")
-            
+            for run in response.json().get("workflow_runs", []):
+                if run["id"] not in walked and (not TARGET_WORKFLOWS or run["name"] in TARGET_WORKFLOWS):
+                    walked.add(run["id"])
+                    changed_runs.append({**run, "repository": repo})
+            validators.append((url, response.headers.get("ETag"), response.headers.get("Last-Modified")))
+
+        # Jobs of runs that were still going last time may have finished since
+        seen = {run["id"] for run in changed_runs}
+        job_targets = changed_runs + [run for run in _pending_run_stubs(endpoint, repo) if run["id"] not in seen]
+        jobs_by_run = fetch_jobs(job_targets, session, limiter, endpoint)
+
+        rows, incomplete = [], False
+        for run in job_targets:
+            job_rows = jobs_by_run.get(run["id"])
+            if job_rows:
+                stats["jobs_fetched"] += len(job_rows)
+                rows.extend(job_rows)
+            elif job_rows is None and run["id"] in seen:
+                # Its jobs could not be fetched: keep the pages and cursor, so the next poll retries it
+                incomplete = True
+            elif run["id"] in seen:
+                # No job list available: fall back to a run-level row (save_runs drops it once jobs appear)
+                rows.append(run)
+        # Oldest first, so job_health can fold each run forward instead of replaying history
+        rows.reverse()
+        if incomplete:
+            validators, new_high_water = [], high_water
+        sync_state = (endpoint, new_high_water, new_last_run_id) if new_high_water != high_water else None
+        counts = save_runs(rows, validators, sync_state)
+        stats["rows_changed"] = counts["inserted"] + counts["updated"]
+        print(f"Saved {len(job_targets)} runs: {counts['inserted']} rows inserted, {counts['updated']} updated")
+
+        stats["commits_fetched"] = fetch_commits(repo, session, limiter)
+
     except requests.exceptions.RequestException as e:
         print(f"Error fetching data from GitHub: {e}")
-        if response.status_code == 403:
+        if e.response is not None and e.response.status_code == 403:
             print("Tip: You might be rate-limited. Set a GITHUB_TOKEN in config.py or environment.")
 
+    print(
+        f"Poll complete{'' if repo == DEFAULT_REPOSITORY else f' for {repo}'}: "
+        f"{stats['pages']} pages ({stats['not_modified']} not modified), "
+        f"{stats['jobs_fetched']} jobs fetched, {stats['rows_changed']} rows changed, "
+        f"{stats['commits_fetched']} new commits, rate limit remaining: {stats['rate_limit_remaining']}"
+    )
+    return stats
+
+def collect_repositories(repos=REPOSITORIES, session=None, limiter=None, concurrency=REPO_POLL_CONCURRENCY):
+    """
+    Polls every repository, `concurrency` at a time, under one shared session and rate
+    limiter, so the whole fleet spends a single API budget. Scheduling is fair: each
+    repository in flight gets the same job-fetch concurrency and is capped at
+    MAX_PAGES_PER_POLL, and the start of the order rotates every call, so when the
+    budget runs short it is never the same repositories that wait.
+    Returns the per-poll stats summed over all repositories.
+    """
+    repos = list(repos)
+    session = session or create_session(JOB_FETCH_CONCURRENCY * min(concurrency, len(repos)))
+    limiter = limiter or RateLimiter()
+    if len(repos) == 1:
+        return fetch_workflow_runs(repos[0], session, limiter)
+
+    offset = next(_rotation) % len(repos)
+    ordered = repos[offset:] + repos[:offset]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda repo: fetch_workflow_runs(repo, session, limiter), ordered))
+
+    total = {
+        key: sum(stats[key] for stats in results)
+        for key in ("pages", "not_modified", "rows_changed", "jobs_fetched", "commits_fetched")
+    }
+    remaining = [int(stats["rate_limit_remaining"]) for stats in results if stats["rate_limit_remaining"] is not None]
+    total["rate_limit_remaining"] = min(remaining) if remaining else None
+    print(f"Polled {len(repos)} repositories: {total['rows_changed']} rows changed, "
+          f"rate limit remaining: {total['rate_limit_remaining']}")
+    return total
+
 if __name__ == "__main__":
+    metrics.configure("collector")
     init_db()
-    fetch_workflow_runs()
+    collect_repositories()
@@ -3,16 +3,81 @@ import os
 # config.py
 # Configuration settings for the urunc CI Dashboard
 
-# Target Repository
+# Target Repository (the default; rows stored before multi-repo support belong to it)
 REPO_OWNER = "containers"
 REPO_NAME = "urunc"
+DEFAULT_REPOSITORY = f"{REPO_OWNER}/{REPO_NAME}"
+# Repositories to collect, as "owner/name" (comma-separated in the REPOSITORIES env var)
+REPOSITORIES = [repo.strip() for repo in os.getenv("REPOSITORIES", DEFAULT_REPOSITORY).split(",") if repo.strip()]
 
 # GitHub API Settings
-GITHUB_API_BASE = "https://api.github.com"
-RUNS_ENDPOINT = f"{GITHUB_API_BASE}/repos/{REPO_OWNER}/{REPO_NAME}/actions/runs"
+# Override GITHUB_API_BASE to point the collector at a local stand-in (see mock_server.py)
+GITHUB_API_BASE = os.getenv("GITHUB_API_BASE", "https://api.github.com")
+
+# Incremental Collection
+# Pages are followed only until already-ingested runs are reached, capped per poll
+RUNS_PER_PAGE = 100
+MAX_PAGES_PER_POLL = 10
+# Re-runs keep their created_at, so older runs are also listed by these statuses every poll
+RERUN_CHECK_STATUSES = ["queued", "in_progress"]
+
+# Job-level ingestion: job lists are fetched concurrently over one pooled session
+JOB_FETCH_CONCURRENCY = int(os.getenv("JOB_FETCH_CONCURRENCY", "8"))
+# Repositories polled at once; they share one session and one rate-limit budget
+REPO_POLL_CONCURRENCY = int(os.getenv("REPO_POLL_CONCURRENCY", "4"))
+RATE_LIMIT_BURST = 100      # Requests allowed back-to-back before pacing kicks in
+RATE_LIMIT_RESERVE_FRACTION = 0.02  # Share of X-RateLimit-Limit kept aside for the next poll
+MAX_RETRIES = 4
+RETRY_BACKOFF_SECONDS = 1.0
+RETRY_MAX_SLEEP_SECONDS = 60
+
+# Mainline commits: collected with the runs (first-parent order, with their PRs), so a job
+# failing on MAINLINE_BRANCH is bisected to the PRs merged since it last passed
+MAINLINE_BRANCH = os.getenv("MAINLINE_BRANCH", "main")
+COMMITS_PER_PAGE = 100
+MAX_COMMIT_PAGES_PER_POLL = 3       # A first sync reaches back this many pages
 
 # Local Database Settings
 DB_PATH = "urunc_ci.db"
+DB_SYNCHRONOUS = "NORMAL"       # Safe with WAL: a crash can only lose the last commits, never corrupt
+DB_CACHE_SIZE_KB = 64 * 1024    # Page cache per connection
+DB_BULK_CHUNK_SIZE = 500        # Rows per executemany batch in save_runs
+JOB_HEALTH_WINDOW = 10          # Recent conclusions kept per job in job_health
+FLAKINESS_WINDOW = 30           # Recent conclusions flip/failure rates are scored over (flakiness.py)
+# Raw runs older than this are compacted into the hourly/daily rollups (0 keeps everything)
+RUN_RETENTION_DAYS = int(os.getenv("RUN_RETENTION_DAYS", "180"))
+HOURLY_ROLLUP_RETENTION_DAYS = 90   # Daily rollups are kept forever
+SNAPSHOT_DIR = "snapshot"           # Memory-mapped columnar copy of workflow_runs (snapshot.py)
+
+# Instrumentation (metrics.py): off unless set; .prom files and runs.jsonl are written here
+METRICS_DIR = os.getenv("METRICS_DIR")
+
+# Daemon (daemon.py): poll interval while runs are queued/in progress, and the idle
+# interval it backs off from (doubling per quiet cycle up to the max)
+DAEMON_ACTIVE_INTERVAL_SECONDS = int(os.getenv("DAEMON_ACTIVE_INTERVAL_SECONDS", "30"))
+DAEMON_IDLE_INTERVAL_SECONDS = int(os.getenv("DAEMON_IDLE_INTERVAL_SECONDS", "120"))
+DAEMON_MAX_INTERVAL_SECONDS = int(os.getenv("DAEMON_MAX_INTERVAL_SECONDS", "1800"))
+DAEMON_LOCK_FILE = "daemon.lock"  # Held while running, so a second daemon (or cron) cannot overlap
+
+# Webhook receiver (webhook_server.py): GitHub pushes workflow_run/workflow_job events
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # NO fallback - unsigned deliveries are rejected
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8787"))
+WEBHOOK_BATCH_SIZE = 200                # Events written per save_runs transaction
+WEBHOOK_BATCH_WAIT_SECONDS = 1.0        # How long the writer gathers a batch after its first event
+WEBHOOK_DELIVERY_RETENTION_DAYS = 7     # Delivery ids remembered for dedupe
+WEBHOOK_RETRY_ATTEMPTS = 5              # Retries of a batch that failed to write (backoff as RETRY_BACKOFF_SECONDS)
+
+# JSON API (api_server.py): read-only, responses cached per database version
+API_PORT = int(os.getenv("API_PORT", "8788"))
+API_POOL_SIZE = 8                   # Read-only connections shared by request threads
+API_CACHE_MAX_ENTRIES = 256         # Rendered responses kept in memory
+API_CACHE_TTL_SECONDS = 300
+API_HISTORY_MAX_RUNS = 500          # Upper bound for /api/jobs/history?limit=
+
+# Dashboard Data Layer (query results cached per database version)
+DASHBOARD_CACHE_TTL_SECONDS = 300
+DASHBOARD_CACHE_MAX_ENTRIES = 32
+DASHBOARD_DEFAULT_WINDOW_DAYS = 7
 
 # Notification Settings
 LAST_NOTIFIED_FILE = "last_notified.txt"
@@ -20,6 +85,33 @@ SENDER_EMAIL = "your-email@example.com" # Placeholder
 RECEIVER_EMAIL = "maintainer@example.com" # Placeholder
 # Slack webhook URL (required for local notifications, not deployed)
 SLACK_WEBHOOK_URL = os.getenv("SLACK_WEBHOOK_URL")  # NO fallback - secure by default
+# Digest mode coalesces all alerts of one evaluation cycle into a single Slack message
+SLACK_DIGEST = os.getenv("SLACK_DIGEST", "1") == "1"
+
+# Flakiness (flakiness.py): a job is flaky when its pass/fail flip rate over the last
+# FLAKINESS_WINDOW runs is high, or when one commit both passed and failed it recently
+FLAKY_FLIP_RATE = 0.3               # Share of consecutive pass/fail runs that flipped
+FLAKY_MIN_RUNS = 5                  # Pass/fail runs needed before the flip rate counts
+FLAKY_COMMIT_LOOKBACK_DAYS = 14
+# Failures of flaky jobs: "downgrade" alerts them as FLAKY JOB FAILURE, "suppress" waits
+# until they fail FLAKY_CONFIRM_STREAK times in a row, "off" alerts them like any other job
+FLAKY_ALERT_POLICY = os.getenv("FLAKY_ALERT_POLICY", "downgrade")
+FLAKY_CONFIRM_STREAK = 3
+
+# Failure logs (failure_logs.py): logs of failed jobs are reduced to the failing step and a
+# normalized error signature for alerts. Downloading them needs a token with actions:read,
+# so this is on by default only when GITHUB_TOKEN is set.
+FAILURE_LOGS = os.getenv("FAILURE_LOGS", "1" if os.getenv("GITHUB_TOKEN") else "0") == "1"
+LOG_CACHE_DIR = os.getenv("LOG_CACHE_DIR", "log_cache")
+LOG_CACHE_MAX_MB = int(os.getenv("LOG_CACHE_MAX_MB", "512"))  # Least recently used logs are evicted beyond this
+LOG_FETCH_LOOKBACK_HOURS = int(os.getenv("LOG_FETCH_LOOKBACK_HOURS", "24"))  # Older failures are not fetched
+LOG_FETCH_MAX_JOBS = 100            # Failed jobs whose logs are fetched per notifier cycle
+
+# Alert Delivery (outbox in SQLite, retried with exponential backoff)
+NOTIFY_CONCURRENCY = 8
+NOTIFY_MAX_ATTEMPTS = 6
+NOTIFY_BACKOFF_SECONDS = 30
+NOTIFY_CLAIM_LEASE_SECONDS = 300  # A worker that dies mid-delivery releases its claims after this
 
 # Filter for Workflows (optional, set to None to fetch all)
 # Example: ["Nightly Build", "CI Integration"]
@@ -28,6 +120,15 @@ TARGET_WORKFLOWS = ["Nightly Build", "CI", "Unit Tests", "E2E test", "Lint code"
 # Required Workflows (for filtering in dashboard)
 REQUIRED_WORKFLOWS = ["CI", "E2E test", "Unit Tests"]
 
+# Job categorization: (intent, icon, keywords), first match wins. Keywords are
+# case-insensitive substrings of the workflow/job name.
+INTENT_RULES = [
+    ("REQUIRED", "🛡️", ["unit-test", "lint", "build (amd64)"]),  # Mission critical
+    ("NIGHTLY", "🌙", ["nightly", "e2e"]),                         # Stability tracking
+    ("EXPERIMENTAL", "🧪", ["arm64", "experimental", "bench"]),    # Optional
+]
+DEFAULT_INTENT = ("CI", "⚙️")
+
 # NOTE: For local development, a GITHUB_TOKEN is recommended to avoid rate limits.
 # You can set it as an environment variable: export GITHUB_TOKEN=your_token
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
@@ -0,0 +1,130 @@
+# daemon.py
+# Resident pipeline: collect -> evaluate/notify -> export in one long-lived process.
+#   python daemon.py          # run until SIGINT/SIGTERM
+#   python daemon.py --once   # a single cycle, e.g. from cron
+import argparse
+import fcntl
+import signal
+import sys
+import threading
+import time
+import metrics
+from config import (
+    DAEMON_ACTIVE_INTERVAL_SECONDS, DAEMON_IDLE_INTERVAL_SECONDS, DAEMON_MAX_INTERVAL_SECONDS,
+    DAEMON_LOCK_FILE, REPOSITORIES, REPO_POLL_CONCURRENCY, JOB_FETCH_CONCURRENCY
+)
+from database import init_db, get_pending_runs
+from collector import create_session, collect_repositories, RateLimiter
+from notifier import get_notifiers, run_notifier, dispatch_outbox
+import export_report
+
+def next_interval(active, idle_cycles, active_interval=DAEMON_ACTIVE_INTERVAL_SECONDS,
+                  idle_interval=DAEMON_IDLE_INTERVAL_SECONDS, max_interval=DAEMON_MAX_INTERVAL_SECONDS):
+    """
+    Seconds until the next poll: the tight interval while runs are queued or in progress,
+    otherwise the idle interval doubled for every consecutive quiet cycle, up to the max.
+    """
+    if active:
+        return active_interval
+    return min(max_interval, idle_interval * 2 ** min(idle_cycles, 16))
+
+class Daemon:
+    """
+    Runs pipeline cycles back to back on one thread, so a slow cycle delays the next
+    one instead of stacking on top of it. The HTTP session, rate limiter and notifier
+    plugins (with their pooled sessions) live for the whole process.
+    """
+
+    def __init__(self):
+        self.session = create_session(JOB_FETCH_CONCURRENCY * min(REPO_POLL_CONCURRENCY, len(REPOSITORIES)))
+        self.limiter = RateLimiter()
+        self.notifiers = get_notifiers()
+        self.stopping = threading.Event()
+        self.idle_cycles = 0
+        self.cycles = 0
+
+    def stop(self, signum=None, frame=None):
+        if self.stopping.is_set():
+            # Second signal: don't wait for the cycle in flight
+            raise KeyboardInterrupt
+        print("Shutdown requested, finishing the current stage...")
+        self.stopping.set()
+
+    def _stage(self, name, fn, *args, **kwargs):
+        """Runs one stage; a failing stage is logged and the cycle moves on."""
+        if self.stopping.is_set():
+            return None
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            metrics.incr("daemon_stage_errors_total", stage=name)
+            print(f"⚠️ {name} failed: {e!r}")
+            return None
+
+    def cycle(self):
+        """One pass through the pipeline. Returns the seconds to wait before the next."""
+        with metrics.span("daemon.cycle"):
+            stats = self._stage("collect", collect_repositories, session=self.session, limiter=self.limiter)
+            changed = bool(stats and stats["rows_changed"])
+            if changed or self.cycles == 0:
+                self._stage("notify", run_notifier, self.notifiers)
+                self._stage("export", export_report.generate)
+            else:
+                # Nothing new to evaluate, but earlier deliveries may be due for a retry
+                self._stage("notify", dispatch_outbox, self.notifiers)
+            active = bool(self._stage("pending", get_pending_runs))
+
+        self.cycles += 1
+        self.idle_cycles = 0 if changed or active else self.idle_cycles + 1
+        interval = next_interval(active, self.idle_cycles)
+        metrics.incr("daemon_cycles_total", changed=str(changed).lower())
+        metrics.set_gauge("daemon_poll_interval_seconds", interval)
+        metrics.flush()
+        return interval
+
+    def run(self):
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            interval = self.cycle()
+            # Measured from the start of the cycle; an overrun starts the next one right away
+            wait = max(0.0, interval - (time.monotonic() - started))
+            if not self.stopping.is_set():
+                print(f"Next poll in {wait:.0f}s")
+            self.stopping.wait(wait)
+        print("Daemon stopped.")
+
+def acquire_lock(path=DAEMON_LOCK_FILE):
+    """
+    Takes an exclusive lock on `path`, or returns None if another process holds it.
+    The lock dies with the process, so a crash never leaves it stale.
+    """
+    handle = open(path, "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the collect/notify/export pipeline continuously")
+    parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+    args = parser.parse_args()
+
+    lock = acquire_lock()
+    if lock is None:
+        print(f"Another pipeline run holds {DAEMON_LOCK_FILE}; exiting.")
+        sys.exit(1)
+
+    metrics.configure("daemon")
+    init_db()
+    daemon = Daemon()
+    if args.once:
+        daemon.cycle()
+        sys.exit(0)
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("Daemon interrupted.")
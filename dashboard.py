@@ -1,11 +1,14 @@
 # dashboard.py
 import streamlit as st
-import pandas as pd
-import json
-import os
 import time
-from database import get_all_runs
-from normalizer import normalize_workflow_data
+from html import escape
+from dashboard_data import load_latest_runs, load_job_summaries, load_trends, load_flakiness, load_mainline
+from flakiness import describe
+from regressions import describe_pull
+from config import DASHBOARD_DEFAULT_WINDOW_DAYS
+import metrics
+
+metrics.configure("dashboard")
 
 # Set page config
 st.set_page_config(page_title="urunc CI Maintainer Dashboard", layout="wide", page_icon="🛡️")
@@ -49,26 +52,38 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Data Normalization
-raw_df = get_all_runs()
-if raw_df.empty:
+# Data Normalization (cached per database version, see dashboard_data.py)
+latest_jobs = load_latest_runs()
+if latest_jobs.empty:
     st.warning("No data. Run mock_collector.py")
     st.stop()
-df = normalize_workflow_data(raw_df)
 
 # --- V7 Maintainer Context Banner ---
-if os.path.exists("latest_pr.json"):
-    with open("latest_pr.json", "r") as f: pr = json.load(f)
-    result_cls = "pr-status-fail" if pr['ci_impact'] == "FAILURE" else "success-text"
+# The newest mainline commit per repository, and the PR bisection blames for what broke
+integrations, suspects = load_mainline()
+for integration in integrations:
+    commit, pull = integration.commit, integration.pull
+    headline = f"PR #{pull.number}: {escape(pull.title)}" if pull else f"{commit.sha[:7]}: {escape(commit.title or '')}"
+    result_cls = "pr-status-fail" if integration.ci_impact == "FAILURE" else "success-text"
+    repo_label = f" · {escape(integration.repo)}" if len(integrations) > 1 else ""
+    suspect_html = ""
+    blamed = next(((pull, jobs) for repo, pull, jobs in suspects if repo == integration.repo), None)
+    if blamed:
+        suspect, jobs = blamed
+        noun = "job" if len(jobs) == 1 else "jobs"
+        suspect_html = (
+            f'<br><span style="color: #f85149; font-size: 0.85rem;">Suspected of breaking {len(jobs)} {noun}: '
+            f'{escape(describe_pull(suspect))}</span>'
+        )
     st.markdown(f"""
     <div class="maintainer-banner">
         <div>
-            <span style="color: #8b949e; font-size: 0.8rem; text-transform: uppercase;">Latest Mainline Integration</span><br>
-            <span style="font-size: 1.1rem; font-weight: 600;">PR #{pr['id']}: {pr['title']}</span>
+            <span style="color: #8b949e; font-size: 0.8rem; text-transform: uppercase;">Latest Mainline Integration{repo_label}</span><br>
+            <span style="font-size: 1.1rem; font-weight: 600;">{headline}</span>{suspect_html}
         </div>
         <div style="text-align: right;">
             <span style="color: #8b949e; font-size: 0.8rem;">CI Result</span><br>
-            <span class="{result_cls}">{pr['ci_impact']}</span>
+            <span class="{result_cls}">{integration.ci_impact}</span>
         </div>
     </div>
     """, unsafe_allow_html=True)
@@ -77,16 +92,39 @@ if os.path.exists("latest_pr.json"):
 st.sidebar.title("🛠️ View Console")
 view_type = st.sidebar.selectbox("Dashboard Style", ["Maintainer (Tiers)", "Classic (Table)"])
 
+# Repository filter, only shown when more than one repository is collected
+repositories = sorted(latest_jobs['repo'].unique().tolist())
+repo_filter = None
+if len(repositories) > 1:
+    repo_filter = st.sidebar.multiselect("Repositories", repositories, default=repositories)
+    latest_jobs = latest_jobs[latest_jobs['repo'].isin(repo_filter)]
+
 # Defensive multiselect defaults
-options = sorted(df['intent'].unique().tolist())
+options = sorted(latest_jobs['intent'].unique().tolist())
 default_selection = [v for v in ["REQUIRED", "NIGHTLY"] if v in options]
 intent_filter = st.sidebar.multiselect("Active Tiers", options, default=default_selection)
 
-filtered_df = df[df['intent'].isin(intent_filter)]
+branches = ["All"] + sorted(latest_jobs['branch'].dropna().unique().tolist())
+branch_filter = st.sidebar.selectbox("Branch", branches)
+
+windows = {"Last 24 hours": 1, "Last 7 days": 7, "Last 30 days": 30, "All time": None}
+window_filter = st.sidebar.selectbox(
+    "Time Window", list(windows), index=list(windows.values()).index(DASHBOARD_DEFAULT_WINDOW_DAYS)
+)
+
+# Flip rates and same-commit pass/fail, kept current by job_health
+flakiness = load_flakiness()
+
+# Filters are pushed down into SQL; one summary row per job
+summaries = load_job_summaries(
+    intent_filter,
+    branch=None if branch_filter == "All" else branch_filter,
+    window_days=windows[window_filter],
+    repos=repo_filter,
+)
 
 # --- Metrics ---
 st.title("🛡️ urunc Maintainer Portal")
-latest_jobs = df.sort_values('created_at').groupby('job_name').tail(1)
 total = len(latest_jobs)
 failing = (latest_jobs['conclusion'] == 'failure').sum()
 crit_fail = (latest_jobs[(latest_jobs['conclusion'] == 'failure') & (latest_jobs['intent'] == 'REQUIRED')]).shape[0]
@@ -103,40 +141,53 @@ st.markdown(f"""
 if view_type == "Maintainer (Tiers)":
     for tier in intent_filter:
         st.write(f"### {tier}")
-        tier_df = filtered_df[filtered_df['intent'] == tier]
-        job_names = tier_df['job_name'].unique()
+        tier_jobs = summaries[summaries['intent'] == tier]
         cols = st.columns(3)
         
-        for i, jn in enumerate(job_names):
-            j_data = df[df['job_name'] == jn]
-            latest = j_data.iloc[0]
-            last_5 = j_data.head(5)['conclusion'].tolist()
+        for i, latest in enumerate(tier_jobs.itertuples(index=False)):
+            jn = f"{latest.repo} · {latest.job_name}" if repo_filter is not None else latest.job_name
+            last_5 = latest.history
             
-            # Failure duration logic for UI
+            # Failure streak is part of the per-job summary
             duration_msg = ""
-            if latest['conclusion'] == 'failure':
-                from datetime import datetime
-                # Fetch duration from notifier logic if we wanted, let's just use first failure in streak
-                fails = 0
-                for c in j_data['conclusion']:
-                    if c == 'failure': fails +=1
-                    else: break
-                if fails > 1: duration_msg = f"❗ Failed {fails} runs"
+            if latest.conclusion == 'failure' and latest.streak > 1:
+                duration_msg = f"❗ Failed {latest.streak} runs"
+            flaky = flakiness.get((latest.repo, latest.job_name))
+            flaky_msg = describe(flaky) if flaky else ""
             
             with cols[i % 3]:
                 st.markdown(f"""
                 <div class="status-card tier-{tier}">
                     <p class="job-name">{jn}</p>
-                    <p style="font-size: 0.8rem; margin: 10px 0; color: {'#3fb950' if latest['conclusion'] == 'success' else '#f85149'}">
-                        <b>{latest['conclusion'].upper()}</b> {duration_msg}
+                    <p style="font-size: 0.8rem; margin: 10px 0; color: {'#3fb950' if latest.conclusion == 'success' else '#f85149'}">
+                        <b>{latest.conclusion.upper()}</b> {duration_msg}
                     </p>
                     <div class="history-text">
                         {" ".join(['✅' if x == 'success' else '❌' for x in last_5])}
                     </div>
+                    <p style="font-size: 0.75rem; margin: 8px 0 0; color: #8b949e;">{flaky_msg}</p>
                 </div>
                 """, unsafe_allow_html=True)
 else:
-    st.table(latest_jobs[['job_name', 'intent', 'conclusion', 'branch', 'created_at']])
+    table = latest_jobs[['repo', 'job_name', 'intent', 'conclusion', 'branch', 'created_at']].copy()
+    scores = [flakiness.get(key) for key in zip(table['repo'], table['job_name'])]
+    table['flakiness'] = [f"{'🎲 ' if f.flaky else ''}{f.score:.0%}" if f else "" for f in scores]
+    st.table(table)
+
+# --- Long-range trend (daily rollups, not raw history) ---
+trends = load_trends(intent_filter, repos=repo_filter)
+if not trends.empty:
+    st.write("### 📈 90-day Trend")
+    trend_cols = st.columns(2)
+    with trend_cols[0]:
+        st.caption("Success rate (%)")
+        st.line_chart(trends['success_rate'])
+    with trend_cols[1]:
+        st.caption("Runs per day")
+        st.bar_chart(trends[['successes', 'failures', 'cancelled']])
 
 st.divider()
 st.caption(f"Refreshed: {time.strftime('%H:%M:%S')} | Signal Intelligence Mode V7")
+
+# The server process lives on, so write the metrics after every rerun rather than at exit
+metrics.flush()
@@ -0,0 +1,153 @@
+# dashboard_data.py
+# Cached, filter-pushdown data layer for the Streamlit dashboard.
+# Streamlit re-executes dashboard.py on every interaction, but this module (and its
+# cache and reader connection) lives for the whole server process.
+import threading
+import time
+import pandas as pd
+import database
+import metrics
+import regressions
+import snapshot
+from cache import TTLCache
+from config import DASHBOARD_CACHE_TTL_SECONDS, DASHBOARD_CACHE_MAX_ENTRIES
+from flakiness import assess
+from normalizer import get_intent_label, normalize_workflow_data, summarize_jobs
+
+# Only what the dashboard renders
+DASHBOARD_COLUMNS = ('run_id', 'repo', 'name', 'job_name', 'conclusion', 'branch', 'created_at', 'created_epoch')
+
+_cache = TTLCache(maxsize=DASHBOARD_CACHE_MAX_ENTRIES, ttl=DASHBOARD_CACHE_TTL_SECONDS)
+_lock = threading.RLock()
+_reader = None
+
+def _cached(key, compute):
+    """
+    Serves `compute(conn)` from the cache, keyed on the database's data_version:
+    any commit by the collector or notifier invalidates every cached result.
+    """
+    global _reader
+    with _lock:
+        if _reader is None:
+            # Long-lived and read-only in practice; Streamlit reruns on different threads
+            _reader = database.get_db_connection(check_same_thread=False)
+        version = database.get_data_version(_reader)
+
+        def timed_compute():
+            metrics.incr("dashboard_cache_total", result="miss", kind=key[0])
+            with metrics.span(f"dashboard.{key[0]}"):
+                return compute(_reader)
+        return _cache.get_or_compute((version,) + key, timed_compute)
+
+def load_latest_runs():
+    """Each job's latest completed run, normalized (one row per job)."""
+    def compute(conn):
+        return normalize_workflow_data(database.query_latest_runs(conn, DASHBOARD_COLUMNS))
+    return _cached(("latest",), compute)
+
+def load_flakiness():
+    """{(repo, job_name): flakiness.Flakiness} for every job, scored from job_health alone."""
+    def compute(conn):
+        now = time.time()
+        return {
+            (row['repo'], row['job_name']): assess(row['outcomes'], row['flaky_commits'], row['last_flake_epoch'], now)
+            for row in database.query_flakiness(conn)
+        }
+    return _cached(("flakiness",), compute)
+
+def load_mainline():
+    """
+    ([regressions.Integration], regressions.blame()): each repository's newest mainline
+    commit, and the PRs suspected of breaking the jobs now failing there.
+    """
+    def compute(conn):
+        return regressions.latest_integrations(conn), regressions.blame(regressions.find_all_suspects(conn))
+    return _cached(("mainline",), compute)
+
+def _sorted_key(values):
+    return tuple(sorted(values)) if values is not None else None
+
+def _runs_key(intents, branch, window_days, repos):
+    # The window start moves with time, so it is bucketed to the cache TTL
+    bucket = int(time.time()) // DASHBOARD_CACHE_TTL_SECONDS if window_days else None
+    return (_sorted_key(intents), branch, window_days, bucket, _sorted_key(repos))
+
+def load_history():
+    """
+    The whole normalized run history from the memory-mapped snapshot plus the rows
+    written since it was exported, or None when no snapshot has been exported.
+    """
+    if snapshot.read_meta() is None:
+        return None
+    return _cached(("history",), lambda conn: snapshot.load_snapshot(conn=conn))
+
+def load_runs(intents=None, branch=None, window_days=None, repos=None):
+    """
+    Completed runs for the selected tiers, branch, time window and repositories, newest first.
+    With a snapshot the filters are column masks over the memory-mapped history;
+    otherwise tiers are resolved to workflow names up front so the filter runs in SQL.
+    """
+    def compute(conn):
+        history = load_history()
+        if history is not None:
+            mask = history['status'] == 'completed'
+            if intents is not None:
+                mask &= history['intent'].isin(intents)
+            if repos is not None:
+                mask &= history['repo'].isin(repos)
+            if branch:
+                mask &= history['branch'] == branch
+            if window_days:
+                mask &= history['created_epoch'] >= int(time.time()) - window_days * 86400
+            columns = [col for col in DASHBOARD_COLUMNS if col in history.columns] + ['intent', 'intent_icon']
+            return history.loc[mask, columns].sort_values('created_epoch', ascending=False, kind='stable')
+
+        names = None
+        if intents is not None:
+            latest = load_latest_runs()
+            names = [name for name in latest['name'].unique() if get_intent_label(name)[0] in intents]
+        since_epoch = int(time.time()) - window_days * 86400 if window_days else None
+        df = database.query_runs(
+            conn, DASHBOARD_COLUMNS, names=names, branch=branch, since_epoch=since_epoch, completed_only=True,
+            repos=repos
+        )
+        return normalize_workflow_data(df)
+
+    return _cached(("runs",) + _runs_key(intents, branch, window_days, repos), compute)
+
+def load_job_summaries(intents=None, branch=None, window_days=None, repos=None):
+    """Per-job tile data (see normalizer.summarize_jobs) for the same filters as load_runs."""
+    def compute(conn):
+        return summarize_jobs(load_runs(intents, branch, window_days, repos))
+
+    return _cached(("summaries",) + _runs_key(intents, branch, window_days, repos), compute)
+
+def load_trends(intents=None, days=90, repos=None):
+    """
+    Daily run counts and success rate over the selected tiers and repositories, read from
+    the daily rollups (so it still covers history that compaction removed from workflow_runs).
+    """
+    def compute(conn):
+        jobs = None
+        if intents is not None:
+            latest = load_latest_runs()
+            selected = latest[latest['intent'].isin(intents)]
+            jobs = list(zip(selected['repo'], selected['job_name']))
+        since_epoch = int(time.time()) // 86400 * 86400 - days * 86400
+        rows = database.query_rollups(conn, 'daily', since_epoch=since_epoch, jobs=jobs, repos=repos)
+        df = pd.DataFrame([tuple(row) for row in rows], columns=database.ROLLUP_QUERY_COLUMNS)
+        daily = df.groupby('bucket_epoch')[['runs', 'successes', 'failures', 'cancelled']].sum()
+        daily['success_rate'] = (daily['successes'] / daily['runs'] * 100).round(1)
+        daily.index = pd.to_datetime(daily.index, unit='s').rename('day')
+        return daily
+
+    return _cached(("trends", _sorted_key(intents), days, _sorted_key(repos)), compute)
+
+def clear_cache():
+    """Drops every cached result and the reader connection (e.g. after DB_PATH changed)."""
+    global _reader
+    with _lock:
+        _cache.clear()
+        if _reader is not None:
+            _reader.close()
+            _reader = None
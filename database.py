@@ -1,72 +1,1644 @@
 # database.py
+import json
+import os
+import pathlib
+import queue
 import sqlite3
-import pandas as pd
-from config import DB_PATH
+import sys
+import threading
+import time
+import metrics
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+from functools import lru_cache
+from itertools import islice
+from config import (
+    DB_PATH, DB_SYNCHRONOUS, DB_CACHE_SIZE_KB, DB_BULK_CHUNK_SIZE, JOB_HEALTH_WINDOW, FLAKINESS_WINDOW,
+    NOTIFY_CLAIM_LEASE_SECONDS, RUN_RETENTION_DAYS, HOURLY_ROLLUP_RETENTION_DAYS, DEFAULT_REPOSITORY,
+    WEBHOOK_DELIVERY_RETENTION_DAYS, MAINLINE_BRANCH, FLAKY_COMMIT_LOOKBACK_DAYS
+)
 
-def get_db_connection():
-    """Returns a connection to the SQLite database."""
-    conn = sqlite3.connect(DB_PATH)
+UPSERT_RUN_SQL = '''
+    INSERT INTO workflow_runs (
+        run_id, workflow_run_id, name, job_name, status, conclusion, created_at, updated_at, commit_sha, branch, url,
+        created_epoch, updated_epoch, repo
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(run_id) DO UPDATE SET
+        status=excluded.status,
+        conclusion=excluded.conclusion,
+        updated_at=excluded.updated_at,
+        updated_epoch=excluded.updated_epoch
+'''
+
+def get_db_connection(check_same_thread=True, read_only=False):
+    """
+    Returns a connection to the SQLite database (WAL mode, tuned pragmas). A read_only
+    connection is opened with mode=ro, so it can never write or change the journal mode;
+    the database must already exist (init_db).
+    """
+    database = f"{pathlib.Path(DB_PATH).resolve().as_uri()}?mode=ro" if read_only else DB_PATH
+    conn = sqlite3.connect(
+        database, uri=read_only, check_same_thread=check_same_thread, factory=metrics.connection_factory()
+    )
+    metrics.trace_connection(conn)
     conn.row_factory = sqlite3.Row
+    if not read_only:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size=-{DB_CACHE_SIZE_KB}")
     return conn
 
+class ReadOnlyPool:
+    """
+    A fixed set of read-only connections shared by request threads. Under WAL they all
+    read concurrently, and none of them blocks (or is blocked by) a writer.
+    """
+
+    def __init__(self, size):
+        self.idle = queue.LifoQueue()  # The most recently used connection has the warmest page cache
+        for _ in range(size):
+            self.idle.put(get_db_connection(check_same_thread=False, read_only=True))
+        # data_version is per connection, so one is kept aside to watch for commits
+        self.watcher = get_db_connection(check_same_thread=False, read_only=True)
+        self.watcher_lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection, waiting for one if all are in use."""
+        conn = self.idle.get()
+        try:
+            yield conn
+        finally:
+            self.idle.put(conn)
+
+    def data_version(self):
+        """Changes whenever any other connection commits (see get_data_version)."""
+        with self.watcher_lock:
+            return get_data_version(self.watcher)
+
+    def close(self):
+        while not self.idle.empty():
+            self.idle.get().close()
+        self.watcher.close()
+
+@contextmanager
+def immediate_transaction():
+    """
+    Yields a connection inside BEGIN IMMEDIATE: the write lock is taken before the first
+    read, so read-decide-write sequences from concurrent processes are serialized.
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+    finally:
+        conn.close()
+
+def _ensure_column(conn, table, column, decl):
+    """Adds a column to an existing table created by an older version of init_db."""
+    columns = [row['name'] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+def to_epoch(timestamp):
+    """
+    Parses an ISO-8601 timestamp into integer epoch seconds.
+    Handles GitHub's `Z` suffix; naive values (mock data) are taken as local time.
+    """
+    if not timestamp:
+        return None
+    return int(datetime.fromisoformat(timestamp.replace('Z', '+00:00')).timestamp())
+
+def _migration_base_schema(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS workflow_runs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id INTEGER UNIQUE,
+            name TEXT,
+            job_name TEXT,
+            status TEXT,
+            conclusion TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            commit_sha TEXT,
+            branch TEXT,
+            url TEXT
+        )
+    ''')
+    # Rows are job executions; workflow_run_id groups the jobs of one workflow run
+    _ensure_column(conn, 'workflow_runs', 'workflow_run_id', 'INTEGER')
+    # Per-endpoint high-water mark for incremental collection
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            endpoint TEXT PRIMARY KEY,
+            high_water TEXT,
+            last_run_id INTEGER
+        )
+    ''')
+    # Conditional request validators, keyed by full page URL
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS http_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT
+        )
+    ''')
+
+def _migration_epoch_timestamps(conn):
+    # Text timestamps come in mixed formats; queries sort and filter on these instead
+    _ensure_column(conn, 'workflow_runs', 'created_epoch', 'INTEGER')
+    _ensure_column(conn, 'workflow_runs', 'updated_epoch', 'INTEGER')
+    conn.create_function('to_epoch', 1, to_epoch, deterministic=True)
+    conn.execute("UPDATE workflow_runs SET created_epoch=to_epoch(created_at), updated_epoch=to_epoch(updated_at)")
+    # Covers get_failure_duration (index-only) and the per-job latest-run lookups
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_job_created ON workflow_runs(job_name, created_epoch, conclusion)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_conclusion_created ON workflow_runs(conclusion, created_epoch)")
+    # Newest-first scans (notifier window, dashboard) without a sort step
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_created ON workflow_runs(created_epoch)")
+
+def _migration_job_health(conn):
+    # One row per job, maintained by save_runs in the same transaction as the runs
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS job_health (
+            job_name TEXT PRIMARY KEY,
+            last_run_id INTEGER,
+            last_conclusion TEXT,
+            last_created_epoch INTEGER,
+            streak_length INTEGER,
+            streak_start_epoch INTEGER,
+            streak_start_run_id INTEGER,
+            recent TEXT,
+            recent_successes INTEGER,
+            total_runs INTEGER,
+            total_successes INTEGER
+        )
+    ''')
+    # Filled by the job_health backfill init_db runs after the migrations (see BACKFILLS)
+
+def _migration_notification_outbox(conn):
+    # One row per (alert, plugin); the idempotency key makes re-enqueueing a no-op
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            idempotency_key TEXT NOT NULL,
+            plugin TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_epoch INTEGER NOT NULL,
+            last_error TEXT,
+            created_epoch INTEGER NOT NULL,
+            sent_epoch INTEGER,
+            UNIQUE(idempotency_key, plugin)
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON notification_outbox(status, next_attempt_epoch)")
+
+def _migration_notification_state(conn):
+    # Per job: the failure transition last alerted on (replaces last_notified_state.json)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS notification_state (
+            job_name TEXT PRIMARY KEY,
+            transition_id TEXT NOT NULL,
+            notified_epoch INTEGER
+        )
+    ''')
+    # Outbox claims, so concurrent notifier workers never deliver the same entry twice
+    _ensure_column(conn, 'notification_outbox', 'claim_token', 'TEXT')
+    _ensure_column(conn, 'notification_outbox', 'claimed_until', 'INTEGER')
+
+def _migration_dashboard_indexes(conn):
+    # Intent filters are pushed down as workflow name lists, branch filters as equality
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_name_created ON workflow_runs(name, created_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_branch_created ON workflow_runs(branch, created_epoch)")
+
+def _migration_rollups(conn):
+    # Per job and time bucket (UTC, by created_epoch): counts of completed runs and summed durations
+    for table in ROLLUP_TABLES.values():
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                job_name TEXT NOT NULL,
+                bucket_epoch INTEGER NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                successes INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                duration_total INTEGER NOT NULL DEFAULT 0,
+                duration_runs INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_name, bucket_epoch)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket_epoch)")
+    # What retention removed per job, so job_health replays and re-ingests stay consistent
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS run_compaction (
+            job_name TEXT PRIMARY KEY,
+            compacted_before INTEGER NOT NULL,
+            runs INTEGER NOT NULL,
+            successes INTEGER NOT NULL
+        )
+    ''')
+    for granularity, table in ROLLUP_TABLES.items():
+        size = ROLLUP_BUCKET_SECONDS[granularity]
+        conn.execute(f'''
+            INSERT OR REPLACE INTO {table}
+            SELECT job_name, created_epoch / {size} * {size}, COUNT(*),
+                   SUM(conclusion = 'success'), SUM(conclusion = 'failure'), SUM(conclusion = 'cancelled'),
+                   COALESCE(SUM(MAX(updated_epoch - created_epoch, 0)), 0), COUNT(updated_epoch - created_epoch)
+            FROM workflow_runs
+            WHERE status = 'completed' AND created_epoch IS NOT NULL
+            GROUP BY 1, 2
+        ''')
+
+def _migration_updated_index(conn):
+    # Lets snapshot.py read only the rows changed since its export
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_updated ON workflow_runs(updated_epoch)")
+
+def _rekey_by_repo(conn, table, create_sql):
+    """Recreates `table` with `create_sql` (which adds repo to its key); existing rows go to the default repository."""
+    columns = ", ".join(row['name'] for row in conn.execute(f"PRAGMA table_info({table})"))
+    conn.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+    conn.execute(create_sql)
+    conn.execute(f"INSERT INTO {table} (repo, {columns}) SELECT ?, {columns} FROM {table}_old", (DEFAULT_REPOSITORY,))
+    conn.execute(f"DROP TABLE {table}_old")
+
+def _migration_repositories(conn):
+    # Rows collected before multi-repo support belong to the default repository
+    default = DEFAULT_REPOSITORY.replace("'", "''")
+    _ensure_column(conn, 'workflow_runs', 'repo', f"TEXT NOT NULL DEFAULT '{default}'")
+    # Per-job lookups lead with repo, so one repository's queries never scan another's rows
+    conn.execute("DROP INDEX IF EXISTS idx_runs_job_created")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_repo_job_created ON workflow_runs(repo, job_name, created_epoch, conclusion)")
+
+    # A job is identified by (repo, job_name) from here on
+    _rekey_by_repo(conn, 'run_compaction', '''
+        CREATE TABLE run_compaction (
+            repo TEXT NOT NULL,
+            job_name TEXT NOT NULL,
+            compacted_before INTEGER NOT NULL,
+            runs INTEGER NOT NULL,
+            successes INTEGER NOT NULL,
+            PRIMARY KEY (repo, job_name)
+        )
+    ''')
+    _rekey_by_repo(conn, 'notification_state', '''
+        CREATE TABLE notification_state (
+            repo TEXT NOT NULL,
+            job_name TEXT NOT NULL,
+            transition_id TEXT NOT NULL,
+            notified_epoch INTEGER,
+            PRIMARY KEY (repo, job_name)
+        )
+    ''')
+    for table in ROLLUP_TABLES.values():
+        _rekey_by_repo(conn, table, f'''
+            CREATE TABLE {table} (
+                repo TEXT NOT NULL,
+                job_name TEXT NOT NULL,
+                bucket_epoch INTEGER NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                successes INTEGER NOT NULL DEFAULT 0,
+                failures INTEGER NOT NULL DEFAULT 0,
+                cancelled INTEGER NOT NULL DEFAULT 0,
+                duration_total INTEGER NOT NULL DEFAULT 0,
+                duration_runs INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (repo, job_name, bucket_epoch)
+            ) WITHOUT ROWID
+        ''')
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table}(bucket_epoch)")
+    # job_health is derived, so it is recreated and replayed rather than copied
+    conn.execute("DROP TABLE job_health")
+    conn.execute('''
+        CREATE TABLE job_health (
+            repo TEXT NOT NULL,
+            job_name TEXT NOT NULL,
+            last_run_id INTEGER,
+            last_conclusion TEXT,
+            last_created_epoch INTEGER,
+            streak_length INTEGER,
+            streak_start_epoch INTEGER,
+            streak_start_run_id INTEGER,
+            recent TEXT,
+            recent_successes INTEGER,
+            total_runs INTEGER,
+            total_successes INTEGER,
+            PRIMARY KEY (repo, job_name)
+        )
+    ''')
+    # Replayed by the job_health backfill after the migrations (see BACKFILLS)
+
+def _migration_webhook_deliveries(conn):
+    # Delivery ids already ingested by webhook_server.py, so redeliveries are dropped
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS webhook_deliveries (
+            delivery_id TEXT PRIMARY KEY,
+            event TEXT,
+            received_epoch INTEGER
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_webhook_deliveries_received ON webhook_deliveries(received_epoch)")
+
+def _migration_flakiness(conn):
+    _ensure_column(conn, 'job_health', 'outcomes', "TEXT NOT NULL DEFAULT ''")
+    _ensure_column(conn, 'job_health', 'flaky_commits', "INTEGER NOT NULL DEFAULT 0")
+    _ensure_column(conn, 'job_health', 'last_flake_epoch', "INTEGER")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS commit_outcomes (
+            repo TEXT NOT NULL,
+            job_name TEXT NOT NULL,
+            commit_sha TEXT NOT NULL,
+            successes INTEGER NOT NULL DEFAULT 0,
+            failures INTEGER NOT NULL DEFAULT 0,
+            flaked_epoch INTEGER,  -- Set while the commit has both passed and failed the job
+            PRIMARY KEY (repo, job_name, commit_sha)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_commit_outcomes_flaked ON commit_outcomes(repo, job_name, flaked_epoch) "
+        "WHERE flaked_epoch IS NOT NULL"
+    )
+    # Backfilled from the raw runs still stored; the commit became flaky when its later-seen outcome first arrived
+    conn.execute('''
+        INSERT OR IGNORE INTO commit_outcomes (repo, job_name, commit_sha, successes, failures, flaked_epoch)
+        SELECT repo, job_name, commit_sha, SUM(conclusion = 'success'), SUM(conclusion = 'failure'),
+               CASE WHEN SUM(conclusion = 'success') > 0 AND SUM(conclusion = 'failure') > 0 THEN MAX(
+                   MIN(CASE WHEN conclusion = 'success' THEN created_epoch END),
+                   MIN(CASE WHEN conclusion = 'failure' THEN created_epoch END)
+               ) END
+        FROM workflow_runs
+        WHERE status = 'completed' AND conclusion IN ('success', 'failure') AND commit_sha != ''
+        GROUP BY repo, job_name, commit_sha
+    ''')
+    # The new job_health columns are filled by the backfill after the migrations (see BACKFILLS)
+
+def _migration_failure_logs(conn):
+    # Each distinct error once: the signature hashes the failing step and normalized error line
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS failure_signatures (
+            signature TEXT PRIMARY KEY,
+            failing_step TEXT,
+            error TEXT NOT NULL,
+            first_seen_epoch INTEGER NOT NULL,
+            last_seen_epoch INTEGER NOT NULL,
+            occurrences INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    # One row per failed job whose log was fetched; signature is NULL when the log was
+    # gone or showed no error, so it is not fetched again
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS job_failures (
+            run_id INTEGER PRIMARY KEY,
+            repo TEXT NOT NULL,
+            job_name TEXT NOT NULL,
+            created_epoch INTEGER NOT NULL,
+            failing_step TEXT,
+            message TEXT,
+            signature TEXT,
+            fetched_epoch INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_job_failures_job ON job_failures(repo, job_name, created_epoch)")
+
+def _migration_commits(conn):
+    # Mainline commits in first-parent order: a commit's parent sits at position - 1, so the
+    # commits between two shas are one range scan on idx_commits_position
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS commits (
+            repo TEXT NOT NULL,
+            sha TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            parent_sha TEXT,
+            committed_epoch INTEGER,
+            author TEXT,
+            title TEXT,
+            url TEXT,
+            pulls_fetched INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (repo, sha)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_commits_position ON commits(repo, position)")
+    # Local cache of the PRs merged as mainline commits
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS pull_requests (
+            repo TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            title TEXT,
+            author TEXT,
+            merged_epoch INTEGER,
+            url TEXT,
+            PRIMARY KEY (repo, number)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS commit_pulls (
+            repo TEXT NOT NULL,
+            sha TEXT NOT NULL,
+            number INTEGER NOT NULL,
+            PRIMARY KEY (repo, sha, number)
+        ) WITHOUT ROWID
+    ''')
+    # Bisection seeks a job's last pass / first failure on a branch, and a commit's runs
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_runs_repo_job_branch ON workflow_runs(repo, job_name, branch, conclusion, created_epoch)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_repo_commit ON workflow_runs(repo, commit_sha)")
+
+def _migration_derived_versions(conn):
+    # Version of each derived table's computation as last backfilled (see BACKFILLS)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS derived_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    ''')
+
+# Ordered schema migrations: (version, description, function). Append only, never edit.
+# Migrations only change the schema or run frozen SQL; tables derived by live code (job_health)
+# are recomputed by BACKFILLS once the last migration has run.
+MIGRATIONS = [
+    (1, "base schema", _migration_base_schema),
+    (2, "epoch timestamps and query indexes", _migration_epoch_timestamps),
+    (3, "job_health summary table", _migration_job_health),
+    (4, "notification outbox", _migration_notification_outbox),
+    (5, "notification state table and outbox claims", _migration_notification_state),
+    (6, "dashboard filter indexes", _migration_dashboard_indexes),
+    (7, "hourly/daily rollups and run compaction", _migration_rollups),
+    (8, "updated_epoch index for snapshot deltas", _migration_updated_index),
+    (9, "repository dimension", _migration_repositories),
+    (10, "webhook deliveries", _migration_webhook_deliveries),
+    (11, "flakiness: recent outcomes and per-commit pass/fail", _migration_flakiness),
+    (12, "failure log signatures", _migration_failure_logs),
+    (13, "mainline commits and pull requests", _migration_commits),
+    (14, "derived table versions", _migration_derived_versions),
+]
+
+def get_schema_version(conn):
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
 def init_db():
-    """Initializes the database schema if it doesn't exist."""
+    """Creates the schema and applies pending migrations in order, each in its own transaction."""
     with get_db_connection() as conn:
         conn.execute('''
-            CREATE TABLE IF NOT EXISTS workflow_runs (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                run_id INTEGER UNIQUE,
-                name TEXT,
-                job_name TEXT,
-                status TEXT,
-                conclusion TEXT,
-                created_at TEXT,
-                updated_at TEXT,
-                commit_sha TEXT,
-                branch TEXT,
-                url TEXT
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INTEGER PRIMARY KEY,
+                description TEXT,
+                applied_at TEXT
             )
         ''')
-        conn.commit()
+        for version, description, migrate in MIGRATIONS:
+            # IMMEDIATE takes the write lock up front so concurrent initializers apply each step once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if get_schema_version(conn) < version:
+                    migrate(conn)
+                    conn.execute(
+                        "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                        (version, description, datetime.now().isoformat())
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        _run_backfills(conn)
+        return get_schema_version(conn)
+
+def _run_backfills(conn):
+    """Recomputes the derived tables whose BACKFILLS version is newer than the database's."""
+    applied = dict(conn.execute("SELECT name, version FROM derived_versions").fetchall())
+    for name, version, backfill in BACKFILLS:
+        if applied.get(name, 0) >= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-checked under the write lock, so concurrent initializers backfill once
+            row = conn.execute("SELECT version FROM derived_versions WHERE name = ?", (name,)).fetchone()
+            if row is None or row[0] < version:
+                backfill(conn)
+                conn.execute("INSERT OR REPLACE INTO derived_versions (name, version) VALUES (?, ?)", (name, version))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+def _repo_of(run_data):
+    """The row's "owner/name": a string, or the API's repository object; the default repository if absent."""
+    repo = run_data.get('repository') or DEFAULT_REPOSITORY
+    return repo['full_name'] if isinstance(repo, dict) else repo
+
+def _run_row(run_data):
+    """Maps a GitHub-shaped run/job dict onto the workflow_runs column order."""
+    return (
+        run_data['id'],
+        run_data.get('run_id', run_data['id']),
+        run_data['name'],
+        run_data.get('job_name', run_data['name']),
+        run_data['status'],
+        run_data['conclusion'],
+        run_data['created_at'],
+        run_data['updated_at'],
+        run_data.get('head_sha', ''),
+        run_data.get('head_branch', ''),
+        run_data['html_url'],
+        to_epoch(run_data['created_at']),
+        to_epoch(run_data['updated_at']),
+        _repo_of(run_data)
+    )
+
+def _records(conn, record, query, params=()):
+    """
+    Streams a query's rows as `record` namedtuples (fields in select order), skipping
+    the sqlite3.Row objects. Records are what the notifier, collector and CLI paths get;
+    DataFrames are only built for the dashboard (see _read_frame).
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return map(record._make, cursor.execute(query, params))
+
+def _read_frame(conn, query, params=()):
+    """Reads a query into a DataFrame. pandas is imported here, so only the paths that need frames load it."""
+    import pandas as pd
+    return pd.read_sql_query(query, conn, params=params)
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def job_filter(jobs, prefix=""):
+    """SQL condition and params matching a collection of (repo, job_name) keys."""
+    jobs = list(jobs)
+    if not jobs:
+        return "0", []
+    if len(jobs) == 1:
+        return f"{prefix}repo = ? AND {prefix}job_name = ?", list(jobs[0])
+    values = ", ".join("(?, ?)" for _ in jobs)
+    # A plain IN (VALUES ...) scans the table; selecting from the VALUES lets SQLite seek the (repo, job_name) index
+    return (
+        f"({prefix}repo, {prefix}job_name) IN (SELECT column1, column2 FROM (VALUES {values}))",
+        [value for job in jobs for value in job]
+    )
+
+# --- job_health: per-job streak/history summary, folded forward one completed run at a time ---
+# Jobs are keyed by (repo, job_name) throughout.
+
+JOB_HEALTH_COLUMNS = (
+    'repo', 'job_name', 'last_run_id', 'last_conclusion', 'last_created_epoch', 'streak_length',
+    'streak_start_epoch', 'streak_start_run_id', 'recent', 'recent_successes', 'total_runs', 'total_successes',
+    'outcomes', 'flaky_commits', 'last_flake_epoch'
+)
+JobHealth = namedtuple("JobHealth", JOB_HEALTH_COLUMNS)
+UPSERT_JOB_HEALTH_SQL = f'''
+    INSERT OR REPLACE INTO job_health ({", ".join(JOB_HEALTH_COLUMNS)})
+    VALUES ({", ".join("?" * len(JOB_HEALTH_COLUMNS))})
+'''
+# Single-character codes for job_health.recent (newest first)
+CONCLUSION_CODES = {'success': 'S', 'failure': 'F', 'cancelled': 'C'}
+
+def _empty_health(repo, job_name):
+    return dict(
+        repo=repo, job_name=job_name, last_run_id=None, last_conclusion=None, last_created_epoch=None,
+        streak_length=0, streak_start_epoch=None, streak_start_run_id=None,
+        recent='', recent_successes=0, total_runs=0, total_successes=0,
+        outcomes='', flaky_commits=0, last_flake_epoch=None
+    )
+
+def _advance_health(health, run_id, conclusion, created_epoch):
+    """
+    Folds one completed run, newer than everything already folded in, into a job's health (O(1)).
+    Streaks count passes or failures only: a cancelled (or skipped, ...) run neither extends
+    nor ends one, so a failure streak keeps its start until a run passes.
+    """
+    code = CONCLUSION_CODES.get(conclusion, 'X')
+    if code in 'SF':
+        # The streak's conclusion is the newest pass/fail in the window
+        streak_code = next((c for c in health['outcomes'] if c in 'SF'), None)
+        if health['streak_length'] and streak_code == code:
+            health['streak_length'] += 1
+        else:
+            health.update(streak_length=1, streak_start_epoch=created_epoch, streak_start_run_id=run_id)
+    health['recent'] = (code + health['recent'])[:JOB_HEALTH_WINDOW]
+    health['recent_successes'] = health['recent'].count('S')
+    # The longer window flakiness.py scores flip and failure rates over
+    health['outcomes'] = (code + health['outcomes'])[:FLAKINESS_WINDOW]
+    health['total_runs'] += 1
+    health['total_successes'] += conclusion == 'success'
+    health.update(last_run_id=run_id, last_conclusion=conclusion, last_created_epoch=created_epoch)
+
+def _compute_job_health(conn, jobs=None):
+    """
+    Slow path: replays the completed runs of the given (repo, job_name) jobs (or all jobs)
+    from raw rows, plus the totals of runs removed by compact_runs and the flaky commits
+    recorded in commit_outcomes.
+    """
+    query = "SELECT repo, job_name, run_id, conclusion, created_epoch FROM workflow_runs WHERE status='completed'"
+    params = []
+    if jobs is not None:
+        condition, params = job_filter(jobs)
+        query += f" AND {condition}"
+    query += " ORDER BY repo, job_name, created_epoch, run_id"
+
+    healths = {}
+    for row in conn.execute(query, params):
+        key = (row['repo'], row['job_name'])
+        health = healths.get(key)
+        if health is None:
+            health = healths[key] = _empty_health(*key)
+        _advance_health(health, row['run_id'], row['conclusion'], row['created_epoch'])
+
+    for row in conn.execute("SELECT repo, job_name, runs, successes FROM run_compaction"):
+        health = healths.get((row['repo'], row['job_name']))
+        if health is not None:
+            health['total_runs'] += row['runs']
+            health['total_successes'] += row['successes']
+
+    query = "SELECT repo, job_name, COUNT(*), MAX(flaked_epoch) FROM commit_outcomes WHERE flaked_epoch IS NOT NULL"
+    params = []
+    if jobs is not None:
+        condition, params = job_filter(jobs)
+        query += f" AND {condition}"
+    for repo, job_name, flaky_commits, last_flake_epoch in conn.execute(query + " GROUP BY repo, job_name", params):
+        health = healths.get((repo, job_name))
+        if health is not None:
+            health.update(flaky_commits=flaky_commits, last_flake_epoch=last_flake_epoch)
+    return healths
+
+def _write_job_health(conn, healths):
+    conn.executemany(UPSERT_JOB_HEALTH_SQL, [
+        tuple(health[col] for col in JOB_HEALTH_COLUMNS) for health in healths
+    ])
+
+def _rebuild_job_health(conn):
+    conn.execute("DELETE FROM job_health")
+    _write_job_health(conn, _compute_job_health(conn).values())
+
+# Derived tables init_db recomputes from the raw runs after the migrations: (name, version,
+# backfill). Bump the version when the computation changes, instead of editing a migration.
+BACKFILLS = [
+    # 2: replays jobs whose re-runs were folded in twice; 3: cancelled runs no longer break streaks
+    ("job_health", 3, _rebuild_job_health),
+]
+
+def _update_job_health(conn, completed, rescan):
+    """
+    Folds newly completed runs [(repo, job_name, run_id, conclusion, created_epoch)] into
+    job_health. Runs not newer than a job's latest folded run, and jobs in `rescan` (a
+    completed run changed its conclusion or went back to running, e.g. a re-run), fall back
+    to a replay of that job.
+    """
+    jobs = {run[:2] for run in completed} | set(rescan)
+    if not jobs:
+        return
+    condition, params = job_filter(jobs)
+    healths = {
+        (row['repo'], row['job_name']): dict(row)
+        for row in conn.execute(f"SELECT * FROM job_health WHERE {condition}", params)
+    }
+    rescan = set(rescan)
+    for repo, job_name, run_id, conclusion, created_epoch in sorted(completed, key=lambda run: (run[4], run[2])):
+        key = (repo, job_name)
+        if key in rescan:
+            continue
+        health = healths.setdefault(key, _empty_health(repo, job_name))
+        if health['last_run_id'] is not None and (created_epoch, run_id) <= (health['last_created_epoch'], health['last_run_id']):
+            rescan.add(key)
+            continue
+        _advance_health(health, run_id, conclusion, created_epoch)
+
+    if rescan:
+        replayed = _compute_job_health(conn, rescan)
+        # Jobs left without a completed run have no health to keep
+        for key in rescan - replayed.keys():
+            if healths.pop(key, None) is not None:
+                conn.execute("DELETE FROM job_health WHERE repo = ? AND job_name = ?", key)
+        healths.update(replayed)
+    _write_job_health(conn, healths.values())
+
+# --- commit_outcomes: per-(job, commit) pass/fail counts, for spotting the same commit both passing and failing ---
+
+def _add_commit_outcome(deltas, repo, job_name, commit_sha, conclusion, created_epoch, sign=1):
+    """Adds (or with sign=-1 removes) one completed run's pass/fail on its commit."""
+    if not commit_sha or conclusion not in ('success', 'failure'):
+        return
+    key = (repo, job_name, commit_sha)
+    successes, failures, latest = deltas.get(key, (0, 0, None))
+    if sign > 0:
+        latest = max(latest or 0, created_epoch or 0)
+    deltas[key] = (successes + sign * (conclusion == 'success'), failures + sign * (conclusion == 'failure'), latest)
+
+def _write_commit_outcomes(conn, deltas):
+    """
+    Applies the deltas (one batched primary-key lookup per chunk) and keeps job_health's
+    flaky_commits / last_flake_epoch in step. A commit is flaky once it has both passed
+    and failed; if a conclusion change makes it consistent again, its job is recounted.
+    Runs after _update_job_health, so the job rows exist and a replay has not seen these deltas.
+    """
+    if not deltas:
+        return
+    existing = {
+        tuple(row[:3]): tuple(row[3:])
+        for row in conn.execute(f'''
+            SELECT repo, job_name, commit_sha, successes, failures, flaked_epoch FROM commit_outcomes
+            WHERE (repo, job_name, commit_sha) IN (
+                SELECT column1, column2, column3 FROM (VALUES {", ".join("(?, ?, ?)" for _ in deltas)})
+            )
+        ''', [value for key in deltas for value in key])
+    }
+    flaked, recount = {}, set()
+    rows = []
+    for key, (successes, failures, latest) in deltas.items():
+        repo, job_name, commit_sha = key
+        old_successes, old_failures, flaked_epoch = existing.get(key, (0, 0, None))
+        successes, failures = old_successes + successes, old_failures + failures
+        if successes > 0 and failures > 0:
+            if flaked_epoch is None:
+                flaked_epoch = latest
+                count, last = flaked.get((repo, job_name), (0, None))
+                flaked[(repo, job_name)] = (count + 1, max(last or 0, latest))
+        elif flaked_epoch is not None:
+            flaked_epoch = None
+            recount.add((repo, job_name))
+        rows.append((repo, job_name, commit_sha, successes, failures, flaked_epoch))
+
+    conn.executemany('''
+        INSERT OR REPLACE INTO commit_outcomes (repo, job_name, commit_sha, successes, failures, flaked_epoch)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', rows)
+    conn.executemany('''
+        UPDATE job_health SET flaky_commits = flaky_commits + ?, last_flake_epoch = MAX(COALESCE(last_flake_epoch, 0), ?)
+        WHERE repo = ? AND job_name = ?
+    ''', [(count, last, *key) for key, (count, last) in flaked.items() if key not in recount])
+    conn.executemany('''
+        UPDATE job_health SET (flaky_commits, last_flake_epoch) = (
+            SELECT COUNT(*), MAX(flaked_epoch) FROM commit_outcomes
+            WHERE repo = ?1 AND job_name = ?2 AND flaked_epoch IS NOT NULL
+        )
+        WHERE repo = ?1 AND job_name = ?2
+    ''', list(recount))
+
+# --- rollups: per-job hourly/daily counts, maintained with job_health and kept after raw runs are compacted ---
+
+ROLLUP_TABLES = {'hourly': 'run_rollups_hourly', 'daily': 'run_rollups_daily'}
+ROLLUP_BUCKET_SECONDS = {'hourly': 3600, 'daily': 86400}
+ROLLUP_COLUMNS = ('runs', 'successes', 'failures', 'cancelled', 'duration_total', 'duration_runs')
+ROLLUP_QUERY_COLUMNS = ('repo', 'job_name', 'bucket_epoch') + ROLLUP_COLUMNS + ('success_rate', 'mean_duration')
+
+def _add_rollup(deltas, repo, job_name, conclusion, created_epoch, updated_epoch, sign=1):
+    """Adds (or with sign=-1 removes) one completed run's contribution to both rollup granularities."""
+    if created_epoch is None:
+        return
+    duration = updated_epoch - created_epoch if updated_epoch is not None else None
+    contribution = (
+        1, conclusion == 'success', conclusion == 'failure', conclusion == 'cancelled',
+        max(duration, 0) if duration is not None else 0, duration is not None
+    )
+    for granularity, size in ROLLUP_BUCKET_SECONDS.items():
+        key = (granularity, repo, job_name, created_epoch // size * size)
+        current = deltas.get(key, (0,) * len(ROLLUP_COLUMNS))
+        deltas[key] = tuple(total + sign * value for total, value in zip(current, contribution))
+
+def _write_rollups(conn, deltas):
+    for granularity, table in ROLLUP_TABLES.items():
+        conn.executemany(f'''
+            INSERT INTO {table} (repo, job_name, bucket_epoch, {", ".join(ROLLUP_COLUMNS)})
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(repo, job_name, bucket_epoch) DO UPDATE SET
+                {", ".join(f"{col} = {col} + excluded.{col}" for col in ROLLUP_COLUMNS)}
+        ''', [
+            (repo, job_name, bucket, *values) for (g, repo, job_name, bucket), values in deltas.items() if g == granularity
+        ])
+
+def query_rollups(conn, granularity='daily', since_epoch=None, jobs=None, repos=None):
+    """
+    Rollup rows (oldest bucket first) with the derived success_rate and mean_duration,
+    optionally restricted to (repo, job_name) `jobs` and/or to `repos`.
+    """
+    clauses, params = [], []
+    if since_epoch is not None:
+        clauses.append("bucket_epoch >= ?")
+        params.append(since_epoch)
+    if jobs is not None:
+        condition, job_params = job_filter(jobs)
+        clauses.append(condition)
+        params.extend(job_params)
+    if repos is not None:
+        clauses.append(f"repo IN ({','.join('?' * len(repos))})")
+        params.extend(repos)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return conn.execute(f'''
+        SELECT repo, job_name, bucket_epoch, {", ".join(ROLLUP_COLUMNS)},
+               100.0 * successes / runs AS success_rate,
+               1.0 * duration_total / NULLIF(duration_runs, 0) AS mean_duration
+        FROM {ROLLUP_TABLES[granularity]} {where}
+        ORDER BY bucket_epoch, repo, job_name
+    ''', params).fetchall()
+
+def compact_runs(retention_days=RUN_RETENTION_DAYS, now=None):
+    """
+    Deletes completed raw runs older than `retention_days`; they stay counted in the rollups
+    (and in job_health via run_compaction). Each job keeps its current streak and last
+    JOB_HEALTH_WINDOW / FLAKINESS_WINDOW completed runs regardless of age, so job_health
+    replays stay exact.
+    Hourly rollups older than HOURLY_ROLLUP_RETENTION_DAYS are dropped, and so are mainline
+    commits (and their PRs) older than every kept run and the commit_outcomes left without
+    runs that can no longer mark their job flaky. Returns the rows deleted.
+    """
+    if not retention_days:
+        return 0
+    now = int(now or time.time())
+    cutoff = now - retention_days * 86400
+    with metrics.span("db.compact_runs"), immediate_transaction() as conn:
+        conn.execute('''
+            CREATE TEMP TABLE compact_keep AS
+            SELECT h.repo, h.job_name, MIN(?, h.streak_start_epoch, COALESCE((
+                SELECT r.created_epoch FROM workflow_runs r
+                WHERE r.repo = h.repo AND r.job_name = h.job_name AND r.status = 'completed'
+                ORDER BY r.created_epoch DESC LIMIT 1 OFFSET ?
+            ), 0)) AS keep_from
+            FROM job_health h
+        ''', (cutoff, max(JOB_HEALTH_WINDOW, FLAKINESS_WINDOW) - 1))
+        conn.execute('''
+            CREATE TEMP TABLE compact_doomed AS
+            SELECT r.run_id, r.repo, r.job_name, r.conclusion, k.keep_from
+            FROM workflow_runs r JOIN compact_keep k ON k.repo = r.repo AND k.job_name = r.job_name
+            WHERE r.status = 'completed' AND r.created_epoch < k.keep_from
+        ''')
+        conn.execute('''
+            INSERT INTO run_compaction (repo, job_name, compacted_before, runs, successes)
+            SELECT repo, job_name, MAX(keep_from), COUNT(*), SUM(conclusion = 'success')
+            FROM compact_doomed GROUP BY repo, job_name
+            ON CONFLICT(repo, job_name) DO UPDATE SET
+                compacted_before = MAX(compacted_before, excluded.compacted_before),
+                runs = runs + excluded.runs,
+                successes = successes + excluded.successes
+        ''')
+        deleted = conn.execute(
+            "DELETE FROM workflow_runs WHERE run_id IN (SELECT run_id FROM compact_doomed)"
+        ).rowcount
+        conn.execute("DELETE FROM job_failures WHERE run_id IN (SELECT run_id FROM compact_doomed)")
+        # A commit's outcomes outlive its runs only while a flake on it is recent enough to count
+        # (see flakiness.assess); the jobs losing an older flaky commit get their count redone
+        conn.execute('''
+            CREATE TEMP TABLE compact_outcomes AS
+            SELECT o.repo, o.job_name, o.commit_sha, o.flaked_epoch FROM commit_outcomes o
+            WHERE COALESCE(o.flaked_epoch, 0) < ? AND NOT EXISTS (
+                SELECT 1 FROM workflow_runs r
+                WHERE r.repo = o.repo AND r.commit_sha = o.commit_sha AND r.job_name = o.job_name
+            )
+        ''', (now - FLAKY_COMMIT_LOOKBACK_DAYS * 86400,))
+        conn.execute('''
+            DELETE FROM commit_outcomes
+            WHERE (repo, job_name, commit_sha) IN (SELECT repo, job_name, commit_sha FROM compact_outcomes)
+        ''')
+        conn.execute('''
+            UPDATE job_health SET (flaky_commits, last_flake_epoch) = (
+                SELECT COUNT(*), MAX(flaked_epoch) FROM commit_outcomes o
+                WHERE o.repo = job_health.repo AND o.job_name = job_health.job_name AND o.flaked_epoch IS NOT NULL
+            )
+            WHERE (repo, job_name) IN (SELECT repo, job_name FROM compact_outcomes WHERE flaked_epoch IS NOT NULL)
+        ''')
+        conn.execute('''
+            DELETE FROM failure_signatures WHERE last_seen_epoch < ?
+              AND NOT EXISTS (SELECT 1 FROM job_failures f WHERE f.signature = failure_signatures.signature)
+        ''', (cutoff,))
+        # Mainline commits stay contiguous down to the last one before the oldest kept run,
+        # so bisection still finds the last passing commit of a long failure streak
+        conn.execute('''
+            DELETE FROM commits WHERE position < (
+                SELECT MAX(c.position) FROM commits c
+                WHERE c.repo = commits.repo
+                  AND c.committed_epoch < (SELECT COALESCE(MIN(keep_from), ?) FROM compact_keep)
+            )
+        ''', (cutoff,))
+        conn.execute('''
+            DELETE FROM commit_pulls
+            WHERE NOT EXISTS (SELECT 1 FROM commits c WHERE c.repo = commit_pulls.repo AND c.sha = commit_pulls.sha)
+        ''')
+        conn.execute('''
+            DELETE FROM pull_requests WHERE NOT EXISTS (
+                SELECT 1 FROM commit_pulls cp WHERE cp.repo = pull_requests.repo AND cp.number = pull_requests.number
+            )
+        ''')
+        conn.execute(
+            f"DELETE FROM {ROLLUP_TABLES['hourly']} WHERE bucket_epoch < ?",
+            (now - HOURLY_ROLLUP_RETENTION_DAYS * 86400,)
+        )
+        conn.execute("DROP TABLE compact_keep")
+        conn.execute("DROP TABLE compact_doomed")
+        conn.execute("DROP TABLE compact_outcomes")
+    return deleted
+
+def vacuum():
+    """Rewrites the database file to return the space freed by compaction."""
+    conn = get_db_connection()
+    try:
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        conn.close()
+
+def rebuild_job_health():
+    """Recomputes the whole job_health table from raw runs. Returns the number of jobs."""
+    with get_db_connection() as conn:
+        _rebuild_job_health(conn)
+        return conn.execute("SELECT COUNT(*) FROM job_health").fetchone()[0]
+
+def check_job_health():
+    """Compares job_health against a full replay of raw runs. Returns the mismatching (repo, job_name) keys."""
+    with get_db_connection() as conn:
+        expected = _compute_job_health(conn)
+        stored = {(row['repo'], row['job_name']): dict(row) for row in conn.execute("SELECT * FROM job_health")}
+    return sorted(job for job in expected.keys() | stored.keys() if expected.get(job) != stored.get(job))
+
+def get_job_health(job_name=None, repo=DEFAULT_REPOSITORY):
+    """Returns JobHealth records keyed by (repo, job_name) (O(1) per job via the primary key)."""
+    query = f"SELECT {', '.join(JOB_HEALTH_COLUMNS)} FROM job_health"
+    with get_db_connection() as conn:
+        if job_name is not None:
+            records = _records(conn, JobHealth, f"{query} WHERE repo=? AND job_name=?", (repo, job_name))
+        else:
+            records = _records(conn, JobHealth, query)
+        return {(health.repo, health.job_name): health for health in records}
+
+def save_runs(runs, validators=(), sync_state=None):
+    """
+    Saves or updates many runs in a single transaction on one connection.
+    Rows are streamed in chunks through executemany, and rows whose status,
+    conclusion and updated_at did not change are skipped. job_health, commit_outcomes
+    and the rollups are updated in the same transaction, and so are the HTTP validators
+    [(url, etag, last_modified)] of the pages the runs came from and the collection cursor
+    (endpoint, high_water, last_run_id): a page is only answered 304 once its runs are stored.
+    Returns {"inserted": n, "updated": n}.
+    """
+    counts = {"inserted": 0, "updated": 0}
+    conn = get_db_connection()
+    try:
+        with metrics.span("db.save_runs"), conn:
+            for chunk in _chunks(map(_run_row, runs), DB_BULK_CHUNK_SIZE):
+                placeholders = ",".join("?" * len(chunk))
+                existing = {
+                    row['run_id']: row
+                    for row in conn.execute(
+                        f"SELECT run_id, repo, job_name, status, conclusion, updated_at, created_epoch, updated_epoch, commit_sha "
+                        f"FROM workflow_runs WHERE run_id IN ({placeholders})",
+                        [row[0] for row in chunk]
+                    )
+                }
+                compacted = _compacted_before(conn, {(row[13], row[3]) for row in chunk})
+                changed, completed, rescan, rollups, commits = [], [], set(), {}, {}
+                for row in chunk:
+                    before = existing.get(row[0])
+                    if before is None:
+                        # Already folded into the rollups and job_health totals by compact_runs
+                        if row[4] == 'completed' and row[11] is not None and row[11] < compacted.get((row[13], row[3]), 0):
+                            continue
+                        counts["inserted"] += 1
+                    elif (before['status'], before['conclusion'], before['updated_at']) != (row[4], row[5], row[7]):
+                        counts["updated"] += 1
+                        if before['status'] == 'completed':
+                            _add_rollup(rollups, before['repo'], before['job_name'], before['conclusion'],
+                                        before['created_epoch'], before['updated_epoch'], sign=-1)
+                            _add_commit_outcome(commits, before['repo'], before['job_name'], before['commit_sha'],
+                                                before['conclusion'], before['created_epoch'], sign=-1)
+                    else:
+                        continue
+                    existing[row[0]] = dict(
+                        run_id=row[0], repo=row[13], job_name=row[3], status=row[4], conclusion=row[5],
+                        updated_at=row[7], created_epoch=row[11], updated_epoch=row[12], commit_sha=row[8]
+                    )
+                    changed.append(row)
+
+                    # job_health and the rollups only track completed runs
+                    if row[4] == 'completed':
+                        _add_rollup(rollups, row[13], row[3], row[5], row[11], row[12])
+                        _add_commit_outcome(commits, row[13], row[3], row[8], row[5], row[11])
+                        if before is None or before['status'] != 'completed':
+                            completed.append((row[13], row[3], row[0], row[5], row[11]))
+                        elif before['conclusion'] != row[5]:
+                            rescan.add((row[13], row[3]))
+                    elif before is not None and before['status'] == 'completed':
+                        # A completed run went back to running (a re-run): job_health still counts it
+                        rescan.add((row[13], row[3]))
+                conn.executemany(UPSERT_RUN_SQL, changed)
+                # A run stored before it had jobs (a run-level row, see collector.fetch_workflow_runs)
+                # is superseded by its job rows; left behind, it would stay pending forever
+                stubs = {row[1] for row in chunk if row[1] is not None and row[0] != row[1]}
+                if stubs:
+                    conn.execute(f'''
+                        DELETE FROM workflow_runs
+                        WHERE run_id IN ({",".join("?" * len(stubs))}) AND workflow_run_id = run_id AND status != 'completed'
+                    ''', list(stubs))
+                _update_job_health(conn, completed, rescan)
+                _write_commit_outcomes(conn, commits)
+                _write_rollups(conn, rollups)
+            _write_http_validators(conn, validators)
+            if sync_state:
+                _write_sync_state(conn, *sync_state)
+    finally:
+        conn.close()
+    metrics.incr("runs_saved_total", counts["inserted"], change="inserted")
+    metrics.incr("runs_saved_total", counts["updated"], change="updated")
+    return counts
+
+def _compacted_before(conn, jobs):
+    """{(repo, job_name): compacted_before} for the jobs that compact_runs has trimmed."""
+    condition, params = job_filter(jobs)
+    return {
+        (row['repo'], row['job_name']): row['compacted_before']
+        for row in conn.execute(f"SELECT repo, job_name, compacted_before FROM run_compaction WHERE {condition}", params)
+    }
 
 def save_run(run_data):
-    """Saves or updates a workflow run in the database."""
+    """Saves or updates a single workflow run in the database."""
+    return save_runs([run_data])
+
+PendingRun = namedtuple("PendingRun", "workflow_run_id repo name created_at updated_at commit_sha branch url")
+
+def get_pending_runs(repo=None):
+    """Returns a PendingRun per workflow run (of `repo`, or of any repository) that still has queued or in-progress jobs."""
     with get_db_connection() as conn:
-        conn.execute('''
-            INSERT INTO workflow_runs (
-                run_id, name, job_name, status, conclusion, created_at, updated_at, commit_sha, branch, url
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(run_id) DO UPDATE SET
-                status=excluded.status,
-                conclusion=excluded.conclusion,
-                updated_at=excluded.updated_at
-        ''', (
-            run_data['id'],
-            run_data['name'],
-            run_data.get('job_name', run_data['name']),
-            run_data['status'],
-            run_data['conclusion'],
-            run_data['created_at'],
-            run_data['updated_at'],
-            run_data.get('head_sha', ''),
-            run_data.get('head_branch', ''),
-            run_data['html_url']
-        ))
+        return list(_records(conn, PendingRun, f'''
+            SELECT workflow_run_id, repo, name, created_at, updated_at, commit_sha, branch, url
+            FROM workflow_runs
+            WHERE status != 'completed' AND workflow_run_id IS NOT NULL{" AND repo = ?" if repo else ""}
+            GROUP BY workflow_run_id
+        ''', [repo] if repo else []))
+
+def get_sync_state(endpoint):
+    """Returns (high_water, last_run_id) for an endpoint, or (None, None) on first poll."""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT high_water, last_run_id FROM sync_state WHERE endpoint=?", (endpoint,)
+        ).fetchone()
+    if row is None:
+        return None, None
+    return row['high_water'], row['last_run_id']
+
+def _write_sync_state(conn, endpoint, high_water, last_run_id):
+    conn.execute('''
+        INSERT INTO sync_state (endpoint, high_water, last_run_id) VALUES (?, ?, ?)
+        ON CONFLICT(endpoint) DO UPDATE SET
+            high_water=excluded.high_water,
+            last_run_id=excluded.last_run_id
+    ''', (endpoint, high_water, last_run_id))
+
+def save_sync_state(endpoint, high_water, last_run_id):
+    """Advances the collection cursor for an endpoint."""
+    with get_db_connection() as conn:
+        _write_sync_state(conn, endpoint, high_water, last_run_id)
         conn.commit()
 
+def get_http_validators(url):
+    """Returns the stored (etag, last_modified) for a page URL."""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT etag, last_modified FROM http_cache WHERE url=?", (url,)
+        ).fetchone()
+    if row is None:
+        return None, None
+    return row['etag'], row['last_modified']
+
+def _write_http_validators(conn, validators):
+    conn.executemany('''
+        INSERT INTO http_cache (url, etag, last_modified) VALUES (?, ?, ?)
+        ON CONFLICT(url) DO UPDATE SET
+            etag=excluded.etag,
+            last_modified=excluded.last_modified
+    ''', validators)
+
+def save_http_validators(url, etag, last_modified):
+    """Stores the validators of a successfully processed page."""
+    with get_db_connection() as conn:
+        _write_http_validators(conn, [(url, etag, last_modified)])
+        conn.commit()
+
+# --- webhook_deliveries: GitHub deliveries already ingested by webhook_server.py ---
+
+def get_seen_deliveries(delivery_ids):
+    """Returns the subset of `delivery_ids` that was already ingested."""
+    seen = set()
+    with get_db_connection() as conn:
+        for chunk in _chunks(delivery_ids, DB_BULK_CHUNK_SIZE):
+            seen.update(
+                row[0] for row in conn.execute(
+                    f"SELECT delivery_id FROM webhook_deliveries WHERE delivery_id IN ({','.join('?' * len(chunk))})", chunk
+                )
+            )
+    return seen
+
+def record_deliveries(deliveries, now=None, retention_days=WEBHOOK_DELIVERY_RETENTION_DAYS):
+    """Marks (delivery_id, event) pairs as ingested and forgets deliveries older than the retention."""
+    now = int(now or time.time())
+    with get_db_connection() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO webhook_deliveries (delivery_id, event, received_epoch) VALUES (?, ?, ?)",
+            [(delivery_id, event, now) for delivery_id, event in deliveries]
+        )
+        conn.execute("DELETE FROM webhook_deliveries WHERE received_epoch < ?", (now - retention_days * 86400,))
+        conn.commit()
+
+# --- job_failures / failure_signatures: why failed jobs failed (see failure_logs.py) ---
+
+FailedJob = namedtuple("FailedJob", "repo run_id workflow_run_id job_name created_epoch")
+JobFailure = namedtuple("JobFailure", "repo run_id workflow_run_id job_name failing_step message signature")
+# repeats: how many of the job's failures right before this one had the same signature
+FailureContext = namedtuple("FailureContext", "failing_step message signature repeats")
+FAILURE_REPEAT_LOOKBACK = 100
+
+def get_unfetched_failures(jobs=None, since_epoch=0, limit=None):
+    """
+    FailedJobs, newest first, created since `since_epoch` whose logs were not fetched yet,
+    optionally restricted to (repo, job_name) `jobs`.
+    """
+    condition, params = job_filter(jobs, "r.") if jobs is not None else ("1", [])
+    query = f'''
+        SELECT r.repo, r.run_id, r.workflow_run_id, r.job_name, r.created_epoch
+        FROM workflow_runs r LEFT JOIN job_failures f ON f.run_id = r.run_id
+        WHERE r.conclusion = 'failure' AND r.created_epoch >= ? AND r.status = 'completed'
+          AND f.run_id IS NULL AND r.workflow_run_id IS NOT NULL AND {condition}
+        ORDER BY r.created_epoch DESC
+    '''
+    params = [since_epoch] + params
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    with get_db_connection() as conn:
+        return list(_records(conn, FailedJob, query, params))
+
+def save_job_failures(failures, now=None):
+    """
+    Stores (repo, run_id, job_name, created_epoch, failing_step, message, signature, error)
+    per fetched job. A signature is stored once and counts the failures that had it.
+    """
+    now = int(now or time.time())
+    with immediate_transaction() as conn:
+        for repo, run_id, job_name, created_epoch, failing_step, message, signature, error in failures:
+            inserted = conn.execute('''
+                INSERT OR IGNORE INTO job_failures
+                    (run_id, repo, job_name, created_epoch, failing_step, message, signature, fetched_epoch)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (run_id, repo, job_name, created_epoch, failing_step, message, signature, now)).rowcount
+            if inserted and signature:
+                conn.execute('''
+                    INSERT INTO failure_signatures
+                        (signature, failing_step, error, first_seen_epoch, last_seen_epoch, occurrences)
+                    VALUES (?, ?, ?, ?, ?, 1)
+                    ON CONFLICT(signature) DO UPDATE SET
+                        first_seen_epoch = MIN(first_seen_epoch, excluded.first_seen_epoch),
+                        last_seen_epoch = MAX(last_seen_epoch, excluded.last_seen_epoch),
+                        occurrences = occurrences + 1
+                ''', (signature, failing_step, error, created_epoch, created_epoch))
+
+def get_job_failure(run_id):
+    """The JobFailure of one failed job (by workflow_runs.run_id), or None if its log was not fetched."""
+    with get_db_connection() as conn:
+        return next(_records(conn, JobFailure, '''
+            SELECT f.repo, f.run_id, r.workflow_run_id, f.job_name, f.failing_step, f.message, f.signature
+            FROM job_failures f JOIN workflow_runs r ON r.run_id = f.run_id
+            WHERE f.run_id = ?
+        ''', (run_id,)), None)
+
+def get_failure_context(conn, run_ids):
+    """
+    {run_id: FailureContext} for the given failed jobs whose logs were fetched. `repeats`
+    counts the job's consecutive earlier failures with the same signature (failures whose
+    log had no signature are skipped), up to FAILURE_REPEAT_LOOKBACK. One query per chunk:
+    a job's signed failures are numbered in order, and a run of equal signatures is the
+    island where that numbering and the per-signature one keep the same difference.
+    """
+    contexts = {}
+    for chunk in _chunks(run_ids, DB_BULK_CHUNK_SIZE):
+        for row in conn.execute(f'''
+            WITH targets AS (
+                SELECT run_id, repo, job_name, created_epoch, failing_step, message, signature
+                FROM job_failures WHERE run_id IN ({','.join('?' * len(chunk))})
+            ),
+            history AS (
+                SELECT f.run_id, f.repo, f.job_name, f.signature, f.created_epoch,
+                       ROW_NUMBER() OVER (PARTITION BY f.repo, f.job_name ORDER BY f.created_epoch, f.run_id)
+                       - ROW_NUMBER() OVER (
+                           PARTITION BY f.repo, f.job_name, f.signature ORDER BY f.created_epoch, f.run_id
+                       ) AS island
+                FROM job_failures f JOIN (SELECT DISTINCT repo, job_name FROM targets) j
+                    ON j.repo = f.repo AND j.job_name = f.job_name
+                WHERE f.signature IS NOT NULL AND f.created_epoch <= (SELECT MAX(created_epoch) FROM targets)
+            ),
+            streaks AS (
+                SELECT run_id, ROW_NUMBER() OVER (
+                    PARTITION BY repo, job_name, signature, island ORDER BY created_epoch, run_id
+                ) - 1 AS repeats
+                FROM history
+            )
+            SELECT t.run_id, t.failing_step, t.message, t.signature, MIN(COALESCE(s.repeats, 0), ?) AS repeats
+            FROM targets t LEFT JOIN streaks s ON s.run_id = t.run_id
+        ''', list(chunk) + [FAILURE_REPEAT_LOOKBACK]):
+            contexts[row['run_id']] = FailureContext(row['failing_step'], row['message'], row['signature'], row['repeats'])
+    return contexts
+
+# --- commits / pull_requests: the mainline, for bisecting failures (see regressions.py) ---
+
+Commit = namedtuple("Commit", "repo sha position parent_sha committed_epoch author title url")
+PullRequest = namedtuple("PullRequest", "number title author merged_epoch url")
+# The runs bounding a job's breakage on a branch: its last pass (None if it never passed)
+# and the first failure after it; *_position is the commit's mainline position, if known
+Bisection = namedtuple(
+    "Bisection", "repo job_name pass_run_id pass_sha pass_position fail_run_id fail_sha fail_position fail_url"
+)
+COMMIT_COLUMNS = "repo, sha, position, parent_sha, committed_epoch, author, title, url"
+
+def get_commit_positions(repo, shas):
+    """{sha: position} for the given shas already stored for `repo`."""
+    positions = {}
+    with get_db_connection() as conn:
+        for chunk in _chunks(shas, DB_BULK_CHUNK_SIZE):
+            positions.update(conn.execute(
+                f"SELECT sha, position FROM commits WHERE repo = ? AND sha IN ({','.join('?' * len(chunk))})",
+                [repo] + chunk
+            ).fetchall())
+    return positions
+
+def save_commits(repo, commits, parent_position=None, validators=()):
+    """
+    Appends mainline commits (dicts of sha, parent_sha, committed_at, author, title, url),
+    oldest first, after the stored commit at `parent_position`. Stored commits beyond that
+    position are no longer on the mainline (history was rewritten) and are dropped. Without
+    a parent position the commits could not be connected to stored history, and are
+    appended after it. The HTTP validators [(url, etag, last_modified)] of the pages the
+    commits came from are stored in the same transaction, as in save_runs.
+    """
+    with immediate_transaction() as conn:
+        if commits:
+            if parent_position is None:
+                parent_position = conn.execute(
+                    "SELECT COALESCE(MAX(position), -1) FROM commits WHERE repo = ?", (repo,)
+                ).fetchone()[0]
+            else:
+                conn.execute("DELETE FROM commits WHERE repo = ? AND position > ?", (repo, parent_position))
+            conn.executemany(f'''
+                INSERT OR REPLACE INTO commits ({COMMIT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [
+                (repo, commit['sha'], parent_position + i, commit['parent_sha'], to_epoch(commit['committed_at']),
+                 commit['author'], commit['title'], commit['url'])
+                for i, commit in enumerate(commits, 1)
+            ])
+        _write_http_validators(conn, validators)
+
+def get_commits_without_pulls(repo, limit=None):
+    """Shas of stored commits whose PRs were not fetched yet, newest first."""
+    query = "SELECT sha FROM commits WHERE repo = ? AND pulls_fetched = 0 ORDER BY position DESC"
+    params = [repo]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    with get_db_connection() as conn:
+        return [row[0] for row in conn.execute(query, params)]
+
+def save_commit_pulls(repo, pulls_by_sha):
+    """Stores {sha: [PR dicts of number, title, author, merged_at, url]} and marks those commits fetched."""
+    with immediate_transaction() as conn:
+        for sha, pulls in pulls_by_sha.items():
+            for pull in pulls:
+                conn.execute('''
+                    INSERT OR REPLACE INTO pull_requests (repo, number, title, author, merged_epoch, url)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (repo, pull['number'], pull['title'], pull['author'], to_epoch(pull['merged_at']), pull['url']))
+                conn.execute(
+                    "INSERT OR IGNORE INTO commit_pulls (repo, sha, number) VALUES (?, ?, ?)", (repo, sha, pull['number'])
+                )
+            conn.execute("UPDATE commits SET pulls_fetched = 1 WHERE repo = ? AND sha = ?", (repo, sha))
+
+def query_mainline_heads(conn):
+    """Each repository's newest mainline Commit."""
+    return list(_records(conn, Commit, f'''
+        SELECT {COMMIT_COLUMNS} FROM commits c
+        WHERE position = (SELECT MAX(position) FROM commits WHERE repo = c.repo)
+        ORDER BY repo
+    '''))
+
+def query_commit_pulls(conn, repo, shas):
+    """PullRequests of the given commits, in merge order."""
+    if not shas:
+        return []
+    return list(_records(conn, PullRequest, f'''
+        SELECT DISTINCT p.number, p.title, p.author, p.merged_epoch, p.url
+        FROM commit_pulls cp JOIN pull_requests p ON p.repo = cp.repo AND p.number = cp.number
+        WHERE cp.repo = ? AND cp.sha IN ({','.join('?' * len(shas))})
+        ORDER BY p.merged_epoch, p.number
+    ''', [repo] + list(shas)))
+
+def query_pulls_by_commit(conn, commits):
+    """{(repo, sha): [PullRequest]} of the given (repo, sha) commits, each list in merge order."""
+    pulls = {}
+    for chunk in _chunks(commits, DB_BULK_CHUNK_SIZE):
+        for row in conn.execute(f'''
+            SELECT cp.repo, cp.sha, p.number, p.title, p.author, p.merged_epoch, p.url
+            FROM commit_pulls cp JOIN pull_requests p ON p.repo = cp.repo AND p.number = cp.number
+            WHERE (cp.repo, cp.sha) IN (SELECT column1, column2 FROM (VALUES {", ".join("(?, ?)" for _ in chunk)}))
+            ORDER BY p.merged_epoch, p.number
+        ''', [value for commit in chunk for value in commit]):
+            pulls.setdefault((row['repo'], row['sha']), []).append(PullRequest(*tuple(row)[2:]))
+    return pulls
+
+def query_commit_range(conn, repo, after_position, through_position):
+    """Mainline Commits with after_position < position <= through_position, oldest first."""
+    return list(_records(conn, Commit, f'''
+        SELECT {COMMIT_COLUMNS} FROM commits
+        WHERE repo = ? AND position > ? AND position <= ?
+        ORDER BY position
+    ''', (repo, after_position, through_position)))
+
+def query_commit_ranges(conn, ranges):
+    """
+    {(repo, after_position, through_position): [Commit]} of query_commit_range for each
+    of the given ranges, one range scan each in a single query per chunk.
+    """
+    found = {commit_range: [] for commit_range in ranges}
+    for chunk in _chunks(found, DB_BULK_CHUNK_SIZE):
+        for row in conn.execute(f'''
+            SELECT b.column2 AS after_position, b.column3 AS through_position, {COMMIT_COLUMNS}
+            FROM (VALUES {", ".join("(?, ?, ?)" for _ in chunk)}) b
+            JOIN commits c ON c.repo = b.column1 AND c.position > b.column2 AND c.position <= b.column3
+            ORDER BY c.repo, b.column2, b.column3, c.position
+        ''', [value for commit_range in chunk for value in commit_range]):
+            commit = Commit(*tuple(row)[2:])
+            found[(commit.repo, row['after_position'], row['through_position'])].append(commit)
+    return found
+
+def query_commit_conclusions(conn, repo, sha):
+    """{conclusion: job count} of the latest run of each job on one commit."""
+    counts = {}
+    for (conclusion,) in conn.execute('''
+        SELECT conclusion FROM workflow_runs r
+        WHERE repo = ? AND commit_sha = ? AND created_epoch = (
+            SELECT MAX(created_epoch) FROM workflow_runs
+            WHERE repo = r.repo AND commit_sha = r.commit_sha AND job_name = r.job_name
+        )
+    ''', (repo, sha)):
+        counts[conclusion] = counts.get(conclusion, 0) + 1
+    return counts
+
+def bisect_jobs(conn, jobs, branch=MAINLINE_BRANCH):
+    """
+    {(repo, job_name): Bisection} of the given jobs failing on `branch`; jobs whose latest
+    completed run there passed (so no failure follows the last pass) are left out. One
+    query per chunk, two seeks per job on idx_runs_repo_job_branch (latest pass, first
+    failure after it) and a lookup of the two commits' positions.
+    """
+    bisections = {}
+    for chunk in _chunks(jobs, DB_BULK_CHUNK_SIZE):
+        for row in conn.execute(f'''
+            WITH passes AS (
+                SELECT j.column1 AS repo, j.column2 AS job_name, (
+                    SELECT run_id FROM workflow_runs
+                    WHERE repo = j.column1 AND job_name = j.column2 AND branch = ? AND conclusion = 'success'
+                    ORDER BY created_epoch DESC LIMIT 1
+                ) AS pass_run_id
+                FROM (VALUES {", ".join("(?, ?)" for _ in chunk)}) j
+            ),
+            bounds AS (
+                SELECT p.repo, p.job_name, p.pass_run_id, lp.commit_sha AS pass_sha, (
+                    SELECT run_id FROM workflow_runs
+                    WHERE repo = p.repo AND job_name = p.job_name AND branch = ? AND conclusion = 'failure'
+                      AND created_epoch > COALESCE(lp.created_epoch, -1)
+                    ORDER BY created_epoch ASC LIMIT 1
+                ) AS fail_run_id
+                FROM passes p LEFT JOIN workflow_runs lp ON lp.run_id = p.pass_run_id
+            )
+            SELECT b.repo, b.job_name, b.pass_run_id, b.pass_sha, pc.position AS pass_position,
+                   b.fail_run_id, ff.commit_sha AS fail_sha, fc.position AS fail_position, ff.url AS fail_url
+            FROM bounds b JOIN workflow_runs ff ON ff.run_id = b.fail_run_id
+            LEFT JOIN commits pc ON pc.repo = b.repo AND pc.sha = b.pass_sha
+            LEFT JOIN commits fc ON fc.repo = b.repo AND fc.sha = ff.commit_sha
+        ''', [branch] + [value for job in chunk for value in job] + [branch]):
+            bisections[(row['repo'], row['job_name'])] = Bisection(*row)
+    return bisections
+
+# --- notification_state / notification_outbox: what was alerted, and what still has to be delivered ---
+
+def save_notification_states(conn, entries, now=None):
+    """Records (repo, job_name, transition_id) as notified, inside the caller's transaction."""
+    now = int(now or time.time())
+    conn.executemany('''
+        INSERT INTO notification_state (repo, job_name, transition_id, notified_epoch) VALUES (?, ?, ?, ?)
+        ON CONFLICT(repo, job_name) DO UPDATE SET
+            transition_id=excluded.transition_id,
+            notified_epoch=excluded.notified_epoch
+    ''', [(repo, job_name, transition_id, now) for repo, job_name, transition_id in entries])
+
+def get_notification_state():
+    """Returns {(repo, job_name): transition_id} for every tracked job."""
+    with get_db_connection() as conn:
+        return {
+            (row['repo'], row['job_name']): row['transition_id']
+            for row in conn.execute("SELECT * FROM notification_state")
+        }
+
+def import_notification_state_json(path):
+    """
+    One-time import of the legacy JSON state file (jobs of the default repository). Existing rows win; the file is
+    renamed to `<path>.imported` afterwards. Returns the number of jobs read.
+    """
+    if not os.path.exists(path):
+        return 0
+    with immediate_transaction() as conn:
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return 0
+        conn.executemany(
+            "INSERT OR IGNORE INTO notification_state (repo, job_name, transition_id, notified_epoch) VALUES (?, ?, ?, ?)",
+            [(DEFAULT_REPOSITORY, job_name, str(transition_id), None) for job_name, transition_id in state.items()]
+        )
+    # Renamed only once the rows are committed; re-importing is harmless (INSERT OR IGNORE)
+    try:
+        os.replace(path, f"{path}.imported")
+    except FileNotFoundError:
+        pass
+    return len(state)
+
+def enqueue_notifications(conn, entries, now=None):
+    """Adds (idempotency_key, plugin, payload_json) entries in the caller's transaction; known keys are ignored."""
+    now = int(now or time.time())
+    conn.executemany('''
+        INSERT OR IGNORE INTO notification_outbox
+            (idempotency_key, plugin, payload, next_attempt_epoch, created_epoch)
+        VALUES (?, ?, ?, ?, ?)
+    ''', [(key, plugin, payload, now, now) for key, plugin, payload in entries])
+
+def claim_due_notifications(claim_token, plugins, now=None, lease_seconds=NOTIFY_CLAIM_LEASE_SECONDS):
+    """
+    Claims every pending outbox entry for the given plugin names whose next attempt is
+    due and that no live worker holds, and returns the claimed rows, oldest first.
+    """
+    now = int(now or time.time())
+    plugins = list(plugins)
+    with immediate_transaction() as conn:
+        conn.execute(f'''
+            UPDATE notification_outbox SET claim_token=?, claimed_until=?
+            WHERE status='pending' AND next_attempt_epoch <= ?
+              AND (claimed_until IS NULL OR claimed_until < ?)
+              AND plugin IN ({",".join("?" * len(plugins))})
+        ''', [claim_token, now + lease_seconds, now, now] + plugins)
+        return conn.execute(
+            "SELECT * FROM notification_outbox WHERE claim_token=? AND status='pending' ORDER BY id",
+            (claim_token,)
+        ).fetchall()
+
+def mark_notifications_sent(ids, now=None):
+    now = int(now or time.time())
+    with get_db_connection() as conn:
+        conn.executemany('''
+            UPDATE notification_outbox
+            SET status='sent', attempts=attempts+1, sent_epoch=?, last_error=NULL,
+                claim_token=NULL, claimed_until=NULL
+            WHERE id=?
+        ''', [(now, id_) for id_ in ids])
+        conn.commit()
+
+def mark_notifications_failed(ids, error, retry_at):
+    """Schedules another attempt, or gives up (status 'dead') when retry_at is None."""
+    with get_db_connection() as conn:
+        conn.executemany('''
+            UPDATE notification_outbox
+            SET attempts=attempts+1, last_error=?,
+                status=CASE WHEN ? IS NULL THEN 'dead' ELSE 'pending' END,
+                next_attempt_epoch=COALESCE(?, next_attempt_epoch),
+                claim_token=NULL, claimed_until=NULL
+            WHERE id=?
+        ''', [(error, retry_at, retry_at, id_) for id_ in ids])
+        conn.commit()
+
+# --- Filtered reads: streamed RunRecords, or DataFrames for the dashboard data layer ---
+
+RUN_COLUMNS = (
+    'id', 'run_id', 'workflow_run_id', 'name', 'job_name', 'status', 'conclusion', 'created_at',
+    'updated_at', 'commit_sha', 'branch', 'url', 'created_epoch', 'updated_epoch', 'repo'
+)
+
+@lru_cache(maxsize=None)
+def run_record(columns=RUN_COLUMNS):
+    """The RunRecord namedtuple class for a tuple of workflow_runs columns (built once per shape)."""
+    return namedtuple("RunRecord", columns)
+
+def get_data_version(conn):
+    """
+    Returns SQLite's data_version for this connection: it changes whenever another
+    connection commits, so a long-lived reader can use it as a cache key.
+    """
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+def _select_columns(columns, prefix=""):
+    unknown = set(columns) - set(RUN_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown workflow_runs columns: {sorted(unknown)}")
+    return ", ".join(f"{prefix}{col}" for col in columns)
+
+def _runs_query(columns, names, branch, since_epoch, completed_only, repos):
+    clauses, params = [], []
+    if completed_only:
+        clauses.append("status = 'completed'")
+    if repos is not None:
+        clauses.append(f"repo IN ({','.join('?' * len(repos))})")
+        params.extend(repos)
+    if names is not None:
+        clauses.append(f"name IN ({','.join('?' * len(names))})")
+        params.extend(names)
+    if branch:
+        clauses.append("branch = ?")
+        params.append(branch)
+    if since_epoch is not None:
+        clauses.append("created_epoch >= ?")
+        params.append(since_epoch)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return f"SELECT {_select_columns(columns)} FROM workflow_runs {where} ORDER BY created_epoch DESC", params
+
+def iter_runs(conn, columns=RUN_COLUMNS, names=None, branch=None, since_epoch=None, completed_only=False, repos=None):
+    """
+    Streams runs newest first as RunRecords, with the filters applied in SQL.
+    `names` restricts to workflow names and `repos` to repositories (an empty list matches nothing).
+    """
+    columns = tuple(columns)
+    query, params = _runs_query(columns, names, branch, since_epoch, completed_only, repos)
+    return _records(conn, run_record(columns), query, params)
+
+def query_runs(conn, columns=RUN_COLUMNS, names=None, branch=None, since_epoch=None, completed_only=False, repos=None):
+    """The DataFrame form of iter_runs, for the dashboard data layer."""
+    return _read_frame(conn, *_runs_query(columns, names, branch, since_epoch, completed_only, repos))
+
+def query_latest_runs(conn, columns=RUN_COLUMNS):
+    """Reads each job's latest completed run via job_health (one indexed lookup per job)."""
+    query = f'''
+        SELECT {_select_columns(columns, "r.")}
+        FROM job_health h JOIN workflow_runs r ON r.run_id = h.last_run_id
+        ORDER BY r.created_epoch DESC
+    '''
+    return _read_frame(conn, query)
+
+def query_flakiness(conn):
+    """Every job's flakiness inputs from job_health: (repo, job_name, outcomes, flaky_commits, last_flake_epoch)."""
+    return conn.execute(
+        "SELECT repo, job_name, outcomes, flaky_commits, last_flake_epoch FROM job_health"
+    ).fetchall()
+
+def query_job_overview(conn):
+    """
+    One row per job for the static report: job_health joined to the job's latest
+    completed run (workflow name, branch, url), in repository and job name order.
+    """
+    return conn.execute('''
+        SELECT h.repo, h.job_name, h.last_run_id, h.last_conclusion, h.last_created_epoch, h.recent,
+               h.recent_successes, h.total_runs, h.total_successes, h.outcomes, h.flaky_commits, h.last_flake_epoch,
+               r.name, r.branch, r.url, r.created_at
+        FROM job_health h JOIN workflow_runs r ON r.run_id = h.last_run_id
+        ORDER BY h.repo, h.job_name
+    ''').fetchall()
+
+def query_job_runs(conn, repo, job_name, limit=None, completed_only=False):
+    """A job's runs newest first (index range scan on idx_runs_repo_job_created)."""
+    status = " AND status = 'completed'" if completed_only else ""
+    query = (
+        f"SELECT {_select_columns(RUN_COLUMNS)} FROM workflow_runs "
+        f"WHERE repo = ? AND job_name = ?{status} ORDER BY created_epoch DESC"
+    )
+    params = [repo, job_name]
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+    return conn.execute(query, params).fetchall()
+
 def get_all_runs():
     """Fetches all runs as a pandas DataFrame for the dashboard."""
     with get_db_connection() as conn:
-        query = "SELECT * FROM workflow_runs ORDER BY created_at DESC"
-        return pd.read_sql_query(query, conn)
+        query = "SELECT * FROM workflow_runs ORDER BY created_epoch DESC"
+        return _read_frame(conn, query)
 
 def get_recent_failures():
-    """Fetches completed runs that failed and haven't been notified yet."""
+    """Fetches completed runs that failed and haven't been notified yet, as RunRecords."""
     # This logic will be used by notifier.py
     with get_db_connection() as conn:
-        query = "SELECT * FROM workflow_runs WHERE status='completed' AND conclusion='failure' ORDER BY created_at DESC"
-        return conn.execute(query).fetchall()
+        query = (
+            f"SELECT {_select_columns(RUN_COLUMNS)} FROM workflow_runs "
+            f"WHERE status='completed' AND conclusion='failure' ORDER BY created_epoch DESC"
+        )
+        return list(_records(conn, run_record(), query))
 
 if __name__ == "__main__":
-    init_db()
-    print("Database initialized.")
+    metrics.configure("database")
+    version = init_db()
+    print(f"Database initialized (schema version {version}).")
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "rebuild-health":
+        print(f"Rebuilt job_health for {rebuild_job_health()} jobs.")
+    elif command == "check-health":
+        mismatches = check_job_health()
+        print(f"job_health mismatches: {mismatches}" if mismatches else "job_health is consistent.")
+    elif command == "compact":
+        print(f"Compacted {compact_runs()} runs older than {RUN_RETENTION_DAYS} days into the rollups.")
+        vacuum()
+        print("Database vacuumed.")
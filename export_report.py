@@ -1,13 +1,26 @@
 # export_report.py
 import os
+import re
+import gzip
 import json
-import pandas as pd
-from database import get_all_runs
-from normalizer import normalize_workflow_data
-from datetime import datetime
+import hashlib
+from html import escape
+import metrics
+from database import get_db_connection, query_job_overview, query_job_runs, query_rollups
+from normalizer import get_intent_label
+from flakiness import assess, describe
+from regressions import find_all_suspects, blame, latest_integrations, describe_pull
+from datetime import datetime, timezone
 
 REPORT_DIR = "dist"
 REPORT_FILE = os.path.join(REPORT_DIR, "index.html")
+JOBS_DIR = os.path.join(REPORT_DIR, "jobs")
+# Input hashes of the last build; the index and job pages are only rewritten when theirs change
+MANIFEST_FILE = os.path.join(REPORT_DIR, ".report-manifest.json")
+JOB_HISTORY_LIMIT = 200  # Runs listed on each job page
+JOB_TREND_DAYS = 30      # Daily rollup rows on each job page
+# Bump when the page markup changes so every page is rebuilt once
+REPORT_FORMAT_VERSION = 4
 
 HTML_TEMPLATE = """
 <!DOCTYPE html>
@@ -42,50 +55,219 @@ HTML_TEMPLATE = """
     </div>
 
     <table>
-        <tr><th>Job Name</th><th>Intent</th><th>Stability</th><th>Latest</th></tr>
-        {table_rows}
+        <tr><th>Repository</th><th>Job Name</th><th>Intent</th><th>Stability</th><th>Flakiness</th><th>Latest</th></tr>
+{table_rows}
     </table>
 
     <p style="margin-top: 40px; color: #8b949e; text-align: center;">Generated on {gen_time} | CNCF urunc LFX Prototype</p>
 </body>
 </html>
 """
+# Streamed in three parts: header, one chunk per table row, footer
+INDEX_HEAD, INDEX_TAIL = HTML_TEMPLATE.split("{table_rows}")
 
-def generate():
-    raw_df = get_all_runs()
-    if raw_df.empty: return
-    df = normalize_workflow_data(raw_df)
-    
-    pr_html = ""
-    if os.path.exists("latest_pr.json"):
-        with open("latest_pr.json", "r") as f: pr = json.load(f)
-        pr_html = f'<div class="pr-banner">Latest Merged PR: <b>{pr["title"]}</b> by @{pr["author"]}</div>'
-
-    latest_jobs = df.sort_values('created_at').groupby('job_name').tail(1)
-    rows = ""
-    for _, row in latest_jobs.iterrows():
-        job_data = df[df['job_name'] == row['job_name']]
-        rate = int((job_data.head(10)['conclusion'] == 'success').sum() / len(job_data.head(10)) * 100)
-        cls = "pass" if row['conclusion'] == 'success' else "fail"
-        rows += f"""
-        <tr>
-            <td>{row['job_name']}</td>
-            <td><span style="font-size: 0.7rem; color: #8b949e;">{row['intent']}</span></td>
+INDEX_ROW = """        <tr>
+            <td><span style="color: #8b949e;">{repo}</span></td>
+            <td><a href="jobs/{page}" style="color: #c9d1d9;">{job}</a></td>
+            <td><span style="font-size: 0.7rem; color: #8b949e;">{intent}</span></td>
             <td>{rate}%</td>
-            <td class="{cls}">{row['conclusion'].upper()}</td>
-        </tr>"""
-
-    full_html = HTML_TEMPLATE.format(
-        gen_time=datetime.now().strftime("%Y-%m-%d %H:%M"),
-        pr_html=pr_html, total=len(latest_jobs), 
-        passed=(latest_jobs['conclusion'] == 'success').sum(),
-        rate=int(((latest_jobs['conclusion'] == 'success').sum()/len(latest_jobs))*100),
-        table_rows=rows
+            <td title="{flaky_detail}">{flaky}</td>
+            <td class="{cls}">{conclusion}</td>
+        </tr>
+"""
+
+JOB_PAGE_HEAD = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <title>{job} - {repo} CI history</title>
+    <style>
+        body {{ font-family: -apple-system, sans-serif; background: #0d1117; color: #c9d1d9; padding: 40px; }}
+        a {{ color: #58a6ff; }}
+        table {{ width: 100%; border-collapse: collapse; margin-top: 30px; }}
+        th {{ text-align: left; color: #8b949e; padding: 10px; border-bottom: 2px solid #30363d; }}
+        td {{ padding: 10px; border-bottom: 1px solid #21262d; }}
+        .pass {{ color: #3fb950; font-weight: bold; }}
+        .fail {{ color: #f85149; font-weight: bold; }}
+    </style>
+</head>
+<body>
+    <p><a href="../index.html">&larr; All jobs</a></p>
+    <h1>{job}</h1>
+    <p>{repo} | {total} completed runs | last {window} successful: {rate}%</p>
+    <p>{flakiness}</p>
+    <h2>Last {days} days</h2>
+    <table>
+        <tr><th>Day</th><th>Runs</th><th>Success rate</th><th>Mean duration</th></tr>
+"""
+JOB_TREND_ROW = """        <tr><td>{day}</td><td>{runs}</td><td>{rate}</td><td>{duration}</td></tr>
+"""
+JOB_RUNS_HEAD = """    </table>
+    <h2>Recent runs</h2>
+    <table>
+        <tr><th>Run</th><th>Started</th><th>Branch</th><th>Commit</th><th>Result</th></tr>
+"""
+JOB_PAGE_ROW = """        <tr>
+            <td><a href="{url}">{run_id}</a></td>
+            <td>{created_at}</td>
+            <td>{branch}</td>
+            <td><code>{sha}</code></td>
+            <td class="{cls}">{result}</td>
+        </tr>
+"""
+JOB_PAGE_TAIL = """    </table>
+</body>
+</html>
+"""
+
+def job_page_name(repo, job_name):
+    """Stable, URL-safe file name for a job's history page."""
+    key = f"{repo}/{job_name}"
+    slug = re.sub(r"[^A-Za-z0-9._-]+", "-", key).strip("-").lower()
+    return f"{slug}-{hashlib.sha1(key.encode()).hexdigest()[:8]}.html"
+
+def _digest(*parts):
+    return hashlib.sha256(json.dumps([REPORT_FORMAT_VERSION, *parts], default=str).encode()).hexdigest()
+
+def _load_manifest():
+    try:
+        with open(MANIFEST_FILE, "r") as f: return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"index": None, "jobs": {}}
+
+def _write_page(path, chunks):
+    """
+    Streams chunks into `path` and a pre-compressed `path.gz` at the same time.
+    Both are written to temp files and renamed, so a deploy never picks up half a page.
+    """
+    with open(path + ".tmp", "w", encoding="utf-8") as out, \
+            gzip.GzipFile(path + ".gz.tmp", "wb", compresslevel=9, mtime=0) as gz:
+        for chunk in chunks:
+            out.write(chunk)
+            gz.write(chunk.encode("utf-8"))
+    os.replace(path + ".tmp", path)
+    os.replace(path + ".gz.tmp", path + ".gz")
+
+def _stability(job):
+    # job_health keeps the last JOB_HEALTH_WINDOW conclusions, so this is the last-10 rate
+    return int(job['recent_successes'] / len(job['recent']) * 100) if job['recent'] else 0
+
+def _flakiness(job):
+    return assess(job['outcomes'], job['flaky_commits'], job['last_flake_epoch'])
+
+def _index_chunks(jobs, pr_html):
+    passed = sum(job['last_conclusion'] == 'success' for job in jobs)
+    yield INDEX_HEAD.format(pr_html=pr_html, total=len(jobs), passed=passed, rate=int(passed / len(jobs) * 100))
+    for job in jobs:
+        flakiness = _flakiness(job)
+        yield INDEX_ROW.format(
+            page=job_page_name(job['repo'], job['job_name']),
+            repo=escape(job['repo']),
+            job=escape(job['job_name']),
+            intent=get_intent_label(job['name'])[0],
+            rate=_stability(job),
+            flaky=f"{'🎲 ' if flakiness.flaky else ''}{flakiness.score:.0%}",
+            flaky_detail=escape(describe(flakiness)),
+            cls="pass" if job['last_conclusion'] == 'success' else "fail",
+            conclusion=escape(str(job['last_conclusion']).upper()),
+        )
+    yield INDEX_TAIL.format(gen_time=datetime.now().strftime("%Y-%m-%d %H:%M"))
+
+def _job_page_chunks(job, trend, runs):
+    yield JOB_PAGE_HEAD.format(
+        job=escape(job['job_name']), repo=escape(job['repo']), total=job['total_runs'], window=len(job['recent']), rate=_stability(job),
+        flakiness=escape(describe(_flakiness(job))), days=JOB_TREND_DAYS,
     )
-    
-    if not os.path.exists(REPORT_DIR): os.makedirs(REPORT_DIR)
-    with open(REPORT_FILE, "w", encoding="utf-8") as f: f.write(full_html)
-    print(f"Ultimate report exported to {REPORT_FILE}")
+    for bucket in reversed(trend):
+        yield JOB_TREND_ROW.format(
+            day=datetime.fromtimestamp(bucket["bucket_epoch"], timezone.utc).strftime("%Y-%m-%d"),
+            runs=bucket['runs'],
+            rate=f"{bucket['success_rate']:.0f}%" if bucket['runs'] else "-",
+            duration=f"{bucket['mean_duration'] / 60:.1f} min" if bucket['mean_duration'] is not None else "-",
+        )
+    yield JOB_RUNS_HEAD
+    for run in runs:
+        result = run['conclusion']
+        yield JOB_PAGE_ROW.format(
+            url=escape(run['url'] or "#"),
+            run_id=run['run_id'],
+            created_at=escape(run['created_at'] or ""),
+            branch=escape(run['branch'] or ""),
+            sha=escape((run['commit_sha'] or "")[:8]),
+            cls="pass" if result == 'success' else "fail",
+            result=escape(str(result).upper()),
+        )
+    yield JOB_PAGE_TAIL
+
+def _pr_html(conn):
+    """Banner of each repository's latest merged PR, and the PR bisection blames for its failing jobs."""
+    suspects = blame(find_all_suspects(conn))
+    banners = []
+    for integration in latest_integrations(conn):
+        if integration.pull is None:
+            continue
+        html = f'Latest Merged PR: <b>{escape(integration.pull.title)}</b> by @{escape(integration.pull.author or "")}'
+        blamed = next(((pull, names) for repo, pull, names in suspects if repo == integration.repo), None)
+        if blamed:
+            pull, names = blamed
+            html += f'<br>Suspected of breaking {escape(", ".join(names))}: <b>{escape(describe_pull(pull))}</b>'
+        banners.append(f'<div class="pr-banner">{html}</div>')
+    return "".join(banners)
+
+@metrics.timed("export")
+def generate(force=False):
+    """
+    Builds dist/index.html and one history page per job, each with a .gz sibling.
+    Per-job stats come from job_health in one query; a page is rewritten only when
+    the hash of its input rows changed since the last build (or with force=True).
+    The manifest is keyed by page file name.
+    """
+    with get_db_connection() as conn:
+        jobs = query_job_overview(conn)
+        if not jobs: return
+        pr_html = _pr_html(conn)
+
+        manifest = {"index": None, "jobs": {}} if force else _load_manifest()
+        os.makedirs(JOBS_DIR, exist_ok=True)
+
+        # Daily rollups rather than raw runs, so the trend survives compaction
+        trend_since = (int(datetime.now().timestamp()) // 86400 - JOB_TREND_DAYS + 1) * 86400
+        # The flaky verdict ages out of the lookback window and the trend slides by a day at
+        # midnight, so both are hashed along with the row
+        job_hashes = {
+            job_page_name(job['repo'], job['job_name']): _digest(tuple(job), _flakiness(job).flaky, trend_since)
+            for job in jobs
+        }
+        rebuilt = 0
+        for job, (name, digest) in zip(jobs, job_hashes.items()):
+            page = os.path.join(JOBS_DIR, name)
+            if manifest["jobs"].get(name) == digest and os.path.exists(page):
+                continue
+            key = (job['repo'], job['job_name'])
+            trend = query_rollups(conn, 'daily', since_epoch=trend_since, jobs=[key])
+            runs = query_job_runs(conn, *key, JOB_HISTORY_LIMIT, completed_only=True)
+            _write_page(page, _job_page_chunks(job, trend, runs))
+            rebuilt += 1
+
+    # Pages of jobs that no longer exist (or that an older report format named differently)
+    for entry in os.listdir(JOBS_DIR):
+        if entry.removesuffix(".gz") not in job_hashes:
+            os.remove(os.path.join(JOBS_DIR, entry))
+
+    metrics.incr("report_pages_written_total", rebuilt, page="job")
+    index_hash = _digest(pr_html, sorted(job_hashes.items()))
+    if manifest["index"] == index_hash and os.path.exists(REPORT_FILE):
+        print(f"Report unchanged ({rebuilt} job pages rebuilt), skipping {REPORT_FILE}")
+    else:
+        _write_page(REPORT_FILE, _index_chunks(jobs, pr_html))
+        metrics.incr("report_pages_written_total", page="index")
+        print(f"Ultimate report exported to {REPORT_FILE} ({rebuilt}/{len(jobs)} job pages rebuilt)")
+
+    with open(MANIFEST_FILE + ".tmp", "w") as f:
+        json.dump({"index": index_hash, "jobs": job_hashes}, f)
+    os.replace(MANIFEST_FILE + ".tmp", MANIFEST_FILE)
 
 if __name__ == "__main__":
-    generate()
+    import sys
+    metrics.configure("export_report")
+    generate(force="--force" in sys.argv)
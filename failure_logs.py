@@ -0,0 +1,260 @@
+# failure_logs.py
+# Why did it fail? Downloads the logs of failed jobs and reduces each to its failing step
+# and a normalized error signature, so alerts can say what broke and whether it is the
+# same error as last time:
+#   python failure_logs.py                # fetch the logs of recent failures
+#   python failure_logs.py --show JOB_ID  # print a fetched job's failure and cached log
+# A workflow run's logs come as one zip archive (a folder per job, a file per step). It is
+# streamed to a temporary file and read member by member, line by line, so neither the
+# archive nor a log is ever held in memory whole. Each failed job's log is kept, gzipped,
+# in an on-disk LRU cache (LOG_CACHE_DIR, bounded by LOG_CACHE_MAX_MB).
+import gzip
+import hashlib
+import io
+import re
+import sys
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from cache import DiskLRUCache
+from config import (
+    GITHUB_API_BASE, LOG_CACHE_DIR, LOG_CACHE_MAX_MB, LOG_FETCH_LOOKBACK_HOURS, LOG_FETCH_MAX_JOBS,
+    JOB_FETCH_CONCURRENCY
+)
+from database import init_db, get_unfetched_failures, save_job_failures, get_job_failure
+
+# GitHub prefixes every log line with an ISO-8601 timestamp
+TIMESTAMP = re.compile(r"^\ufeff?\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(\.\d+)?Z ")
+ANSI = re.compile(r"\x1b\[[0-9;]*[A-Za-z]")
+ERROR_MARKER = "##[error]"
+# Runner messages that say a step failed, but not why
+GENERIC_ERRORS = re.compile(r"^(Process completed with exit code \d+|The operation was canceled)\.?$")
+ERROR_LINE = re.compile(r"error|fail|exception|panic|fatal|traceback|assert|timed? ?out", re.IGNORECASE)
+# Run-specific details replaced before hashing, most specific first
+NORMALIZERS = [
+    (re.compile(r"\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b", re.IGNORECASE), "<uuid>"),
+    (re.compile(r"\b(?=[0-9a-f]*\d)(?=[0-9a-f]*[a-f])[0-9a-f]{7,64}\b"), "<sha>"),
+    (re.compile(r"(/tmp|/var/folders|/home/runner/work/_temp)/\S+"), "<tmp>"),
+    (re.compile(r"\b0x[0-9a-f]+\b", re.IGNORECASE), "<addr>"),
+    (re.compile(r"\b\d+(\.\d+)?(ns|us|µs|ms|s|m|h)\b"), "<duration>"),
+    (re.compile(r"\d+"), "<n>"),
+]
+MAX_ERROR_CHARS = 300
+CONTEXT_LINES = 50  # Lines searched back from a generic ##[error] for the one that explains it
+CHUNK_BYTES = 64 * 1024
+
+Failure = namedtuple("Failure", "failing_step message signature error")
+NO_FAILURE = Failure(None, None, None, None)
+
+def clean(line):
+    """A log line without its timestamp and terminal colors."""
+    return ANSI.sub("", TIMESTAMP.sub("", line)).strip()
+
+def normalize(message):
+    """The error with run-specific details (ids, shas, paths, durations, numbers) replaced."""
+    for pattern, placeholder in NORMALIZERS:
+        message = pattern.sub(placeholder, message)
+    return " ".join(message.split())[:MAX_ERROR_CHARS]
+
+def signature(failing_step, error):
+    return hashlib.sha1(f"{failing_step}\n{error}".encode()).hexdigest()[:16]
+
+class StepScanner:
+    """Finds the line that explains a step's failure, fed one log line at a time."""
+
+    def __init__(self):
+        self.recent = deque(maxlen=CONTEXT_LINES)
+        self.error = None
+        self.explicit = False
+
+    def _last_error_line(self):
+        return next((line for line in reversed(self.recent) if ERROR_LINE.search(line)), None)
+
+    def feed(self, raw):
+        if self.explicit:
+            return
+        line = clean(raw)
+        if line.startswith(ERROR_MARKER):
+            message = line[len(ERROR_MARKER):].strip()
+            if GENERIC_ERRORS.match(message):
+                message = self._last_error_line() or message
+            self.error, self.explicit = message, True
+        elif line:
+            self.recent.append(line)
+
+    def result(self):
+        """(error line, explicit): explicit when the step carried an ##[error] annotation."""
+        if self.explicit:
+            return self.error, True
+        return self._last_error_line(), False
+
+def _file_key(name):
+    # Archive paths drop the characters file names cannot hold
+    return re.sub(r'[\\/:*?"<>|\s]', "", name).lower()
+
+def _step_of(filename):
+    """(number, name) of a "<n>_<step>.txt" member."""
+    number, _, name = filename.rsplit("/", 1)[-1].partition("_")
+    return (int(number) if number.isdigit() else 0), name.rsplit(".", 1)[0]
+
+def job_members(archive, job_name):
+    """
+    The job's logs in the archive as (step name, ZipInfo), in step order: its
+    "<job>/<n>_<step>.txt" members, or failing those the single "<n>_<job>.txt" log.
+    """
+    key = _file_key(job_name)
+    steps, whole = [], []
+    for info in archive.infolist():
+        folder, _, filename = info.filename.rpartition("/")
+        if folder and _file_key(folder) == key:
+            steps.append(info)
+        elif not folder and _file_key(_step_of(filename)[1]) == key:
+            whole.append(info)
+    steps.sort(key=lambda info: _step_of(info.filename)[0])
+    return [(_step_of(info.filename)[1], info) for info in steps] or [(None, info) for info in whole]
+
+def cache_key(job):
+    """Cache path of a job's log: repository, workflow run id, job id."""
+    return (job.repo.replace("/", "__"), str(job.workflow_run_id), f"{job.run_id}.log.gz")
+
+def read_failure(archive, job, cache=None):
+    """
+    Scans one job's logs in an open archive, copying them into `cache` as it goes.
+    The failing step is the first step with an ##[error] annotation or, without one,
+    the last step with an error-looking line.
+    """
+    members = job_members(archive, job.job_name)
+    if not members:
+        return NO_FAILURE
+    failing_step = message = None
+    explicit_found = False
+    with (cache.writer(cache_key(job)) if cache else io.BytesIO()) as out:
+        with gzip.open(out, "wt", encoding="utf-8") as log:
+            for step, info in members:
+                scanner = StepScanner()
+                with archive.open(info) as member:
+                    for line in io.TextIOWrapper(member, encoding="utf-8", errors="replace"):
+                        scanner.feed(line)
+                        log.write(line)
+                error, explicit = scanner.result()
+                if error and not explicit_found:
+                    failing_step, message, explicit_found = step, error, explicit
+    if not message:
+        return NO_FAILURE
+    error = normalize(message)
+    return Failure(failing_step, message[:MAX_ERROR_CHARS], signature(failing_step, error), error)
+
+def logs_url(repo, workflow_run_id):
+    return f"{GITHUB_API_BASE}/repos/{repo}/actions/runs/{workflow_run_id}/logs"
+
+def download_archive(session, url, fileobj, limiter=None):
+    """
+    Streams a log archive into `fileobj` (GitHub redirects to short-lived storage, which
+    requests follows without the token). Returns False when the logs are gone.
+    """
+    from collector import request_with_retry
+    response = request_with_retry(session, url, limiter, stream=True)
+    with response:
+        if response.status_code in (404, 410):
+            return False
+        response.raise_for_status()
+        for chunk in response.iter_content(CHUNK_BYTES):
+            fileobj.write(chunk)
+    return True
+
+def fetch_run_failures(session, cache, repo, workflow_run_id, jobs, limiter=None):
+    """{job run_id: Failure} for the failed `jobs` of one workflow run, or None to retry later."""
+    # Imported here, so the notifier starts without them when there is nothing to fetch
+    import tempfile
+    import zipfile
+    import requests
+    try:
+        with tempfile.TemporaryFile(dir=cache.directory) as archive_file:
+            if not download_archive(session, logs_url(repo, workflow_run_id), archive_file, limiter):
+                return {job.run_id: NO_FAILURE for job in jobs}
+            archive_file.seek(0)
+            with zipfile.ZipFile(archive_file) as archive:
+                return {job.run_id: read_failure(archive, job, cache) for job in jobs}
+    except (requests.exceptions.RequestException, zipfile.BadZipFile) as e:
+        metrics.incr("failure_log_errors_total")
+        print(f"Error fetching logs of run {workflow_run_id} ({repo}): {e}")
+        return None
+
+def fetch_failure_logs(jobs=None, session=None, limiter=None, now=None):
+    """
+    Fetches the logs of failed jobs (of `jobs`, or of every job) from the last
+    LOG_FETCH_LOOKBACK_HOURS that were not fetched yet, one archive per workflow run, and
+    stores their signatures. Returns the number of jobs processed.
+    """
+    now = int(now or time.time())
+    pending = get_unfetched_failures(jobs, now - LOG_FETCH_LOOKBACK_HOURS * 3600, LOG_FETCH_MAX_JOBS)
+    if not pending:
+        return 0
+    runs = {}
+    for job in pending:
+        runs.setdefault((job.repo, job.workflow_run_id), []).append(job)
+
+    from collector import create_session, RateLimiter
+    session = session or create_session()
+    limiter = limiter or RateLimiter()
+    cache = DiskLRUCache(LOG_CACHE_DIR, LOG_CACHE_MAX_MB * 1024 * 1024)
+    with metrics.span("logs.fetch"), ThreadPoolExecutor(max_workers=JOB_FETCH_CONCURRENCY) as pool:
+        results = list(pool.map(
+            lambda item: fetch_run_failures(session, cache, item[0][0], item[0][1], item[1], limiter), runs.items()
+        ))
+
+    rows = []
+    for run_jobs, failures in zip(runs.values(), results):
+        if failures is None:
+            continue
+        for job in run_jobs:
+            failure = failures[job.run_id]
+            rows.append((
+                job.repo, job.run_id, job.job_name, job.created_epoch,
+                failure.failing_step, failure.message, failure.signature, failure.error
+            ))
+    save_job_failures(rows, now)
+    evicted = cache.trim()
+    metrics.incr("failure_logs_total", len(rows))
+    print(f"Fetched logs of {len(rows)} failed jobs in {len(runs)} runs ({evicted} cached logs evicted)")
+    return len(rows)
+
+def read_log(failure, cache=None):
+    """The cached log text of a JobFailure, or None if it was evicted or never fetched."""
+    cache = cache or DiskLRUCache(LOG_CACHE_DIR, LOG_CACHE_MAX_MB * 1024 * 1024)
+    f = cache.open(cache_key(failure))
+    if f is None:
+        return None
+    with gzip.open(f, "rt", encoding="utf-8") as log:
+        return log.read()
+
+def describe(context):
+    """One-line alert text of a FailureContext: failing step, error, and whether it repeats."""
+    if context is None or not context.message:
+        return ""
+    text = f"{context.failing_step}: {context.message}" if context.failing_step else context.message
+    if context.repeats == 1:
+        text += " (same error as the previous failed run)"
+    elif context.repeats:
+        text += f" (same error as the last {context.repeats} failed runs)"
+    return text
+
+if __name__ == "__main__":
+    # Imported here: the notifier imports this module, and argparse costs it ~3 ms of startup
+    import argparse
+    parser = argparse.ArgumentParser(description="Fetch failed jobs' logs and extract error signatures")
+    parser.add_argument("--show", type=int, metavar="JOB_ID", help="Print a fetched job's failure and cached log")
+    args = parser.parse_args()
+
+    metrics.configure("failure_logs")
+    init_db()
+    if args.show:
+        failure = get_job_failure(args.show)
+        if failure is None:
+            print(f"No fetched log for job {args.show}")
+            sys.exit(1)
+        print(f"{failure.repo} / {failure.job_name}: {failure.failing_step}: {failure.message} [{failure.signature}]")
+        print(read_log(failure) or "(log no longer cached)")
+    else:
+        fetch_failure_logs()
@@ -0,0 +1,53 @@
+# flakiness.py
+# Tells flaky jobs from real breakage. Scores come from state job_health keeps current
+# as runs are ingested (see database.py), so scoring a job never reads its history:
+#   outcomes          the job's last FLAKINESS_WINDOW conclusions, newest first (S/F/C/X)
+#   flaky_commits     commits on which the job both passed and failed
+#   last_flake_epoch  when the most recent of those commits first did
+# A real breakage flips once and then keeps failing; a flaky job keeps flipping.
+import time
+from collections import namedtuple
+from config import FLAKY_FLIP_RATE, FLAKY_MIN_RUNS, FLAKY_COMMIT_LOOKBACK_DAYS
+
+# score is the flip rate (0-1); flaky is the verdict the notifier, dashboard and report share
+Flakiness = namedtuple("Flakiness", "score flip_rate failure_rate runs flaky_commits recent_flake flaky")
+
+def flip_rate(outcomes):
+    """Share of consecutive pass/fail pairs whose conclusion flipped (cancelled runs break a pair)."""
+    pairs = flips = 0
+    for newer, older in zip(outcomes, outcomes[1:]):
+        if newer in "SF" and older in "SF":
+            pairs += 1
+            flips += newer != older
+    return flips / pairs if pairs else 0.0
+
+def failure_rate(outcomes):
+    """Share of the window's pass/fail runs that failed."""
+    failures = outcomes.count("F")
+    decided = failures + outcomes.count("S")
+    return failures / decided if decided else 0.0
+
+def assess(outcomes, flaky_commits=0, last_flake_epoch=None, now=None):
+    """
+    Scores one job. It is flaky when it flipped in at least FLAKY_FLIP_RATE of its
+    consecutive pass/fail runs (given FLAKY_MIN_RUNS of them), or when a commit both
+    passed and failed it within the last FLAKY_COMMIT_LOOKBACK_DAYS.
+    """
+    outcomes = outcomes or ""
+    now = now or time.time()
+    runs = outcomes.count("S") + outcomes.count("F")
+    flips = flip_rate(outcomes)
+    recent_flake = bool(last_flake_epoch) and last_flake_epoch >= now - FLAKY_COMMIT_LOOKBACK_DAYS * 86400
+    flaky = recent_flake or (runs >= FLAKY_MIN_RUNS and flips >= FLAKY_FLIP_RATE)
+    return Flakiness(
+        score=flips, flip_rate=flips, failure_rate=failure_rate(outcomes), runs=runs,
+        flaky_commits=flaky_commits or 0, recent_flake=recent_flake, flaky=flaky,
+    )
+
+def describe(flakiness):
+    """One-line summary for the dashboard and report."""
+    text = f"{flakiness.flip_rate:.0%} flips, {flakiness.failure_rate:.0%} failing (last {flakiness.runs})"
+    if flakiness.flaky_commits:
+        commits = "commit" if flakiness.flaky_commits == 1 else "commits"
+        text += f", {flakiness.flaky_commits} {commits} both passed and failed"
+    return f"🎲 Flaky: {text}" if flakiness.flaky else text
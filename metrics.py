@@ -0,0 +1,252 @@
+# metrics.py
+# Lightweight pipeline instrumentation: stage spans, SQLite query timings, HTTP
+# latency/status counts and the GitHub rate-limit budget. Off unless METRICS_DIR is
+# set; then each process writes <METRICS_DIR>/<component>.prom (Prometheus textfile
+# format, e.g. for node_exporter) and appends one JSON line per run to runs.jsonl.
+import atexit
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import lru_cache, wraps
+from urllib.parse import urlsplit
+from config import METRICS_DIR
+
+PREFIX = "urunc_ci"
+
+_enabled = False
+_component = None
+_lock = threading.Lock()
+_started = time.time()
+# (metric, labels) -> value; labels are sorted (name, value) tuples
+_counters = {}
+_gauges = {}
+# (metric, labels) -> [count, sum, max]
+_timings = {}
+_spans = []  # Run log: (name, start offset, seconds) since the last flush, in completion order
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        observe("stage_seconds", elapsed, stage=self.name)
+        with _lock:
+            _spans.append((self.name, round(time.time() - _started - elapsed, 6), round(elapsed, 6)))
+        return False
+
+def configure(component, metrics_dir=METRICS_DIR):
+    """
+    Turns instrumentation on for this process when `metrics_dir` is set; the metrics
+    are written there at exit (or on flush()). Scripts call this once from __main__.
+    """
+    global _enabled, _component
+    if not metrics_dir or _enabled:
+        return
+    _enabled, _component = True, component
+    os.makedirs(metrics_dir, exist_ok=True)
+    atexit.register(flush, metrics_dir)
+
+def enabled():
+    return _enabled
+
+def span(name):
+    """Context manager timing one pipeline stage (a shared no-op when disabled)."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+def timed(name):
+    """Decorator form of span()."""
+    def decorate(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def _key(metric, labels):
+    return metric, tuple(sorted(labels.items()))
+
+def incr(metric, value=1, **labels):
+    if not _enabled:
+        return
+    key = _key(metric, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(metric, value, **labels):
+    if not _enabled or value is None:
+        return
+    with _lock:
+        _gauges[_key(metric, labels)] = float(value)
+
+def observe(metric, seconds, **labels):
+    """Records one duration into a count/sum/max summary."""
+    if not _enabled:
+        return
+    key = _key(metric, labels)
+    with _lock:
+        timing = _timings.get(key)
+        if timing is None:
+            _timings[key] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            timing[2] = max(timing[2], seconds)
+
+# --- SQLite ---
+
+@lru_cache(maxsize=1024)
+def query_label(sql):
+    """Collapses a statement into a stable label: whitespace folded, IN lists of any length merged."""
+    sql = re.sub(r"\s+", " ", sql).strip()
+    sql = re.sub(r"\((?:\?\s*,\s*)+\?\)", "(?...)", sql)
+    return sql if len(sql) <= 120 else sql[:117] + "..."
+
+class TracedCursor(sqlite3.Cursor):
+    def execute(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, *args)
+        finally:
+            observe("sqlite_query_seconds", time.perf_counter() - start, query=query_label(sql))
+
+    def executemany(self, sql, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, *args)
+        finally:
+            observe("sqlite_query_seconds", time.perf_counter() - start, query=query_label(sql))
+
+class TracedConnection(sqlite3.Connection):
+    """Times every execute/executemany (the statement's first step, i.e. writes and the first row)."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+def _trace(sql):
+    # Also sees statements the sqlite3 module issues itself (BEGIN/COMMIT) and each
+    # executemany iteration, so this counts what SQLite actually ran
+    incr("sqlite_statements_total", kind=sql.lstrip()[:6].upper().rstrip())
+
+def connection_factory():
+    """sqlite3.connect factory: the plain Connection unless instrumentation is on."""
+    return TracedConnection if _enabled else sqlite3.Connection
+
+def trace_connection(conn):
+    if _enabled:
+        conn.set_trace_callback(_trace)
+    return conn
+
+# --- HTTP ---
+
+@lru_cache(maxsize=1024)
+def endpoint_label(url):
+    """URL path with numeric ids templated: /repos/o/r/actions/runs/123/jobs -> .../runs/{id}/jobs."""
+    return re.sub(r"/\d+(?=/|$)", "/{id}", urlsplit(url).path)
+
+def record_http(seconds, status, url):
+    """One HTTP exchange; `status` is the response code or the exception class name."""
+    if not _enabled:
+        return
+    endpoint = endpoint_label(url)
+    observe("http_request_seconds", seconds, endpoint=endpoint)
+    incr("http_responses_total", status=str(status), endpoint=endpoint)
+
+def record_rate_limit(headers):
+    if not _enabled:
+        return
+    set_gauge("github_rate_limit_remaining", headers.get("X-RateLimit-Remaining"))
+    set_gauge("github_rate_limit_reset_epoch", headers.get("X-RateLimit-Reset"))
+
+# --- Export ---
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _series(metric, labels, suffix=""):
+    label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    return f"{PREFIX}_{metric}{suffix}" + (f"{{{label_text}}}" if label_text else "")
+
+def render_prometheus():
+    """The current metrics in Prometheus text exposition format."""
+    with _lock:
+        counters, gauges, timings = dict(_counters), dict(_gauges), {k: list(v) for k, v in _timings.items()}
+    lines = []
+    for kind, table in (("counter", counters), ("gauge", gauges)):
+        for metric in sorted({metric for metric, _ in table}):
+            lines.append(f"# TYPE {PREFIX}_{metric} {kind}")
+            lines.extend(
+                f"{_series(metric, labels)} {value:g}"
+                for (name, labels), value in sorted(table.items()) if name == metric
+            )
+    for metric in sorted({metric for metric, _ in timings}):
+        series = [(labels, timing) for (name, labels), timing in sorted(timings.items()) if name == metric]
+        lines.append(f"# TYPE {PREFIX}_{metric} summary")
+        for labels, (count, total, _) in series:
+            lines.append(f"{_series(metric, labels, '_count')} {count}")
+            lines.append(f"{_series(metric, labels, '_sum')} {total:.6f}")
+        lines.append(f"# TYPE {PREFIX}_{metric}_max gauge")
+        lines.extend(f"{_series(metric, labels, '_max')} {peak:.6f}" for labels, (_, _, peak) in series)
+    lines.append(f"# TYPE {PREFIX}_last_run_epoch gauge")
+    lines.append(f"{_series('last_run_epoch', ())} {int(time.time())}")
+    return "\n".join(lines) + "\n"
+
+def run_log():
+    """The spans since the last flush and this process's totals as one JSON-serializable record."""
+    with _lock:
+        return {
+            "component": _component,
+            "started": int(_started),
+            "duration": round(time.time() - _started, 6),
+            "spans": [{"stage": name, "start": start, "seconds": seconds} for name, start, seconds in _spans],
+            "counters": [[metric, dict(labels), value] for (metric, labels), value in _counters.items()],
+            "gauges": [[metric, dict(labels), value] for (metric, labels), value in _gauges.items()],
+            "timings": [
+                [metric, dict(labels), {"count": count, "sum": round(total, 6), "max": round(peak, 6)}]
+                for (metric, labels), (count, total, peak) in _timings.items()
+            ],
+        }
+
+def flush(metrics_dir=METRICS_DIR):
+    """
+    Writes <component>.prom atomically and, if stages ran since the last flush, appends
+    them to runs.jsonl. Long-running processes call this after every cycle.
+    """
+    if not _enabled:
+        return
+    prom_path = os.path.join(metrics_dir, f"{_component}.prom")
+    with open(prom_path + ".tmp", "w") as f:
+        f.write(render_prometheus())
+    os.replace(prom_path + ".tmp", prom_path)
+    if not _spans:
+        return
+    record = run_log()
+    with _lock:
+        del _spans[:len(record["spans"])]
+    with open(os.path.join(metrics_dir, "runs.jsonl"), "a") as f:
+        f.write(json.dumps(record) + "\n")
@@ -1,12 +1,25 @@
 # mock_collector.py
 import random
-import json
-import os
 from datetime import datetime, timedelta
-from database import init_db, save_run
+from config import DEFAULT_REPOSITORY
+from database import init_db, save_runs, save_commits, save_commit_pulls
 
-def generate_mock_data(count=150):
-    """Generates elite data with REQUIRED/EXPERIMENTAL tiers and failing streaks."""
+REPO = DEFAULT_REPOSITORY
+MAINLINE_PRS = {
+    457: ("feat: optimized hypercall path for urunc-vmm", "ananos"),
+    462: ("fix: retry unikernel boot on transient vsock errors", "cmainas"),
+    465: ("docs: document the hypervisor selection order", "gntouts"),
+}
+AUTHORS = ["ananos", "cmainas", "gntouts", "jimi"]
+
+def generate_mock_data(count=150, seed=None):
+    """
+    Generates elite data with REQUIRED/EXPERIMENTAL tiers and failing streaks.
+    Pass a seed for reproducible data; ids are sequential from the current time, so
+    repeated runs append new rows instead of colliding. For large volumes use workload.py.
+    """
+    rng = random.Random(seed)
+    next_id = int(datetime.now().timestamp()) * 1000
     print(f"Generating {count} mock workflow runs for The Chosen One (V7)...")
     
     # Categorized Workflows
@@ -17,19 +30,27 @@ def generate_mock_data(count=150):
         "Release": ["build (amd64)", "build (arm64)"]
     }
     
-    # 1. Maintainer Context (Latest PR + Result)
-    pr_info = {
-        "id": 457,
-        "title": "feat: optimized hypercall path for urunc-vmm",
-        "author": "ananos",
-        "merged_at": (datetime.now() - timedelta(hours=4)).isoformat(),
-        "url": "https://github.com/containers/urunc/pull/457",
-        "ci_impact": "FAILURE" # Mentors care about this link!
-    }
-    with open("latest_pr.json", "w") as f:
-        json.dump(pr_info, f)
+    # 1. Maintainer Context: a mainline commit per 8-hour slot, each merged from a PR.
+    # "unit-test (amd64)" starts failing in slot 8, so bisection blames PR #457.
+    mainline, pulls = [], {}
+    for i in range(14, -1, -1):
+        sha = f"{rng.getrandbits(160):040x}"
+        number = 465 - i
+        title, author = MAINLINE_PRS.get(number, (f"chore: maintenance update #{number}", rng.choice(AUTHORS)))
+        merged_at = (datetime.now() - timedelta(hours=i*8 + 3)).isoformat()
+        mainline.append({
+            "sha": sha, "parent_sha": mainline[-1]["sha"] if mainline else None, "committed_at": merged_at,
+            "author": author, "title": f"{title} (#{number})", "url": f"https://github.com/{REPO}/commit/{sha}",
+        })
+        pulls[sha] = [{
+            "number": number, "title": title, "author": author, "merged_at": merged_at,
+            "url": f"https://github.com/{REPO}/pull/{number}",
+        }]
+    save_commits(REPO, mainline)
+    save_commit_pulls(REPO, pulls)
 
     # 2. Runs with Streaks
+    mock_runs = []
     for wf, jobs in workflows.items():
         for job in jobs:
             # Determine if this job is currently in a failure streak
@@ -37,7 +58,8 @@ def generate_mock_data(count=150):
             is_chronic = "unit-test (amd64)" in job
             
             for i in range(15):
-                run_id = random.randint(1000000, 9000000)
+                run_id = next_id
+                next_id += 1
                 
                 # i=0 is most recent. i=14 is oldest.
                 # If chronic, last 10 runs are failures
@@ -46,10 +68,10 @@ def generate_mock_data(count=150):
                 else:
                     # Success probability
                     prob = 0.9 if "REQUIRED" in job.upper() else 0.7
-                    conclusion = "success" if random.random() < prob else "failure"
+                    conclusion = "success" if rng.random() < prob else "failure"
                 
                 # Timestamp: spaced by 8 hours
-                created_at = (datetime.now() - timedelta(hours=i*8 + random.randint(0, 2))).isoformat()
+                created_at = (datetime.now() - timedelta(hours=i*8 + rng.randint(0, 2))).isoformat()
                 
                 mock_run = {
                     "id": run_id,
@@ -59,12 +81,14 @@ def generate_mock_data(count=150):
                     "conclusion": conclusion,
                     "created_at": created_at,
                     "updated_at": created_at,
-                    "head_sha": f"sha{random.randint(1000, 9999)}",
-                    "head_branch": "main" if i < 5 else "dev",
-                    "html_url": f"https://github.com/containers/urunc/actions/runs/{run_id}"
+                    "head_sha": mainline[14 - i]["sha"] if i < 10 else f"{rng.getrandbits(160):040x}",
+                    "head_branch": "main" if i < 10 else "dev",
+                    "html_url": f"https://github.com/{REPO}/actions/runs/{run_id}"
                 }
-                save_run(mock_run)
-        
+                mock_runs.append(mock_run)
+
+    counts = save_runs(mock_runs)
+    print(f"Saved {counts['inserted']} new and {counts['updated']} updated runs.")
     print("V7 'The Chosen One' data generation complete.")
 
 if __name__ == "__main__":
@@ -0,0 +1,423 @@
+# mock_server.py
+# Local stand-in for the GitHub Actions API.
+# Serves canned, paginated workflow runs and their jobs with ETag / Link / X-RateLimit-*
+# headers, optional latency and injected 5xx failures, so the collector can be
+# exercised without touching api.github.com. It also accepts Slack-style webhook posts
+# on /hooks/slack, so alert delivery can be tested against the same failure injection:
+#
+#   python mock_server.py --port 8765 --runs 230
+#   GITHUB_API_BASE=http://localhost:8765 python collector.py
+# Any /repos/{owner}/{repo} path works: each repository gets its own seeded history on
+# first use (ids never collide), so REPOSITORIES=a/x,b/y exercises multi-repo collection.
+#   SLACK_WEBHOOK_URL=http://localhost:8765/hooks/slack python notifier.py
+# Every run is a commit on main, merged from its own PR, so /commits and /commits/{sha}/pulls
+# describe a mainline whose shas match the runs' head_sha.
+# Run logs are zip archives behind a redirect, as on GitHub; failed jobs log one of a few
+# recurring errors with run-specific numbers, so signature extraction can be exercised:
+#   GITHUB_API_BASE=http://localhost:8765 FAILURE_LOGS=1 python notifier.py
+# The rate limit defaults to an authenticated budget; --rate-limit 60 --rate-window 60 mimics
+# an unauthenticated one (with a short window), answering 403 once it is spent, as GitHub does.
+import argparse
+import hashlib
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+import zipfile
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+WORKFLOWS = {
+    "CI": ["build (amd64)", "build (arm64)"],
+    "Unit Tests": ["unit-test (amd64)", "unit-test (arm64)"],
+    "E2E test": ["e2e (fedora)", "e2e (ubuntu)", "integration-test"],
+    "Lint code": ["lint"],
+    "Nightly Build": ["nightly (amd64)", "benchmarks"],
+}
+RATE_LIMIT = 5000
+DEFAULT_REPO = "containers/urunc"
+# Errors failed jobs log in their test step; {n} and {sha} vary from run to run
+LOG_ERRORS = [
+    ["--- FAIL: TestContainerStart ({n}.{n}s)", "    main_test.go:{n}: expected exit code 0, got {n}",
+     "##[error]Process completed with exit code 1."],
+    ["panic: runtime error: index out of range [{n}] with length {n}", "goroutine {n} [running]:",
+     "##[error]Process completed with exit code 2."],
+    ["##[error]Timed out waiting for VM {sha} to boot after {n}s"],
+]
+LOG_STEPS = ["Set up job", "Run actions/checkout@v4", "Run tests", "Complete job"]
+PR_TITLES = ["fix: retry VM boot on EAGAIN", "feat: add hypervisor option", "ci: bump runner image",
+             "refactor: split the unikernel loader", "docs: update install guide", "perf: cache rootfs lookups"]
+PR_AUTHORS = ["ananos", "cmainas", "gntouts", "neo"]
+
+class MockGitHub:
+    """In-memory state behind the stand-in server."""
+
+    def __init__(self, runs=120, seed=42, latency=0.0, fail_rate=0.0, rate_limit=RATE_LIMIT, rate_window=3600):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.initial_runs = runs
+        self.repos = {}  # "owner/name" -> runs, newest first like the real API
+        self.jobs = {}  # run id -> jobs
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.next_id = 1000000
+        self.clock = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rate_remaining = rate_limit
+        self.rate_reset = time.time() + rate_window
+        self.requests_served = 0
+        self.webhook_messages = []  # (idempotency key, payload) received on /hooks/slack
+        self.add_runs(runs)
+
+    @property
+    def runs(self):
+        """The default repository's runs."""
+        return self.repos[DEFAULT_REPO]
+
+    def _repo_runs(self, repo):
+        """A repository's run list, seeded with `initial_runs` runs on first use (lock held)."""
+        if repo not in self.repos:
+            self.repos[repo] = []
+            for _ in range(self.initial_runs):
+                self._add_run(repo, "completed")
+        return self.repos[repo]
+
+    @staticmethod
+    def _ts(dt):
+        return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+    def add_runs(self, count, status="completed", repo=DEFAULT_REPO):
+        """Appends `count` new runs, as if a burst of pushes just happened."""
+        with self.lock:
+            self.repos.setdefault(repo, [])
+            for _ in range(count):
+                self._add_run(repo, status)
+
+    def _add_run(self, repo, status):
+        self.clock += timedelta(minutes=7)
+        self.next_id += 1
+        run_id = self.next_id
+        name = self.rng.choice(sorted(WORKFLOWS))
+        completed = status == "completed"
+        conclusion = ("success" if self.rng.random() < 0.8 else "failure") if completed else None
+        self.jobs[run_id] = self._make_jobs(repo, run_id, name, status, conclusion)
+        self.repos[repo].insert(0, {
+            "id": run_id,
+            "name": name,
+            "status": status,
+            "conclusion": conclusion,
+            "created_at": self._ts(self.clock),
+            "updated_at": self._ts(self.clock + timedelta(minutes=5)),
+            "head_sha": f"{run_id:040x}",
+            "head_branch": "main",
+            "html_url": f"https://github.com/{repo}/actions/runs/{run_id}",
+            "repository": {"full_name": repo},
+        })
+
+    def _make_jobs(self, repo, run_id, workflow, status, conclusion):
+        names = WORKFLOWS[workflow]
+        failing = self.rng.choice(names) if conclusion == "failure" else None
+        jobs = []
+        for name in names:
+            self.next_id += 1
+            job_conclusion = None
+            if conclusion:
+                job_conclusion = "failure" if name == failing else "success"
+            jobs.append({
+                "id": self.next_id,
+                "name": name,
+                "status": status,
+                "conclusion": job_conclusion,
+                "started_at": self._ts(self.clock + timedelta(minutes=1)),
+                "completed_at": self._ts(self.clock + timedelta(minutes=4)) if conclusion else None,
+                "head_sha": f"{run_id:040x}",
+                "html_url": f"https://github.com/{repo}/actions/runs/{run_id}/job/{self.next_id}",
+            })
+        return jobs
+
+    def complete_run(self, run_id, conclusion="success"):
+        """Finishes a queued/in-progress run, bumping its updated_at."""
+        with self.lock:
+            self.clock += timedelta(minutes=10)
+            for run in (run for runs in self.repos.values() for run in runs):
+                if run["id"] == run_id:
+                    run.update(status="completed", conclusion=conclusion, updated_at=self._ts(self.clock))
+            for job in self.jobs.get(run_id, []):
+                job.update(status="completed", conclusion=conclusion, completed_at=self._ts(self.clock))
+
+    def charge(self):
+        """Spends one request of the current rate-limit window; False once the window's budget is gone."""
+        with self.lock:
+            if time.time() >= self.rate_reset:
+                self.rate_remaining, self.rate_reset = self.rate_limit, time.time() + self.rate_window
+            if self.rate_remaining <= 0:
+                return False
+            self.rate_remaining -= 1
+            return True
+
+    def rerun(self, run_id):
+        """Re-runs a run: it goes back to queued with the same id and created_at, like a GitHub re-run."""
+        with self.lock:
+            self.clock += timedelta(minutes=10)
+            for run in (run for runs in self.repos.values() for run in runs):
+                if run["id"] == run_id:
+                    run.update(status="queued", conclusion=None, updated_at=self._ts(self.clock))
+            for job in self.jobs.get(run_id, []):
+                job.update(status="queued", conclusion=None, completed_at=None)
+
+    def page(self, page, per_page, repo=DEFAULT_REPO, status=None):
+        with self.lock:
+            runs = self._repo_runs(repo)
+            if status:
+                runs = [run for run in runs if run["status"] == status]
+            start = (page - 1) * per_page
+            return {"total_count": len(runs), "workflow_runs": runs[start:start + per_page]}
+
+    def run_jobs(self, run_id):
+        with self.lock:
+            jobs = self.jobs.get(run_id)
+            return None if jobs is None else {"total_count": len(jobs), "jobs": jobs}
+
+    def _pull(self, repo, run):
+        number = run["id"] - 1000000
+        return {
+            "number": number,
+            "title": PR_TITLES[number % len(PR_TITLES)],
+            "user": {"login": PR_AUTHORS[number % len(PR_AUTHORS)]},
+            "merged_at": run["created_at"],
+            "html_url": f"https://github.com/{repo}/pull/{number}",
+        }
+
+    def commits(self, page, per_page, repo=DEFAULT_REPO):
+        """A page of the mainline, newest first: one commit per run, each the parent of the next."""
+        with self.lock:
+            runs = self._repo_runs(repo)
+            start = (page - 1) * per_page
+            commits = []
+            for i, run in enumerate(runs[start:start + per_page], start):
+                parent = runs[i + 1]["head_sha"] if i + 1 < len(runs) else None
+                pull = self._pull(repo, run)
+                commits.append({
+                    "sha": run["head_sha"],
+                    "commit": {
+                        # Squash-merged, as GitHub titles them
+                        "message": f"{pull['title']} (#{pull['number']})",
+                        "author": {"name": pull["user"]["login"], "date": run["created_at"]},
+                        "committer": {"name": "GitHub", "date": run["created_at"]},
+                    },
+                    "author": pull["user"],
+                    "html_url": f"https://github.com/{repo}/commit/{run['head_sha']}",
+                    "parents": [{"sha": parent}] if parent else [],
+                })
+            return commits, len(runs)
+
+    def commit_pulls(self, sha, repo=DEFAULT_REPO):
+        with self.lock:
+            run = next((run for run in self._repo_runs(repo) if run["head_sha"] == sha), None)
+            return None if run is None else [self._pull(repo, run)]
+
+    def log_archive(self, run_id):
+        """
+        The run's logs as GitHub's zip layout ("<job>/<n>_<step>.txt"), or None. Which error
+        a failed job logs depends on the job and, coarsely, the run, so errors recur.
+        """
+        with self.lock:
+            jobs = self.jobs.get(run_id)
+            if jobs is None:
+                return None
+            jobs = [dict(job) for job in jobs]
+        rng = random.Random(run_id)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            for job in jobs:
+                for number, step in enumerate(LOG_STEPS, 1):
+                    lines = [f"Starting: {step}"] + [f"output line {i} of {step}" for i in range(rng.randint(5, 50))]
+                    if step == "Run tests" and job["conclusion"] == "failure":
+                        template = LOG_ERRORS[zlib.crc32(f"{job['name']}/{run_id // 50}".encode()) % len(LOG_ERRORS)]
+                        lines += [
+                            re.sub(r"\{n\}", lambda _: str(rng.randint(1, 999)), line)
+                                .replace("{sha}", f"{rng.getrandbits(48):012x}")
+                            for line in template
+                        ]
+                    timestamp = (job["started_at"] or "2026-01-01T00:00:00Z").replace("Z", ".0000000Z")
+                    archive.writestr(
+                        f"{job['name']}/{number}_{step}.txt", "".join(f"{timestamp} {line}\n" for line in lines)
+                    )
+        return buffer.getvalue()
+
+class MockGitHubHandler(BaseHTTPRequestHandler):
+    state = None  # MockGitHub, set by serve()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _rate_headers(self):
+        self.send_header("X-RateLimit-Limit", str(self.state.rate_limit))
+        self.send_header("X-RateLimit-Remaining", str(self.state.rate_remaining))
+        self.send_header("X-RateLimit-Reset", str(math.ceil(self.state.rate_reset)))
+
+    def _send_rate_limited(self):
+        body = b'{"message": "API rate limit exceeded"}'
+        self.send_response(403)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self._rate_headers()
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload, link_base=None, page=1, per_page=30, total=None):
+        body = json.dumps(payload).encode()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            # Conditional hits are free on the real API too
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self._rate_headers()
+            self.end_headers()
+            return
+
+        if not self.state.charge():
+            self._send_rate_limited()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self._rate_headers()
+        if link_base:
+            last = max(1, -(-(payload["total_count"] if total is None else total) // per_page))
+            links = []
+            if page < last:
+                links.append(f'<{link_base}?per_page={per_page}&page={page + 1}>; rel="next"')
+            links.append(f'<{link_base}?per_page={per_page}&page={last}>; rel="last"')
+            self.send_header("Link", ", ".join(links))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_faults(self):
+        """Applies the configured latency; returns True if this request should fail."""
+        self.state.requests_served += 1
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.fail_rate and self.state.rng.random() < self.state.fail_rate:
+            self.send_response(502)
+            self.end_headers()
+            return True
+        return False
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self._inject_faults():
+            return
+        if urlparse(self.path).path == "/hooks/slack":
+            with self.state.lock:
+                self.state.webhook_messages.append((self.headers.get("X-Idempotency-Key"), json.loads(body)))
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"ok")
+            return
+        self.send_response(404)
+        self.end_headers()
+
+    def do_GET(self):
+        if self._inject_faults():
+            return
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        parts = parsed.path.strip("/").split("/")
+
+        # /repos/{owner}/{repo}/actions/runs
+        if len(parts) == 5 and parts[0] == "repos" and parts[3:] == ["actions", "runs"]:
+            page = int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", ["30"])[0])
+            host = f"http://{self.headers.get('Host')}"
+            repo = f"{parts[1]}/{parts[2]}"
+            status = query.get("status", [None])[0]
+            self._send_json(self.state.page(page, per_page, repo, status), f"{host}{parsed.path}", page, per_page)
+            return
+
+        # /repos/{owner}/{repo}/commits and /repos/{owner}/{repo}/commits/{sha}/pulls
+        if len(parts) == 4 and parts[0] == "repos" and parts[3] == "commits":
+            page = int(query.get("page", ["1"])[0])
+            per_page = int(query.get("per_page", ["30"])[0])
+            commits, total = self.state.commits(page, per_page, f"{parts[1]}/{parts[2]}")
+            host = f"http://{self.headers.get('Host')}"
+            self._send_json(commits, f"{host}{parsed.path}", page, per_page, total)
+            return
+        if len(parts) == 6 and parts[0] == "repos" and parts[3] == "commits" and parts[5] == "pulls":
+            pulls = self.state.commit_pulls(parts[4], f"{parts[1]}/{parts[2]}")
+            if pulls is not None:
+                self._send_json(pulls)
+                return
+
+        # /repos/{owner}/{repo}/actions/runs/{run_id}/jobs
+        if len(parts) == 7 and parts[0] == "repos" and parts[3:5] == ["actions", "runs"] and parts[6] == "jobs":
+            payload = self.state.run_jobs(int(parts[5]))
+            if payload is not None:
+                self._send_json(payload)
+                return
+
+        # /repos/{owner}/{repo}/actions/runs/{run_id}/logs redirects to the archive, like GitHub
+        if len(parts) == 7 and parts[0] == "repos" and parts[3:5] == ["actions", "runs"] and parts[6] == "logs":
+            if int(parts[5]) in self.state.jobs:
+                if not self.state.charge():
+                    self._send_rate_limited()
+                    return
+                self.send_response(302)
+                self.send_header("Location", f"http://{self.headers.get('Host')}/_blobs/logs/{parts[5]}.zip")
+                self.send_header("Content-Length", "0")
+                self._rate_headers()
+                self.end_headers()
+                return
+
+        # /_blobs/logs/{run_id}.zip
+        if len(parts) == 3 and parts[:2] == ["_blobs", "logs"] and parts[2].endswith(".zip"):
+            archive = self.state.log_archive(int(parts[2][:-len(".zip")]))
+            if archive is not None:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/zip")
+                self.send_header("Content-Length", str(len(archive)))
+                self.end_headers()
+                self.wfile.write(archive)
+                return
+
+        self.send_response(404)
+        self.end_headers()
+
+def serve(port=0, runs=120, seed=42, latency=0.0, fail_rate=0.0, rate_limit=RATE_LIMIT, rate_window=3600):
+    """Starts the stand-in on a background thread. Returns (server, state, base_url)."""
+    state = MockGitHub(
+        runs=runs, seed=seed, latency=latency, fail_rate=fail_rate, rate_limit=rate_limit, rate_window=rate_window
+    )
+    handler = type("BoundHandler", (MockGitHubHandler,), {"state": state})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local GitHub Actions API stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--runs", type=int, default=120)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of requests answered with 502")
+    parser.add_argument("--rate-limit", type=int, default=RATE_LIMIT, help="Requests allowed per rate-limit window")
+    parser.add_argument("--rate-window", type=int, default=3600, help="Seconds until the rate limit resets")
+    args = parser.parse_args()
+
+    server, state, base_url = serve(
+        args.port, args.runs, latency=args.latency, fail_rate=args.fail_rate,
+        rate_limit=args.rate_limit, rate_window=args.rate_window
+    )
+    print(f"Mock GitHub API serving {len(state.runs)} runs at {base_url}")
+    print(f"Use: GITHUB_API_BASE={base_url} python collector.py")
+    print(f"     SLACK_WEBHOOK_URL={base_url}/hooks/slack python notifier.py")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,33 +1,53 @@
 # normalizer.py
+import re
+from functools import lru_cache
+from config import INTENT_RULES, DEFAULT_INTENT
 
+# Rules compiled once: one case-insensitive alternation per tier, in priority order
+_COMPILED_RULES = [
+    (intent, icon, re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE))
+    for intent, icon, keywords in INTENT_RULES if keywords
+]
+INTENT_ORDER = [intent for intent, _, _ in INTENT_RULES] + [DEFAULT_INTENT[0]]
+INTENT_ICONS = dict([(intent, icon) for intent, icon, _ in INTENT_RULES] + [DEFAULT_INTENT])
+
+# Columns with a handful of distinct values, stored as categoricals
+CATEGORICAL_COLUMNS = ['conclusion', 'status', 'branch', 'repo']
+
+@lru_cache(maxsize=4096)
 def get_intent_label(workflow_name):
-    """Categorizes workflows into tiers based on maintainer priority."""
-    name = workflow_name.lower()
-    
-    # 1. REQUIRED (Mission Critical)
-    if any(x in name for x in ["unit-test", "lint", "build (amd64)"]):
-        return "REQUIRED", "🛡️"
-        
-    # 2. NIGHTLY (Stability tracking)
-    if "nightly" in name or "e2e" in name:
-        return "NIGHTLY", "🌙"
-        
-    # 3. EXPERIMENTAL / OPTIONAL
-    if any(x in name for x in ["arm64", "experimental", "bench"]):
-        return "EXPERIMENTAL", "🧪"
-        
-    # Default
-    return "CI", "⚙️"
+    """Categorizes workflows into tiers based on maintainer priority (see config.INTENT_RULES)."""
+    for intent, icon, pattern in _COMPILED_RULES:
+        if pattern.search(workflow_name or ""):
+            return intent, icon
+    return DEFAULT_INTENT
+
+def is_required(name):
+    return get_intent_label(name)[0] == "REQUIRED"
+
+def categorize(names):
+    """
+    Intent of every name as a categorical Series (categories in INTENT_ORDER).
+    The rules run once per distinct name; rows only carry an integer code.
+    """
+    import numpy as np
+    import pandas as pd
+
+    names = names.astype('category')
+    # Missing names have code -1, which picks the trailing default slot
+    labels = [get_intent_label(name)[0] for name in names.cat.categories] + [DEFAULT_INTENT[0]]
+    lookup = np.array([INTENT_ORDER.index(label) for label in labels])
+    codes = lookup[names.cat.codes.to_numpy()]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=INTENT_ORDER), index=names.index)
 
 def normalize_workflow_data(df):
     """Adds intent labels, standardizes columns, and derives health signals."""
-    import pandas as pd
-    
     if df.empty:
         return df
         
     # Tiered Categorization
-    df['intent'], df['intent_icon'] = zip(*df['name'].apply(get_intent_label))
+    df['intent'] = categorize(df['name'])
+    df['intent_icon'] = df['intent'].map(INTENT_ICONS)
     
     # Column Consistency (Solving KeyErrors permanently)
     rename_map = {
@@ -38,7 +58,56 @@ def normalize_workflow_data(df):
     for old, new in rename_map.items():
         if old in df.columns and new not in df.columns:
             df[new] = df[old]
+
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
             
     # Success Rate (Last 10)
     # This is calculated per job_name
     return df
+
+def summarize_jobs(df, history=5, window=10):
+    """
+    Computes per-job health for every job in one vectorized pass.
+
+    Returns one row per job (newest run's columns, e.g. `conclusion`, `intent`,
+    `created_epoch`) plus `history` (last `history` conclusions, newest first),
+    `streak` (consecutive passes or failures sharing the newest pass/fail conclusion;
+    cancelled and other runs are skipped, as in job_health) and `success_rate`
+    (percent successful over the last `window` runs). A job is a (repo, job_name) pair
+    when there is a `repo` column; rows are ordered by repo, then job name.
+    """
+    import pandas as pd
+
+    if df.empty:
+        return pd.DataFrame(columns=list(df.columns) + ['history', 'streak', 'success_rate'])
+
+    keys = [col for col in ('repo', 'job_name') if col in df.columns]
+    for col in keys:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            # Categoricals sort in category order (e.g. snapshot dictionary order); make that name order
+            df = df.assign(**{col: df[col].cat.reorder_categories(sorted(df[col].cat.categories))})
+
+    # Newest first within each job; stable so equal timestamps keep their input order
+    ordered = df.sort_values(keys + ['created_epoch'], ascending=[True] * len(keys) + [False], kind='stable')
+    # One integer per job, in sorted order
+    jobs = ordered.groupby(keys, sort=False, observed=True).ngroup() if len(keys) > 1 else ordered['job_name']
+    rank = ordered.groupby(jobs, sort=False).cumcount()
+
+    summary = ordered[rank == 0].set_axis(jobs[rank == 0])
+
+    # The streak ends at the first pass/fail differing from the newest pass/fail; other runs are skipped
+    conclusion = ordered['conclusion'].astype(object)
+    decided = conclusion.isin(['success', 'failure'])
+    newest = conclusion.where(decided).groupby(jobs, sort=False).transform('first')
+    broken = (decided & (conclusion != newest)).groupby(jobs, sort=False).cummax()
+    summary['streak'] = (decided & ~broken).groupby(jobs, sort=False).sum()
+
+    recent = ordered[rank < window]
+    summary['success_rate'] = ((recent['conclusion'] == 'success').groupby(jobs[rank < window]).mean() * 100).round().astype(int)
+
+    last_n = ordered[rank < history]
+    summary['history'] = last_n['conclusion'].astype(object).groupby(jobs[rank < history]).agg(list)
+
+    return summary.reset_index(drop=True)
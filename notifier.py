@@ -1,112 +1,282 @@
 # notifier.py
 import json
-import os
-import requests
-from database import get_db_connection
-from config import SLACK_WEBHOOK_URL
-from datetime import datetime
+import time
+import hashlib
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from database import (
+    get_job_health, immediate_transaction, job_filter, save_notification_states, import_notification_state_json,
+    enqueue_notifications, claim_due_notifications, mark_notifications_sent, mark_notifications_failed,
+    get_failure_context
+)
+from normalizer import is_required
+from flakiness import assess
+from failure_logs import fetch_failure_logs, describe as describe_failure
+from regressions import find_suspects_of, describe as describe_suspects
+from config import (
+    SLACK_WEBHOOK_URL, SLACK_DIGEST, NOTIFY_CONCURRENCY, NOTIFY_MAX_ATTEMPTS, NOTIFY_BACKOFF_SECONDS,
+    DEFAULT_REPOSITORY, FLAKY_ALERT_POLICY, FLAKY_CONFIRM_STREAK, FAILURE_LOGS
+)
 
-# Path to store the last notified run IDs to avoid spamming (Alert Fatigue Prevention)
+# Legacy notification state file, imported once into the notification_state table
 LAST_NOTIFIED_JSON = "last_notified_state.json"
 
-def load_notification_state():
-    if os.path.exists(LAST_NOTIFIED_JSON):
-        with open(LAST_NOTIFIED_JSON, "r") as f:
-            return json.load(f)
-    return {}
-
-def save_notification_state(state):
-    with open(LAST_NOTIFIED_JSON, "w") as f:
-        json.dump(state, f)
+class NotificationError(Exception):
+    """Raised by a plugin when a delivery failed and should be retried."""
 
 class NotificationPlugin:
-    def notify(self, alert_type, workflow, job, run_id, branch, url, duration_str=""):
+    name = "plugin"
+    # Digest plugins receive all alerts of one evaluation cycle in a single notify_batch call
+    digest = False
+
+    def notify(self, alert_type, workflow, job, run_id, branch, url, duration_str="", repo=DEFAULT_REPOSITORY, failure="", suspect=""):
         pass
 
+    def notify_batch(self, alerts):
+        """Delivers a list of AlertDecisions. Raise to have the outbox retry them later."""
+        for a in alerts:
+            self.notify(a.alert_type, a.workflow, a.job, a.run_id, a.branch, a.url, a.duration_str, a.repo, a.failure, a.suspect)
+
 class ConsoleNotifier(NotificationPlugin):
-    def notify(self, alert_type, workflow, job, run_id, branch, url, duration_str=""):
+    name = "console"
+
+    def notify(self, alert_type, workflow, job, run_id, branch, url, duration_str="", repo=DEFAULT_REPOSITORY, failure="", suspect=""):
         duration_info = f" | {duration_str}" if duration_str else ""
-        print(f"\n📢 [{alert_type}] {workflow} / {job}{duration_info}")
-        print(f"   Branch: {branch} | Run: {run_id}")
-        print(f"   URL: {url}")
+        lines = [f"\n📢 [{alert_type}] {repo}: {workflow} / {job}{duration_info}", f"   Branch: {branch} | Run: {run_id}"]
+        if failure:
+            lines.append(f"   Error: {failure}")
+        if suspect:
+            lines.append(f"   Suspect: {suspect}")
+        lines.append(f"   URL: {url}")
+        # One write per alert: deliveries run concurrently, and separate prints would interleave
+        print("\n".join(lines))
 
 class SlackRealNotifier(NotificationPlugin):
-    def notify(self, alert_type, workflow, job, run_id, branch, url, duration_str=""):
-        if not SLACK_WEBHOOK_URL:
-            print("⚠️ SLACK_WEBHOOK_URL not set. Skipping Slack notification.")
-            return
-        
+    name = "slack"
+
+    def __init__(self, webhook_url=SLACK_WEBHOOK_URL, digest=SLACK_DIGEST, session=None):
+        # Imported here, so console-only runs start without loading requests
+        import requests
+        self.webhook_url = webhook_url
+        self.digest = digest
+        # Pooled keep-alive session shared by concurrent deliveries
+        self.session = session or requests.Session()
+
+    @staticmethod
+    def format_alert(alert_type, workflow, job, branch, url, duration_str="", repo=DEFAULT_REPOSITORY, failure="", suspect=""):
         # Alerts are sent only on failure transitions or critical priorities to avoid alert fatigue
         emoji = "🚨" if "REQUIRED" in alert_type or "HARD" in alert_type else "⚠️"
         duration_msg = f"\n*Duration:* {duration_str}" if duration_str else ""
-        
-        payload = {
-            "text": f"{emoji} *CI Alert: {alert_type}*\n*Job:* {job}\n*Workflow:* {workflow}\n*Branch:* {branch}{duration_msg}\n<{url}|View Run Details>"
-        }
-        
+        failure_msg = f"\n*Error:* `{failure}`" if failure else ""
+        suspect_msg = f"\n*Suspect:* {suspect}" if suspect else ""
+        return (
+            f"{emoji} *CI Alert: {alert_type}*\n*Repository:* {repo}\n*Job:* {job}\n*Workflow:* {workflow}"
+            f"\n*Branch:* {branch}{duration_msg}{failure_msg}{suspect_msg}\n<{url}|View Run Details>"
+        )
+
+    def _post(self, text, idempotency_key):
+        import requests
         try:
-            response = requests.post(SLACK_WEBHOOK_URL, json=payload, timeout=10)
-            if response.status_code == 200:
-                print(f"✅ Slack alert sent for {job}")
-            else:
-                print(f"❌ Slack notification failed: {response.text}")
-        except Exception as e:
-            print(f"❌ Slack error: {e}")
-
-def get_failure_duration(job_name):
-    """Calculates how long a job has been failing in the current streak."""
-    with get_db_connection() as conn:
-        cursor = conn.execute(
-            "SELECT created_at, conclusion FROM workflow_runs WHERE job_name=? ORDER BY created_at DESC", 
-            (job_name,)
+            response = self.session.post(
+                self.webhook_url, json={"text": text},
+                headers={"X-Idempotency-Key": idempotency_key}, timeout=10
+            )
+        except requests.exceptions.RequestException as e:
+            raise NotificationError(f"Slack error: {e}") from e
+        if response.status_code != 200:
+            raise NotificationError(f"Slack notification failed ({response.status_code}): {response.text}")
+
+    def notify(self, alert_type, workflow, job, run_id, branch, url, duration_str="", repo=DEFAULT_REPOSITORY, failure="", suspect=""):
+        if not self.webhook_url:
+            print("⚠️ SLACK_WEBHOOK_URL not set. Skipping Slack notification.")
+            return
+        self._post(
+            self.format_alert(alert_type, workflow, job, branch, url, duration_str, repo, failure, suspect),
+            f"{repo}/{job}:{run_id}"
         )
-        runs = cursor.fetchall()
-        
-        failure_start = None
-        for run in runs:
-            if run['conclusion'] == 'failure':
-                failure_start = run['created_at']
-            elif run['conclusion'] == 'success':
-                break
-                
-        if failure_start:
-            start_dt = datetime.fromisoformat(failure_start)
-            now = datetime.now()
-            diff = now - start_dt
-            if diff.days > 0: return f"Failing for {diff.days} days"
-            return f"Failing for {int(diff.seconds // 3600)} hours"
+        print(f"✅ Slack alert sent for {job}")
+
+    def notify_batch(self, alerts):
+        if not self.digest or len(alerts) == 1:
+            return super().notify_batch(alerts)
+        if not self.webhook_url:
+            print("⚠️ SLACK_WEBHOOK_URL not set. Skipping Slack notification.")
+            return
+        sections = [
+            self.format_alert(a.alert_type, a.workflow, a.job, a.branch, a.url, a.duration_str, a.repo, a.failure, a.suspect)
+            for a in alerts
+        ]
+        text = f"*{len(alerts)} CI alerts in this cycle*\n\n" + "\n\n".join(sections)
+        key = hashlib.sha256("|".join(sorted(alert_key(a) for a in alerts)).encode()).hexdigest()
+        self._post(text, key)
+        print(f"✅ Slack digest sent for {len(alerts)} alerts")
+
+def format_failure_duration(streak_start_epoch):
+    diff = int(time.time()) - streak_start_epoch
+    if diff >= 86400: return f"Failing for {diff // 86400} days"
+    return f"Failing for {diff // 3600} hours"
+
+def get_failure_duration(job_name, repo=DEFAULT_REPOSITORY):
+    """Calculates how long a job has been failing in the current streak (job_health lookup)."""
+    health = get_job_health(job_name, repo).get((repo, job_name))
+    if health and health.last_conclusion == 'failure':
+        return format_failure_duration(health.streak_start_epoch)
     return ""
 
-def run_notifier():
+# One alert per job per failure transition; `transition_id` is the run that started the streak.
+# `repo`, `failure` (failing step and error, see failure_logs.describe) and `suspect` (the
+# PR bisected as having broken the job on the mainline, see regressions.describe) come last
+# with defaults, so outbox payloads written before them still decode.
+AlertDecision = namedtuple(
+    "AlertDecision", "alert_type workflow job run_id branch url duration_str transition_id repo failure suspect",
+    defaults=(DEFAULT_REPOSITORY, "", "")
+)
+
+def evaluate_alerts(conn, jobs=None, flaky_policy=FLAKY_ALERT_POLICY):
+    """
+    Decides which alerts to send in a single set-based pass.
+    One query reads every job whose latest completed run failed, with its streak start
+    (from job_health), its latest run's details and its notification state; a job is
+    alerted once per transition to failure, identified by the run that started the streak.
+    `jobs` restricts the pass to those (repo, job_name) keys.
+    Failures of flaky jobs follow `flaky_policy` (see FLAKY_ALERT_POLICY); a suppressed
+    failure is not recorded, so it alerts later if the streak reaches FLAKY_CONFIRM_STREAK.
+    """
+    condition, params = job_filter(jobs, "h.") if jobs is not None else ("1", [])
+    rows = conn.execute(f'''
+        SELECT h.repo, h.job_name, h.streak_start_epoch, h.streak_start_run_id, h.streak_length,
+               h.outcomes, h.flaky_commits, h.last_flake_epoch,
+               r.run_id, r.name, r.branch, r.url
+        FROM job_health h
+        JOIN workflow_runs r ON r.run_id = h.last_run_id
+        LEFT JOIN notification_state s ON s.repo = h.repo AND s.job_name = h.job_name
+        WHERE h.last_conclusion = 'failure' AND {condition}
+          AND (s.transition_id IS NULL OR s.transition_id != CAST(h.streak_start_run_id AS TEXT))
+        ORDER BY h.last_created_epoch DESC
+    ''', params).fetchall()
+
+    decisions = []
+    now = time.time()
+    failures = get_failure_context(conn, [row['run_id'] for row in rows])
+    suspects = find_suspects_of(conn, [(row['repo'], row['job_name']) for row in rows])
+    for row in rows:
+        alert_type = "REQUIRED JOB FAILURE" if is_required(row['job_name']) else "CI FAILURE"
+        flaky = flaky_policy in ("downgrade", "suppress") and assess(
+            row['outcomes'], row['flaky_commits'], row['last_flake_epoch'], now
+        ).flaky
+        if flaky and flaky_policy == "downgrade":
+            alert_type = "FLAKY JOB FAILURE"
+        elif flaky and row['streak_length'] < FLAKY_CONFIRM_STREAK:
+            metrics.incr("alerts_suppressed_total", reason="flaky")
+            continue
+        decisions.append(AlertDecision(
+            alert_type=alert_type,
+            workflow=row['name'],
+            job=row['job_name'],
+            run_id=row['run_id'],
+            branch=row['branch'],
+            url=row['url'],
+            duration_str=format_failure_duration(row['streak_start_epoch']),
+            transition_id=str(row['streak_start_run_id']),
+            repo=row['repo'],
+            failure=describe_failure(failures.get(row['run_id'])),
+            suspect=describe_suspects(suspects.get((row['repo'], row['job_name']))),
+        ))
+    return decisions
+
+def alert_key(alert):
+    """Idempotency key of an alert: one per job per failure transition."""
+    return f"{alert.repo}/{alert.job}:{alert.transition_id}"
+
+def _deliver(plugin, rows):
+    """Runs one plugin delivery; returns None on success or the error message."""
+    try:
+        plugin.notify_batch([AlertDecision(**json.loads(row['payload'])) for row in rows])
+        return None
+    except Exception as e:
+        return str(e) or e.__class__.__name__
+
+def dispatch_outbox(notifiers, now=None):
+    """
+    Claims and delivers every due outbox entry. Digest plugins get one batch per cycle, other
+    plugins get one delivery per alert; deliveries run concurrently. Failures are
+    retried with exponential backoff until NOTIFY_MAX_ATTEMPTS.
+    Returns (sent, failed) counts.
+    """
+    now = int(now or time.time())
+    due = {}
+    for row in claim_due_notifications(uuid.uuid4().hex, [plugin.name for plugin in notifiers], now):
+        due.setdefault(row['plugin'], []).append(row)
+
+    deliveries = []
+    for plugin in notifiers:
+        rows = due.get(plugin.name, [])
+        if plugin.digest and rows:
+            deliveries.append((plugin, rows))
+        else:
+            deliveries.extend((plugin, [row]) for row in rows)
+    if not deliveries:
+        return 0, 0
+
+    with ThreadPoolExecutor(max_workers=NOTIFY_CONCURRENCY) as pool:
+        errors = list(pool.map(lambda delivery: _deliver(*delivery), deliveries))
+
+    sent, failed = 0, 0
+    for (plugin, rows), error in zip(deliveries, errors):
+        ids = [row['id'] for row in rows]
+        if error is None:
+            mark_notifications_sent(ids, now)
+            sent += len(ids)
+            continue
+        failed += len(ids)
+        # All rows of a delivery share a batch, so they share the attempt count
+        attempts = max(row['attempts'] for row in rows) + 1
+        retry_at = now + NOTIFY_BACKOFF_SECONDS * 2 ** (attempts - 1) if attempts < NOTIFY_MAX_ATTEMPTS else None
+        mark_notifications_failed(ids, error, retry_at)
+        print(f"❌ {plugin.name} delivery failed (attempt {attempts}): {error}")
+    return sent, failed
+
+def get_notifiers():
+    notifiers = [ConsoleNotifier()]
+    if SLACK_WEBHOOK_URL:
+        notifiers.append(SlackRealNotifier())
+    else:
+        print("⚠️ SLACK_WEBHOOK_URL not set. Skipping Slack notification.")
+    return notifiers
+
+def run_notifier(notifiers=None, jobs=None):
+    """Evaluates alerts (for every job, or only the (repo, job_name) keys in `jobs`) and delivers them."""
     print("Checking for CI Regressions (V8 Production Slack)...")
-    notifiers = [ConsoleNotifier(), SlackRealNotifier()]
-    
-    # Load previously notified state to avoid duplicate alerts (Maintainer Empathy)
-    notified_state = load_notification_state()
-    new_state = dict(notified_state)
+    notifiers = notifiers or get_notifiers()
     
-    with get_db_connection() as conn:
-        latest_runs = conn.execute("SELECT * FROM workflow_runs ORDER BY created_at DESC LIMIT 50").fetchall()
-        
-    for run in latest_runs:
-        job_name = run['job_name']
-        run_id = str(run['run_id'])
-        
-        # Only notify if this is a failure AND we haven't already notified for this specific run_id
-        if run['conclusion'] == 'failure' and notified_state.get(job_name) != run_id:
-            duration = get_failure_duration(job_name)
-            
-            # Priority logic
-            is_required = any(x in job_name.lower() for x in ["unit-test", "lint", "build (amd64)"])
-            alert_type = "REQUIRED JOB FAILURE" if is_required else "CI FAILURE"
-            
-            for n in notifiers:
-                n.notify(alert_type, run['name'], job_name, run['run_id'], run['branch'], run['url'], duration)
-            
-            # Update state to prevent re-notifying for this run
-            new_state[job_name] = run_id
-            
-    save_notification_state(new_state)
+    import_notification_state_json(LAST_NOTIFIED_JSON)
+    if FAILURE_LOGS:
+        # Before the transaction below: downloads must not hold the write lock
+        try:
+            fetch_failure_logs(jobs)
+        except Exception as e:
+            metrics.incr("failure_log_errors_total")
+            print(f"⚠️ Failure log retrieval failed: {e!r}")
+
+    # Decision, state update and outbox enqueue commit together; the write lock is held
+    # from the first read, so concurrent notifier workers cannot alert the same transition twice
+    with metrics.span("notify.evaluate"), immediate_transaction() as conn:
+        alerts = evaluate_alerts(conn, jobs)
+        enqueue_notifications(conn, [
+            (alert_key(alert), plugin.name, json.dumps(alert._asdict()))
+            for alert in alerts for plugin in notifiers
+        ])
+        save_notification_states(conn, [(alert.repo, alert.job, alert.transition_id) for alert in alerts])
+
+    metrics.incr("alerts_total", len(alerts))
+    with metrics.span("notify.dispatch"):
+        sent, failed = dispatch_outbox(notifiers)
+    metrics.incr("notifications_total", sent, result="sent")
+    metrics.incr("notifications_total", failed, result="failed")
+    print(f"Delivered {sent} notifications, {failed} failed.")
 
 if __name__ == "__main__":
+    metrics.configure("notifier")
     run_notifier()
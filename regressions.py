@@ -0,0 +1,114 @@
+# regressions.py
+# Which change broke it? Bisects every job failing on MAINLINE_BRANCH over the commits
+# table (see collector.fetch_commits): the job's last passing run and the first failure
+# after it bound a range of mainline commits, read with one range scan over their
+# first-parent positions, and the PRs merged as those commits are the suspects.
+# Any number of jobs is bisected with three queries (bounds, ranges, PRs) of index
+# seeks, so this runs per notifier evaluation and per page render.
+#   python regressions.py   # suspects of every failing job
+import time
+from collections import namedtuple
+from database import (
+    get_db_connection, init_db, bisect_jobs, query_job_overview, query_commit_ranges, query_commit_pulls,
+    query_pulls_by_commit, query_mainline_heads, query_commit_conclusions
+)
+from flakiness import assess
+
+# commits: the mainline commits that may have broken the job, oldest first (only the failing
+# one when the last pass is unknown); pulls: the PRs merged as them
+Suspects = namedtuple("Suspects", "repo job_name fail_sha pass_sha commits pulls fail_url")
+# The newest mainline commit of a repository, its PR and the result of its runs
+Integration = namedtuple("Integration", "repo commit pull ci_impact")
+
+def suspect_range(bisection):
+    """(repo, after_position, through_position) of the commits that may have broken a job, or None."""
+    if bisection.fail_position is None:
+        # The failing commit is not on the synced mainline (not collected yet, or a branch)
+        return None
+    if bisection.pass_position is not None and bisection.pass_position < bisection.fail_position:
+        return (bisection.repo, bisection.pass_position, bisection.fail_position)
+    # Never passed (or not on a synced commit): the failing commit is the only one known bad
+    return (bisection.repo, bisection.fail_position - 1, bisection.fail_position)
+
+def find_suspects_of(conn, jobs):
+    """{(repo, job_name): Suspects} of the given jobs failing on the mainline; passing jobs are left out."""
+    bisections = bisect_jobs(conn, jobs)
+    ranges = {key: suspect_range(bisection) for key, bisection in bisections.items()}
+    commits = query_commit_ranges(conn, {commit_range for commit_range in ranges.values() if commit_range})
+    pulls = query_pulls_by_commit(conn, {(commit.repo, commit.sha) for found in commits.values() for commit in found})
+    suspects = {}
+    for key, bisection in bisections.items():
+        suspect_commits = commits[ranges[key]] if ranges[key] else []
+        suspect_pulls = {pull for commit in suspect_commits for pull in pulls.get((commit.repo, commit.sha), [])}
+        suspects[key] = Suspects(
+            bisection.repo, bisection.job_name, bisection.fail_sha, bisection.pass_sha, suspect_commits,
+            sorted(suspect_pulls, key=lambda pull: (pull.merged_epoch or 0, pull.number)), bisection.fail_url
+        )
+    return suspects
+
+def find_all_suspects(conn, include_flaky=False):
+    """
+    Suspects of every job whose latest run failed, in repository and job order. Flaky jobs
+    are left out unless `include_flaky`: their latest failure rarely points at a change.
+    """
+    now = time.time()
+    failing = [
+        job for job in query_job_overview(conn)
+        if job['last_conclusion'] == 'failure'
+        and (include_flaky or not assess(job['outcomes'], job['flaky_commits'], job['last_flake_epoch'], now).flaky)
+    ]
+    found = find_suspects_of(conn, [(job['repo'], job['job_name']) for job in failing])
+    return [found[key] for key in ((job['repo'], job['job_name']) for job in failing) if key in found]
+
+def blame(all_suspects):
+    """[(repo, PullRequest, [job names])], the PRs suspected by the most failing jobs first."""
+    jobs = {}
+    for suspects in all_suspects:
+        for pull in suspects.pulls:
+            jobs.setdefault((suspects.repo, pull), []).append(suspects.job_name)
+    return sorted(
+        ((repo, pull, names) for (repo, pull), names in jobs.items()), key=lambda item: (-len(item[2]), -item[1].number)
+    )
+
+def latest_integrations(conn):
+    """An Integration per repository with synced commits."""
+    integrations = []
+    for commit in query_mainline_heads(conn):
+        pulls = query_commit_pulls(conn, commit.repo, [commit.sha])
+        conclusions = query_commit_conclusions(conn, commit.repo, commit.sha)
+        if conclusions.get('failure'):
+            ci_impact = "FAILURE"
+        elif conclusions and set(conclusions) <= {'success', 'skipped'}:
+            ci_impact = "SUCCESS"
+        else:
+            ci_impact = "PENDING"
+        integrations.append(Integration(commit.repo, commit, pulls[-1] if pulls else None, ci_impact))
+    return integrations
+
+def describe_pull(pull):
+    return f"PR #{pull.number} {pull.title}" + (f" by @{pull.author}" if pull.author else "")
+
+def describe(suspects):
+    """One-line summary of a job's Suspects for alerts and pages."""
+    if suspects is None or not suspects.commits:
+        return ""
+    if len(suspects.pulls) == 1:
+        return describe_pull(suspects.pulls[0])
+    if suspects.pulls:
+        numbers = ", ".join(f"#{pull.number}" for pull in suspects.pulls[:5])
+        more = f" and {len(suspects.pulls) - 5} more" if len(suspects.pulls) > 5 else ""
+        return f"one of {len(suspects.pulls)} PRs: {numbers}{more}"
+    if len(suspects.commits) == 1:
+        return f"commit {suspects.commits[0].sha[:7]} {suspects.commits[0].title}"
+    return f"{len(suspects.commits)} commits {suspects.commits[0].sha[:7]}..{suspects.commits[-1].sha[:7]}"
+
+if __name__ == "__main__":
+    init_db()
+    with get_db_connection() as conn:
+        all_suspects = find_all_suspects(conn)
+    if not all_suspects:
+        print("No job is failing on the mainline.")
+    for suspects in all_suspects:
+        since = f"since {suspects.pass_sha[:7]}" if suspects.pass_sha else "(no passing run)"
+        print(f"{suspects.repo} / {suspects.job_name}: first failed at {suspects.fail_sha[:7]} {since}")
+        print(f"   Suspect: {describe(suspects) or 'commit not on the synced mainline'}")
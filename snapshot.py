@@ -0,0 +1,197 @@
+# snapshot.py
+# Columnar on-disk snapshot of the run history, loaded by memory-mapping:
+#   python snapshot.py export
+#   python snapshot.py load
+# One .npy file per column (epochs as int64, everything else dictionary-encoded to
+# small integer codes) plus meta.json holding the string dictionaries and the
+# SQLite watermarks the snapshot was taken at.
+import json
+import os
+import shutil
+import sys
+import time
+import numpy as np
+import database
+from config import SNAPSHOT_DIR
+from normalizer import INTENT_ORDER, INTENT_ICONS, get_intent_label
+
+SNAPSHOT_FORMAT_VERSION = 2
+# Numeric columns: name -> dtype
+NUMERIC_COLUMNS = {'id': np.int64, 'run_id': np.int64, 'workflow_run_id': np.int64, 'created_epoch': np.int64, 'updated_epoch': np.int64}
+# Dictionary-encoded columns: name -> code dtype (-1 is NULL)
+CODED_COLUMNS = {
+    'job_name': np.int32, 'name': np.int32, 'branch': np.int32, 'status': np.int8, 'conclusion': np.int8,
+    'repo': np.int16
+}
+SNAPSHOT_COLUMNS = tuple(NUMERIC_COLUMNS) + tuple(CODED_COLUMNS)
+# NULL epochs/ids are stored as this sentinel and restored as missing on load
+NULL_INT = np.iinfo(np.int64).min
+
+def _select(where="", order="ORDER BY id"):
+    return f"SELECT {', '.join(SNAPSHOT_COLUMNS)} FROM workflow_runs {where} {order}"
+
+def export_snapshot(path=SNAPSHOT_DIR, chunk_size=50_000):
+    """
+    Streams workflow_runs into a new snapshot directory and swaps it in atomically.
+    Rows are read in chunks straight into pre-sized .npy files, so memory stays flat
+    however large the table is. Returns the number of rows written.
+    """
+    tmp = path + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    conn = database.get_db_connection()
+    try:
+        # One read transaction, so the row count, the rows and the watermarks agree
+        conn.execute("BEGIN")
+        count = conn.execute("SELECT COUNT(*) FROM workflow_runs").fetchone()[0]
+        max_id, max_updated = conn.execute(
+            "SELECT COALESCE(MAX(id), 0), COALESCE(MAX(updated_epoch), 0) FROM workflow_runs"
+        ).fetchone()
+
+        arrays = {
+            col: np.lib.format.open_memmap(os.path.join(tmp, f"{col}.npy"), mode="w+", dtype=dtype, shape=(count,))
+            for col, dtype in {**NUMERIC_COLUMNS, **CODED_COLUMNS}.items()
+        }
+        dictionaries = {col: {} for col in CODED_COLUMNS}
+
+        cursor = conn.execute(_select())
+        offset = 0
+        while rows := cursor.fetchmany(chunk_size):
+            end = offset + len(rows)
+            columns = list(zip(*rows))
+            for col, values in zip(SNAPSHOT_COLUMNS, columns):
+                if col in NUMERIC_COLUMNS:
+                    arrays[col][offset:end] = [NULL_INT if v is None else v for v in values]
+                else:
+                    codes = dictionaries[col]
+                    arrays[col][offset:end] = [
+                        -1 if v is None else codes.setdefault(v, len(codes)) for v in values
+                    ]
+            offset = end
+        conn.rollback()
+    finally:
+        conn.close()
+
+    for array in arrays.values():
+        array.flush()
+    del arrays
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({
+            "version": SNAPSHOT_FORMAT_VERSION,
+            "rows": count,
+            "max_id": max_id,
+            "max_updated_epoch": max_updated,
+            "created_epoch": int(time.time()),
+            "dictionaries": {col: list(codes) for col, codes in dictionaries.items()},
+        }, f)
+
+    # Swap in the new directory; readers holding the old mmaps keep their (unlinked) files
+    old = path + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old)
+    os.replace(tmp, path)
+    shutil.rmtree(old, ignore_errors=True)
+    return count
+
+def read_meta(path=SNAPSHOT_DIR):
+    """The snapshot's meta.json, or None when there is no (compatible) snapshot."""
+    try:
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return meta if meta.get("version") == SNAPSHOT_FORMAT_VERSION else None
+
+def _frame(arrays, dictionaries):
+    """Builds the DataFrame over the given arrays; codes become categoricals without copying."""
+    import pandas as pd
+
+    data = {}
+    for col in NUMERIC_COLUMNS:
+        data[col] = arrays[col]
+    for col in CODED_COLUMNS:
+        data[col] = pd.Categorical.from_codes(arrays[col], categories=dictionaries[col], validate=False)
+    df = pd.DataFrame(data, copy=False)
+    # Intent is derived per distinct workflow name, so rule changes apply without a re-export;
+    # the trailing slot (the default tier) is what NULL names (code -1) pick up
+    lookup = np.array(
+        [INTENT_ORDER.index(get_intent_label(name)[0]) for name in dictionaries['name']] + [len(INTENT_ORDER) - 1],
+        dtype=np.int8
+    )
+    df['intent'] = pd.Categorical.from_codes(lookup[arrays['name']], categories=INTENT_ORDER)
+    df['intent_icon'] = df['intent'].map(INTENT_ICONS)
+    return df
+
+def _delta_frame(conn, meta):
+    """Rows inserted or updated in SQLite since the snapshot, encoded with extended dictionaries."""
+    # Unordered, so SQLite answers the OR from the rowid and idx_runs_updated instead of a scan
+    rows = conn.execute(
+        _select("WHERE id > ? OR updated_epoch >= ?", order=""), (meta["max_id"], meta["max_updated_epoch"])
+    ).fetchall()
+    columns = list(zip(*rows)) if rows else [()] * len(SNAPSHOT_COLUMNS)
+    arrays, dictionaries = {}, {}
+    for col, values in zip(SNAPSHOT_COLUMNS, columns):
+        if col in NUMERIC_COLUMNS:
+            arrays[col] = np.array([NULL_INT if v is None else v for v in values], dtype=NUMERIC_COLUMNS[col])
+        else:
+            categories = list(meta["dictionaries"][col])
+            codes = {value: i for i, value in enumerate(categories)}
+            arrays[col] = np.array(
+                [-1 if v is None else codes.setdefault(v, len(codes)) for v in values], dtype=CODED_COLUMNS[col]
+            )
+            dictionaries[col] = list(codes)
+    return arrays, dictionaries
+
+def load_snapshot(path=SNAPSHOT_DIR, conn=None):
+    """
+    Loads the snapshot as a normalized runs DataFrame (ordered oldest first by insertion).
+    Columns are memory-mapped and stay on disk until touched. With `conn`, rows newer
+    than the snapshot are read from SQLite and replace or extend the snapshot rows.
+    Returns None when no snapshot exists.
+    """
+    import pandas as pd
+
+    meta = read_meta(path)
+    if meta is None:
+        return None
+    arrays = {
+        col: np.load(os.path.join(path, f"{col}.npy"), mmap_mode="r") for col in SNAPSHOT_COLUMNS
+    }
+    if conn is None:
+        return _frame(arrays, meta["dictionaries"])
+
+    delta, dictionaries = _delta_frame(conn, meta)
+    if not len(delta['run_id']):
+        return _frame(arrays, meta["dictionaries"])
+    # Delta dictionaries only append, so snapshot codes stay valid under them. Snapshot rows
+    # are in id order, so the rows the delta updates are located by binary search.
+    updated = delta['id'][delta['id'] <= meta['max_id']]
+    if len(updated):
+        keep = np.ones(len(arrays['id']), dtype=bool)
+        positions = np.searchsorted(arrays['id'], updated)
+        keep[positions[arrays['id'][np.minimum(positions, len(keep) - 1)] == updated]] = False
+        arrays = {col: array[keep] for col, array in arrays.items()}
+    merged = {col: np.concatenate([arrays[col], delta[col]]) for col in SNAPSHOT_COLUMNS}
+    return _frame(merged, dictionaries)
+
+def nullable(series):
+    """Restores NULL_INT sentinels in a numeric snapshot column as missing values."""
+    return series.where(series != NULL_INT)
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "export"
+    database.init_db()
+    if command == "export":
+        start = time.perf_counter()
+        rows = export_snapshot()
+        print(f"Exported {rows:,} runs to {SNAPSHOT_DIR}/ in {time.perf_counter() - start:.2f}s")
+    elif command == "load":
+        start = time.perf_counter()
+        with database.get_db_connection() as conn:
+            df = load_snapshot(conn=conn)
+        if df is None:
+            print("No snapshot found; run `python snapshot.py export` first.")
+        else:
+            print(f"Loaded {len(df):,} runs in {(time.perf_counter() - start) * 1000:.1f}ms")
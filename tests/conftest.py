@@ -0,0 +1,45 @@
+# tests/conftest.py
+# Shared fixtures: a throwaway database per test and the local GitHub stand-in (mock_server.py).
+#   python -m pytest
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import collector
+import database
+import failure_logs
+import mock_server
+import notifier
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """An initialized database in a temporary directory, which is also the working directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "ci.db"))
+    monkeypatch.setattr(notifier, "FAILURE_LOGS", False)
+    database.init_db()
+    return tmp_path / "ci.db"
+
+@pytest.fixture
+def github(db, monkeypatch):
+    """Starts a stand-in with the given mock_server.serve() options; returns its MockGitHub state."""
+    servers = []
+
+    def start(**options):
+        server, state, base = mock_server.serve(0, **options)
+        servers.append(server)
+        monkeypatch.setattr(collector, "GITHUB_API_BASE", base)
+        monkeypatch.setattr(failure_logs, "GITHUB_API_BASE", base)
+        return state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+@pytest.fixture
+def limiter():
+    """A rate limiter whose burst covers a whole test, so only a spent budget makes it wait."""
+    return collector.RateLimiter(burst=100000)
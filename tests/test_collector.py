@@ -0,0 +1,156 @@
+# tests/test_collector.py
+# The incremental collector against the local stand-in: pagination, conditional requests,
+# the cursor, runs that are still going (or going again), retries and the rate budget.
+import threading
+import time
+import collector
+import database
+import mock_server
+from config import RERUN_CHECK_STATUSES
+
+REPO = mock_server.DEFAULT_REPO
+STATUS_PAGES = len(RERUN_CHECK_STATUSES)
+
+def poll(limiter):
+    return collector.fetch_workflow_runs(REPO, limiter=limiter)
+
+def stored_runs():
+    """{workflow_run_id: {conclusions of its stored rows}}."""
+    runs = {}
+    with database.get_db_connection() as conn:
+        for row in conn.execute("SELECT workflow_run_id, conclusion FROM workflow_runs WHERE repo = ?", (REPO,)):
+            runs.setdefault(row[0], set()).add(row[1])
+    return runs
+
+def stored_row_count():
+    with database.get_db_connection() as conn:
+        return conn.execute("SELECT COUNT(*) FROM workflow_runs").fetchone()[0]
+
+def job_count(state, runs):
+    return sum(len(state.jobs[run["id"]]) for run in runs)
+
+def test_first_poll_follows_pagination_to_the_oldest_run(github, limiter):
+    state = github(runs=250)
+    stats = poll(limiter)
+    assert stats["pages"] == 3 + STATUS_PAGES
+    assert set(stored_runs()) == {run["id"] for run in state.runs}
+    assert stored_row_count() == stats["jobs_fetched"] == job_count(state, state.runs)
+    assert database.check_job_health() == []
+
+def test_unchanged_poll_is_answered_not_modified_for_free(github, limiter):
+    state = github(runs=150)
+    poll(limiter)
+    budget = state.rate_remaining
+    stats = poll(limiter)
+    assert stats["pages"] == stats["not_modified"] == 1 + STATUS_PAGES
+    assert stats["rows_changed"] == 0
+    assert state.rate_remaining == budget
+
+def test_new_runs_are_collected_up_to_the_cursor(github, limiter):
+    state = github(runs=250)
+    poll(limiter)
+    state.add_runs(5)
+    stats = poll(limiter)
+    # The first page already reaches the stored runs, so the older pages are not requested
+    assert stats["pages"] == 1 + STATUS_PAGES
+    assert stats["rows_changed"] == job_count(state, state.runs[:5])
+    assert set(stored_runs()) == {run["id"] for run in state.runs}
+
+def test_running_run_is_followed_until_it_completes(github, limiter):
+    state = github(runs=10)
+    poll(limiter)
+    state.add_runs(1, status="in_progress")
+    run_id = state.runs[0]["id"]
+    poll(limiter)
+    assert [run.workflow_run_id for run in database.get_pending_runs(REPO)] == [run_id]
+    assert stored_runs()[run_id] == {None}
+
+    state.complete_run(run_id, "failure")
+    poll(limiter)
+    assert database.get_pending_runs(REPO) == []
+    assert stored_runs()[run_id] == {"failure"}
+    assert database.check_job_health() == []
+
+def test_rerun_of_a_run_behind_the_cursor_is_collected(github, limiter):
+    state = github(runs=150)
+    poll(limiter)
+    oldest = state.runs[-1]["id"]
+    state.rerun(oldest)
+    poll(limiter)
+    assert [run.workflow_run_id for run in database.get_pending_runs(REPO)] == [oldest]
+
+    state.complete_run(oldest, "failure")
+    poll(limiter)
+    assert stored_runs()[oldest] == {"failure"}
+    assert database.get_pending_runs(REPO) == []
+    assert database.check_job_health() == []
+
+def test_poll_with_a_failed_job_fetch_is_retried_in_full(github, limiter):
+    state = github(runs=10)
+    poll(limiter)
+    state.add_runs(3)
+    broken = state.runs[1]["id"]
+    jobs = state.jobs.pop(broken)  # The stand-in answers 404 for its job list
+    poll(limiter)
+    assert broken not in stored_runs()
+
+    state.jobs[broken] = jobs
+    stats = poll(limiter)
+    # Pages and cursor were not saved, so the same runs are listed (not 304) and stored now
+    assert stats["not_modified"] == STATUS_PAGES
+    assert set(stored_runs()) == {run["id"] for run in state.runs}
+
+def test_mainline_commits_and_their_pulls_are_synced(github, limiter):
+    state = github(runs=40)
+    stats = poll(limiter)
+    assert stats["commits_fetched"] == 40
+    state.add_runs(2)
+    assert poll(limiter)["commits_fetched"] == 2
+    with database.get_db_connection() as conn:
+        rows = conn.execute("SELECT sha, parent_sha, pulls_fetched FROM commits ORDER BY position").fetchall()
+    assert [row[0] for row in rows] == [run["head_sha"] for run in reversed(state.runs)]
+    assert all(row[1] == previous[0] for previous, row in zip(rows, rows[1:]))
+    assert all(row[2] for row in rows)
+
+def test_transient_errors_are_retried(github, limiter, monkeypatch):
+    state = github(runs=60, fail_rate=0.3)
+    monkeypatch.setattr(collector, "RETRY_BACKOFF_SECONDS", 0.001)
+    monkeypatch.setattr(collector, "MAX_RETRIES", 10)
+    poll(limiter)
+    assert set(stored_runs()) == {run["id"] for run in state.runs}
+    assert stored_row_count() == job_count(state, state.runs)
+
+def test_spent_budget_waits_for_the_reset(github):
+    state = github(runs=20, rate_limit=30, rate_window=2)
+    result = {}
+    worker = threading.Thread(target=lambda: result.update(stats=poll(collector.RateLimiter())), daemon=True)
+    worker.start()
+    worker.join(timeout=30)
+    assert not worker.is_alive(), "collector never resumed after the rate-limit reset"
+    assert state.requests_served > 30
+    assert set(stored_runs()) == {run["id"] for run in state.runs}
+
+def test_rate_limiter_restores_the_burst_at_the_reset():
+    limiter = collector.RateLimiter(burst=5)
+    limiter.update({"X-RateLimit-Limit": "60", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": str(int(time.time()) + 1)})
+    started = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - started < 3
+    for _ in range(4):
+        limiter.acquire()
+    assert time.monotonic() - started < 3
+
+def test_jobless_run_row_is_dropped_once_its_jobs_arrive(github, limiter):
+    state = github(runs=5)
+    poll(limiter)
+    state.add_runs(1, status="queued")
+    run_id = state.runs[0]["id"]
+    jobs, state.jobs[run_id] = state.jobs[run_id], []
+    poll(limiter)
+    assert stored_runs()[run_id] == {None}
+
+    state.jobs[run_id] = jobs
+    state.complete_run(run_id, "success")
+    poll(limiter)
+    assert database.get_pending_runs(REPO) == []
+    assert stored_row_count() == job_count(state, state.runs)
@@ -0,0 +1,88 @@
+# tests/test_failure_logs.py
+# Failure signatures: finding the line that explains a failed step, normalizing away
+# run-specific details, and fetching run log archives from the local stand-in.
+import io
+import zipfile
+from collections import namedtuple
+import collector
+import database
+import failure_logs
+
+Job = namedtuple("Job", "repo workflow_run_id run_id job_name")
+JOB = Job("containers/urunc", 1, 2, "Unit Tests")
+
+def archive(steps, job_name=JOB.job_name):
+    """An in-memory log archive in GitHub's layout, from {step name: [log lines]}."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as out:
+        for number, (step, lines) in enumerate(steps.items(), 1):
+            out.writestr(f"{job_name}/{number}_{step}.txt", "".join(f"2026-01-01T00:00:00.0000000Z {line}\n" for line in lines))
+    return zipfile.ZipFile(buffer)
+
+def scan(lines):
+    scanner = failure_logs.StepScanner()
+    for line in lines:
+        scanner.feed(line)
+    return scanner.result()
+
+def test_normalize_replaces_run_specific_details():
+    first = failure_logs.normalize("VM 3f9a2c1b77 in /tmp/run-8812/vm.img failed after 12.5s at 0xdeadbeef (attempt 3)")
+    second = failure_logs.normalize("VM a01b2c3d4e in /tmp/run-17/vm.img failed after 900ms at 0x1f (attempt 14)")
+    assert first == second == "VM <sha> in <tmp> failed after <duration> at <addr> (attempt <n>)"
+
+def test_explicit_error_annotation_wins():
+    assert scan(["compiling", "\x1b[31m##[error]Timed out waiting for VM\x1b[0m", "error: later noise"]) == (
+        "Timed out waiting for VM", True
+    )
+
+def test_generic_error_falls_back_to_the_last_error_line():
+    lines = ["--- FAIL: TestStart (0.31s)", "    main_test.go:42: assertion failed: exit code 1", "ok  other/pkg",
+             "##[error]Process completed with exit code 1."]
+    assert scan(lines) == ("main_test.go:42: assertion failed: exit code 1", True)
+    assert scan(["ok", "##[error]Process completed with exit code 1."]) == ("Process completed with exit code 1.", True)
+
+def test_step_without_annotation_reports_its_last_error_line():
+    assert scan(["building", "fatal: not a git repository", "done"]) == ("fatal: not a git repository", False)
+    assert scan(["building", "done"]) == (None, False)
+
+def test_failing_step_is_the_first_annotated_one():
+    logs = archive({
+        "Set up job": ["warning: retry failed, retrying"],
+        "Run tests": ["panic: runtime error: index out of range [7] with length 3", "##[error]Process completed with exit code 2."],
+        "Post cleanup": ["##[error]The operation was canceled."],
+    })
+    failure = failure_logs.read_failure(logs, JOB)
+    assert failure.failing_step == "Run tests"
+    assert failure.message == "panic: runtime error: index out of range [7] with length 3"
+    assert failure.error == "panic: runtime error: index out of range [<n>] with length <n>"
+
+def test_signature_ignores_numbers_but_not_the_error():
+    def signature_of(lines):
+        return failure_logs.read_failure(archive({"Run tests": lines + ["##[error]Process completed with exit code 1."]}), JOB).signature
+
+    panic = signature_of(["panic: index out of range [7] with length 3"])
+    assert panic == signature_of(["panic: index out of range [12] with length 40"])
+    assert panic != signature_of(["error: expected exit code 0, got 1"])
+    assert failure_logs.read_failure(archive({"Run tests": ["all good"]}), JOB) == failure_logs.NO_FAILURE
+
+def test_failed_jobs_of_the_stand_in_get_signatures(github, limiter, tmp_path, monkeypatch):
+    monkeypatch.setattr(failure_logs, "LOG_CACHE_DIR", str(tmp_path / "logs"))
+    # The stand-in's clock starts on 2026-01-01, so look back far enough to reach it
+    monkeypatch.setattr(failure_logs, "LOG_FETCH_LOOKBACK_HOURS", 10 ** 6)
+    github(runs=60)
+    collector.fetch_workflow_runs(limiter=limiter)
+    with database.get_db_connection() as conn:
+        failed = [row[0] for row in conn.execute("SELECT run_id FROM workflow_runs WHERE conclusion = 'failure'")]
+    assert failed
+
+    assert failure_logs.fetch_failure_logs(limiter=limiter) == len(failed)
+    assert failure_logs.fetch_failure_logs(limiter=limiter) == 0
+    with database.get_db_connection() as conn:
+        contexts = database.get_failure_context(conn, failed)
+    assert set(contexts) == set(failed)
+    assert all(context.failing_step == "Run tests" and context.signature for context in contexts.values())
+    # The stand-in repeats a job's error across neighbouring runs
+    assert any(context.repeats for context in contexts.values())
+
+    job = database.get_job_failure(failed[0])
+    assert contexts[failed[0]].message in failure_logs.read_log(job)
@@ -0,0 +1,115 @@
+# tests/test_job_health.py
+# job_health is maintained incrementally by save_runs and compact_runs; whatever order runs
+# arrive and change in, it must equal a full replay of the raw runs (check_job_health).
+import random
+import pytest
+from datetime import datetime, timezone
+import database
+
+START = 1_767_225_600  # 2026-01-01
+DAY = 86400
+JOBS = ["build", "unit-tests", "e2e"]
+CONCLUSIONS = ["success"] * 5 + ["failure"] * 3 + ["cancelled", "skipped"]
+
+def iso(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class History:
+    """Random workflow runs, each with a job per JOBS, with unique creation times."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.rows = {}
+        self.next_id = 1000
+        self.epochs = set()
+
+    def _epoch(self, first_day, last_day):
+        while True:
+            epoch = START + self.rng.randrange(first_day * DAY, last_day * DAY)
+            if epoch not in self.epochs:
+                self.epochs.add(epoch)
+                return epoch
+
+    def new_run(self, first_day, last_day):
+        self.next_id += 1
+        workflow_run_id, created = self.next_id, self._epoch(first_day, last_day)
+        rows = []
+        for job in JOBS:
+            self.next_id += 1
+            completed = self.rng.random() < 0.8
+            rows.append(self._save(dict(
+                id=self.next_id, run_id=workflow_run_id, name="CI", job_name=job,
+                status="completed" if completed else self.rng.choice(["queued", "in_progress"]),
+                conclusion=self.rng.choice(CONCLUSIONS) if completed else None,
+                created_at=iso(created), updated_at=iso(created + 300),
+                head_sha=f"{workflow_run_id:040x}", head_branch="main",
+                html_url=f"https://github.com/example/runs/{workflow_run_id}", repository="example/repo",
+            )))
+        return rows
+
+    def change(self, row):
+        """The next state of a stored row: it finishes, is re-run, or its conclusion flips."""
+        updated = database.to_epoch(row["updated_at"]) + self.rng.randrange(60, 3600)
+        if row["status"] != "completed":
+            row.update(status="completed", conclusion=self.rng.choice(CONCLUSIONS))
+        elif self.rng.random() < 0.5:
+            row.update(status="in_progress", conclusion=None)
+        else:
+            row.update(conclusion=self.rng.choice(CONCLUSIONS))
+        row.update(updated_at=iso(updated))
+        return self._save(row)
+
+    def _save(self, row):
+        self.rows[row["id"]] = row
+        return dict(row)
+
+    def batch(self, first_day, last_day, new=8, changed=6):
+        rows = [row for _ in range(new) for row in self.new_run(first_day, last_day)]
+        stored = list(self.rows.values())
+        rows += [self.change(row) for row in self.rng.sample(stored, min(changed, len(stored)))]
+        self.rng.shuffle(rows)
+        return rows
+
+def stored_run_ids():
+    with database.get_db_connection() as conn:
+        return [row[0] for row in conn.execute("SELECT run_id FROM workflow_runs ORDER BY run_id")]
+
+def corrupt_and_backfill():
+    with database.get_db_connection() as conn:
+        conn.execute("DELETE FROM derived_versions WHERE name = 'job_health'")
+        conn.execute("UPDATE job_health SET streak_length = streak_length + 7, last_conclusion = 'success'")
+        conn.commit()
+    assert database.check_job_health() != []
+    database.init_db()
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_job_health_equals_a_full_replay(db, seed):
+    history = History(seed)
+    for _ in range(30):
+        database.save_runs(history.batch(0, 90))
+        assert database.check_job_health() == []
+
+@pytest.mark.parametrize("seed", range(5))
+def test_job_health_survives_compaction(db, seed):
+    history = History(seed)
+    for _ in range(25):
+        database.save_runs(history.batch(0, 90))
+    assert database.compact_runs(retention_days=30, now=START + 100 * DAY) > 0
+    assert database.check_job_health() == []
+
+    # Late runs from before the cutoff, new runs after it, and changes to runs still stored
+    for _ in range(10):
+        database.save_runs(history.batch(20, 110, changed=0))
+        database.save_runs([history.change(history.rows[run_id]) for run_id in history.rng.sample(stored_run_ids(), 4)])
+        assert database.check_job_health() == []
+    database.compact_runs(retention_days=30, now=START + 130 * DAY)
+    assert database.check_job_health() == []
+
+def test_backfill_rebuilds_job_health(db):
+    history = History(seed=3)
+    for _ in range(10):
+        database.save_runs(history.batch(0, 90))
+    database.compact_runs(retention_days=30, now=START + 100 * DAY)
+    database.save_runs(history.batch(80, 120))
+    corrupt_and_backfill()
+    assert database.check_job_health() == []
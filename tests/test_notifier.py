@@ -0,0 +1,123 @@
+# tests/test_notifier.py
+# The notification outbox: idempotent enqueueing, retries with backoff, dead-lettering,
+# digest batches, and delivery to the stand-in's Slack webhook.
+import json
+import collector
+import database
+import notifier
+from config import NOTIFY_BACKOFF_SECONDS, NOTIFY_MAX_ATTEMPTS
+
+NOW = 1_800_000_000
+
+class Capture(notifier.NotificationPlugin):
+    """Records each notify_batch call; the first `failures` calls raise."""
+
+    def __init__(self, name="capture", failures=0, digest=False):
+        self.name = name
+        self.failures = failures
+        self.digest = digest
+        self.batches = []
+
+    def notify_batch(self, alerts):
+        if self.failures:
+            self.failures -= 1
+            raise notifier.NotificationError("webhook down")
+        self.batches.append(alerts)
+
+def alert(job="build", transition_id="100", **fields):
+    values = dict(
+        alert_type="REQUIRED JOB FAILED", workflow="CI", job=job, run_id=int(transition_id), branch="main",
+        url=f"https://github.com/example/runs/{transition_id}", duration_str="", transition_id=transition_id,
+    )
+    values.update(fields)
+    return notifier.AlertDecision(**values)
+
+def enqueue(alerts, plugins):
+    with database.immediate_transaction() as conn:
+        database.enqueue_notifications(conn, [
+            (notifier.alert_key(a), plugin.name, json.dumps(a._asdict())) for a in alerts for plugin in plugins
+        ], now=NOW)
+
+def outbox():
+    with database.get_db_connection() as conn:
+        return [dict(row) for row in conn.execute("SELECT * FROM notification_outbox ORDER BY id")]
+
+def test_alert_is_delivered_once(db):
+    plugin = Capture()
+    enqueue([alert()], [plugin])
+    enqueue([alert()], [plugin])  # Same transition: the idempotency key makes this a no-op
+    assert notifier.dispatch_outbox([plugin], now=NOW) == (1, 0)
+    assert notifier.dispatch_outbox([plugin], now=NOW + 1) == (0, 0)
+    assert [[a.job for a in batch] for batch in plugin.batches] == [["build"]]
+    assert [row["status"] for row in outbox()] == ["sent"]
+
+def test_failed_delivery_is_retried_after_the_backoff(db):
+    plugin = Capture(failures=1)
+    enqueue([alert()], [plugin])
+    assert notifier.dispatch_outbox([plugin], now=NOW) == (0, 1)
+    row, = outbox()
+    assert (row["status"], row["attempts"], row["last_error"]) == ("pending", 1, "webhook down")
+    assert row["next_attempt_epoch"] == NOW + NOTIFY_BACKOFF_SECONDS
+
+    assert notifier.dispatch_outbox([plugin], now=NOW + NOTIFY_BACKOFF_SECONDS - 1) == (0, 0)
+    assert notifier.dispatch_outbox([plugin], now=NOW + NOTIFY_BACKOFF_SECONDS) == (1, 0)
+    row, = outbox()
+    assert (row["status"], row["attempts"], row["last_error"]) == ("sent", 2, None)
+
+def test_delivery_is_dead_lettered_after_the_last_attempt(db):
+    plugin = Capture(failures=NOTIFY_MAX_ATTEMPTS)
+    enqueue([alert()], [plugin])
+    now = NOW
+    for attempt in range(1, NOTIFY_MAX_ATTEMPTS + 1):
+        assert notifier.dispatch_outbox([plugin], now=now) == (0, 1)
+        row, = outbox()
+        assert row["attempts"] == attempt
+        now = row["next_attempt_epoch"]
+    assert row["status"] == "dead"
+    assert notifier.dispatch_outbox([plugin], now=now + 10 ** 6) == (0, 0)
+    assert plugin.batches == []
+
+def test_plugins_fail_independently(db):
+    healthy, broken = Capture("healthy"), Capture("broken", failures=1)
+    enqueue([alert()], [healthy, broken])
+    assert notifier.dispatch_outbox([healthy, broken], now=NOW) == (1, 1)
+    assert notifier.dispatch_outbox([healthy, broken], now=NOW + NOTIFY_BACKOFF_SECONDS) == (1, 0)
+    assert len(healthy.batches) == len(broken.batches) == 1
+
+def test_digest_plugin_gets_one_batch_per_cycle(db):
+    digest, single = Capture("digest", digest=True), Capture("single")
+    alerts = [alert(job=f"job-{i}", transition_id=str(100 + i)) for i in range(3)]
+    enqueue(alerts, [digest, single])
+    assert notifier.dispatch_outbox([digest, single], now=NOW) == (6, 0)
+    assert [[a.job for a in batch] for batch in digest.batches] == [["job-0", "job-1", "job-2"]]
+    assert sorted(len(batch) for batch in single.batches) == [1, 1, 1]
+
+def test_failed_digest_retries_the_whole_batch(db):
+    digest = Capture("digest", failures=1, digest=True)
+    enqueue([alert(job=f"job-{i}", transition_id=str(100 + i)) for i in range(3)], [digest])
+    assert notifier.dispatch_outbox([digest], now=NOW) == (0, 3)
+    assert {row["attempts"] for row in outbox()} == {1}
+    assert notifier.dispatch_outbox([digest], now=NOW + NOTIFY_BACKOFF_SECONDS) == (3, 0)
+    assert len(digest.batches) == 1
+
+def test_failure_transition_alerts_once(github, limiter):
+    github(runs=40)
+    collector.fetch_workflow_runs(limiter=limiter)
+    failing = {key for key, health in database.get_job_health().items() if health.last_conclusion == "failure"}
+    plugin = Capture()
+    notifier.run_notifier([plugin])
+    alerted = {(a.repo, a.job) for batch in plugin.batches for a in batch}
+    # Failures of flaky jobs may be held back (FLAKY_ALERT_POLICY), so alerts are a subset
+    assert alerted and alerted <= failing
+
+    notifier.run_notifier([plugin])  # Nothing changed: every transition was already alerted
+    assert sum(map(len, plugin.batches)) == len(alerted)
+
+def test_slack_webhook_receives_alert_with_idempotency_key(github):
+    state = github(runs=0)
+    slack = notifier.SlackRealNotifier(webhook_url=collector.GITHUB_API_BASE + "/hooks/slack", digest=False)
+    enqueue([alert()], [slack])
+    assert notifier.dispatch_outbox([slack], now=NOW) == (1, 0)
+    (key, message), = state.webhook_messages
+    assert key == f"{notifier.DEFAULT_REPOSITORY}/build:100"
+    assert "REQUIRED JOB FAILED" in message["text"]
@@ -0,0 +1,143 @@
+# tests/test_webhook_server.py
+# The webhook receiver: signature checks, delivery dedupe, batch retries, and ingestion of
+# workflow_run / workflow_job events (job lists fetched from the local stand-in).
+import json
+import pytest
+import requests
+import collector
+import database
+import mock_server
+import webhook_server
+from test_notifier import Capture
+
+REPO = mock_server.DEFAULT_REPO
+SECRET = "test-secret"
+
+@pytest.fixture
+def receiver(github, monkeypatch):
+    """Starts a stand-in and a receiver writing to the test database; returns (state, ingester, url, capture)."""
+    monkeypatch.setattr(webhook_server, "REPOSITORIES", [REPO])
+    monkeypatch.setattr(webhook_server, "RETRY_BACKOFF_SECONDS", 0.01)
+    state = github(runs=5)
+    capture = Capture()
+    ingester = webhook_server.WebhookIngester(
+        notifiers=[capture], session=collector.create_session(), limiter=collector.RateLimiter(burst=100000)
+    )
+    server, ingester, url = webhook_server.serve(0, secret=SECRET, ingester=ingester)
+    yield state, ingester, url, capture
+    server.shutdown()
+    server.server_close()
+    if ingester.thread.is_alive():
+        ingester.stop()
+
+def run_event(run):
+    return "workflow_run", {
+        "action": "completed",
+        "workflow_run": {**run, "jobs_url": f"{collector.runs_endpoint(REPO)}/{run['id']}/jobs"},
+        "repository": {"full_name": REPO},
+    }
+
+def job_event(run, job):
+    return "workflow_job", {
+        "action": job["status"],
+        "workflow_job": {
+            **job, "run_id": run["id"], "workflow_name": run["name"], "created_at": run["created_at"],
+            "head_branch": run["head_branch"],
+        },
+        "repository": {"full_name": REPO},
+    }
+
+def deliver(url, delivery_id, event, payload, secret=SECRET):
+    body = json.dumps(payload).encode()
+    headers = {"X-GitHub-Event": event, "X-GitHub-Delivery": delivery_id, "Content-Type": "application/json"}
+    if secret:
+        headers["X-Hub-Signature-256"] = webhook_server.sign(secret, body)
+    response = requests.post(url, data=body, headers=headers, timeout=10)
+    return response.status_code, response.json()["status"]
+
+def stored_jobs(run_id):
+    with database.get_db_connection() as conn:
+        return {row[0]: row[1] for row in conn.execute(
+            "SELECT job_name, conclusion FROM workflow_runs WHERE workflow_run_id = ?", (run_id,)
+        )}
+
+def test_unsigned_and_forged_deliveries_are_rejected(receiver):
+    state, ingester, url, _ = receiver
+    event, payload = run_event(state.runs[0])
+    assert deliver(url, "d-1", event, payload, secret=None) == (401, "bad_signature")
+    assert deliver(url, "d-1", event, payload, secret="wrong") == (401, "bad_signature")
+    ingester.stop()
+    assert stored_jobs(state.runs[0]["id"]) == {}
+
+def test_ping_and_untracked_events_are_not_queued(receiver):
+    state, ingester, url, _ = receiver
+    assert deliver(url, "d-ping", "ping", {"zen": "Keep it logically awesome."}) == (200, "pong")
+    assert deliver(url, "d-push", "push", {}) == (202, "ignored")
+    event, payload = run_event(state.runs[0])
+    payload["repository"] = {"full_name": "someone/else"}
+    assert deliver(url, "d-other", event, payload) == (202, "ignored")
+    assert ingester.queue.qsize() == 0
+
+def test_completed_run_is_ingested_with_its_jobs(receiver):
+    state, ingester, url, _ = receiver
+    state.add_runs(1)
+    run = state.runs[0]
+    assert deliver(url, "d-run", *run_event(run)) == (202, "queued")
+    ingester.stop()
+    assert stored_jobs(run["id"]) == {job["name"]: job["conclusion"] for job in state.jobs[run["id"]]}
+    assert database.check_job_health() == []
+
+def test_duplicate_delivery_is_answered_and_not_written_twice(receiver):
+    state, ingester, url, _ = receiver
+    run = state.runs[0]
+    event, payload = run_event(run)
+    assert deliver(url, "d-dup", event, payload) == (202, "queued")
+    assert deliver(url, "d-dup", event, payload) == (200, "duplicate")
+    ingester.stop()
+
+    # A restarted receiver has an empty in-memory set; the stored delivery ids catch it
+    restarted = webhook_server.WebhookIngester(notifiers=[Capture()], session=ingester.session, limiter=ingester.limiter)
+    counts = restarted.process([("d-dup", event, payload, 0)])
+    assert counts["inserted"] == counts["updated"] == 0
+
+def test_job_events_keep_the_furthest_state(receiver):
+    state, ingester, url, _ = receiver
+    state.add_runs(1, status="in_progress")
+    run = state.runs[0]
+    job = state.jobs[run["id"]][0]
+    in_progress = job_event(run, job)
+    state.complete_run(run["id"], "success")
+    completed = job_event(run, job)
+    # Delivered out of order within one batch
+    assert deliver(url, "d-done", *completed) == (202, "queued")
+    assert deliver(url, "d-started", *in_progress) == (202, "queued")
+    ingester.stop()
+    assert stored_jobs(run["id"]) == {job["name"]: "success"}
+
+def test_failed_job_event_alerts(receiver):
+    state, ingester, url, capture = receiver
+    state.add_runs(1, status="in_progress")
+    run = state.runs[0]
+    job = state.jobs[run["id"]][0]
+    state.complete_run(run["id"], "failure")
+    assert deliver(url, "d-fail", *job_event(run, job)) == (202, "queued")
+    ingester.stop()
+    assert [(a.repo, a.job, a.run_id) for batch in capture.batches for a in batch] == [(REPO, job["name"], job["id"])]
+
+def test_failed_batch_is_retried(receiver, monkeypatch):
+    state, ingester, url, _ = receiver
+    save_runs, failures = webhook_server.save_runs, []
+
+    def flaky_save_runs(rows, *args, **kwargs):
+        if len(failures) < 2:
+            failures.append(len(rows))
+            raise database.sqlite3.OperationalError("database is locked")
+        return save_runs(rows, *args, **kwargs)
+
+    monkeypatch.setattr(webhook_server, "save_runs", flaky_save_runs)
+    state.add_runs(1)
+    run = state.runs[0]
+    assert deliver(url, "d-retry", *run_event(run)) == (202, "queued")
+    ingester.stop()
+    assert len(failures) == 2
+    assert set(stored_jobs(run["id"])) == {job["name"] for job in state.jobs[run["id"]]}
@@ -0,0 +1,350 @@
+# webhook_server.py
+# Push-based ingestion: receives GitHub's workflow_run / workflow_job webhooks, so
+# failures reach job_health and the notifier seconds after they happen instead of at
+# the next poll. The collector keeps polling as a safety net for missed deliveries.
+#   WEBHOOK_SECRET=... python webhook_server.py --port 8787 [--record deliveries.jsonl]
+#   WEBHOOK_SECRET=... python webhook_server.py --replay deliveries.jsonl --url http://localhost:8787/webhook
+import argparse
+import hashlib
+import hmac
+import json
+import queue
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import requests
+import metrics
+from cache import TTLCache
+from config import (
+    WEBHOOK_SECRET, WEBHOOK_PORT, WEBHOOK_BATCH_SIZE, WEBHOOK_BATCH_WAIT_SECONDS,
+    WEBHOOK_DELIVERY_RETENTION_DAYS, WEBHOOK_RETRY_ATTEMPTS, REPOSITORIES, TARGET_WORKFLOWS,
+    RETRY_BACKOFF_SECONDS, RETRY_MAX_SLEEP_SECONDS
+)
+from database import init_db, save_runs, get_seen_deliveries, record_deliveries
+from collector import create_session, fetch_jobs, job_to_row, RateLimiter
+from notifier import get_notifiers, run_notifier
+
+WEBHOOK_PATH = "/webhook"
+EVENTS = ("workflow_run", "workflow_job")
+MAX_BODY_BYTES = 25 * 1024 * 1024  # GitHub caps payloads at 25 MB
+# Later states win when one batch holds several events for the same job
+STATUS_ORDER = {"completed": 2, "in_progress": 1}
+
+def sign(secret, body):
+    """The X-Hub-Signature-256 value GitHub sends for `body`."""
+    return "sha256=" + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+
+def verify_signature(secret, body, signature):
+    return bool(secret and signature) and hmac.compare_digest(sign(secret, body), signature)
+
+def is_tracked(event, payload):
+    """Only collected repositories and, like the collector, TARGET_WORKFLOWS are ingested."""
+    repo = (payload.get("repository") or {}).get("full_name")
+    if event == "workflow_job":
+        workflow = payload["workflow_job"].get("workflow_name")
+    else:
+        workflow = payload["workflow_run"].get("name")
+    return repo in REPOSITORIES and (not TARGET_WORKFLOWS or workflow in TARGET_WORKFLOWS)
+
+def job_event_row(payload):
+    """The workflow_runs row a workflow_job event carries, in the collector's row shape."""
+    job = payload["workflow_job"]
+    run = {
+        "id": job["run_id"],
+        "name": job.get("workflow_name") or "",
+        "created_at": job["created_at"],
+        "updated_at": job["created_at"],
+        "head_branch": job.get("head_branch") or "",
+        "html_url": job["html_url"],
+        "repository": payload["repository"]["full_name"],
+    }
+    return job_to_row(run, job)
+
+def batch_rows(events, session, limiter):
+    """
+    The workflow_runs rows of a batch of (event, payload): one per workflow_job event, and
+    the job list of each completed workflow_run, fetched concurrently for the whole batch.
+    """
+    rows, runs = [], []
+    for event, payload in events:
+        if event == "workflow_job":
+            rows.append(job_event_row(payload))
+        elif payload.get("action") == "completed":
+            # Queued and in-progress jobs arrive as workflow_job events
+            runs.append({**payload["workflow_run"], "repository": payload["repository"]["full_name"]})
+    jobs_by_run = fetch_jobs(runs, session, limiter)
+    for run in runs:
+        job_rows = jobs_by_run[run["id"]]
+        if job_rows:
+            rows.extend(job_rows)
+        elif job_rows is not None:
+            # No job list available: fall back to a run-level row, as the collector does
+            rows.append(run)
+        # Otherwise the fetch failed; the next poll collects the run's jobs
+    return rows
+
+def _latest_per_row(rows):
+    """Keeps one row per job id, the furthest along (GitHub does not guarantee delivery order)."""
+    latest = {}
+    for row in rows:
+        rank = (STATUS_ORDER.get(row["status"], 0), row["updated_at"])
+        if row["id"] not in latest or rank >= latest[row["id"]][0]:
+            latest[row["id"]] = (rank, row)
+    return [row for _, row in latest.values()]
+
+class WebhookIngester:
+    """
+    Queues verified events and writes them from one thread in batches of up to
+    WEBHOOK_BATCH_SIZE, gathered for WEBHOOK_BATCH_WAIT_SECONDS after the first event.
+    Each batch goes through save_runs (the same upsert as a poll), then the notifier
+    evaluates only the jobs that batch completed. Deliveries were acked before they were
+    written and GitHub does not redeliver acked ones, so the events of a batch that fails
+    are queued again, with backoff, up to WEBHOOK_RETRY_ATTEMPTS times.
+    """
+
+    def __init__(self, notifiers=None, session=None, limiter=None):
+        self.queue = queue.Queue()
+        # Recent delivery ids, so redeliveries are answered before they are queued
+        self.seen = TTLCache(maxsize=100000, ttl=WEBHOOK_DELIVERY_RETENTION_DAYS * 86400)
+        self.seen_lock = threading.Lock()
+        self.notifiers = notifiers or get_notifiers()
+        self.session = session or create_session()
+        self.limiter = limiter or RateLimiter()
+        self.closing = False
+        self.thread = threading.Thread(target=self.run, name="webhook-writer")
+        # Backoff timer -> the events it will queue again
+        self.retries = {}
+        self.retries_lock = threading.Lock()
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        """Writes what is still queued (retries included, without waiting out their backoff), then stops the writer."""
+        self.queue.put(None)
+        self.thread.join()
+
+    def submit(self, delivery_id, event, payload):
+        """Queues a verified event. Returns False if the delivery was already received."""
+        with self.seen_lock:
+            if self.seen.get(delivery_id):
+                return False
+            self.seen.set(delivery_id, True)
+        self.queue.put((delivery_id, event, payload, 0))
+        metrics.set_gauge("webhook_queue_depth", self.queue.qsize())
+        return True
+
+    def _retry(self, batch):
+        """Queues a failed batch's events again after a backoff; drops those out of attempts."""
+        items = [(delivery_id, event, payload, attempt + 1) for delivery_id, event, payload, attempt in batch]
+        dropped = [item for item in items if item[3] > WEBHOOK_RETRY_ATTEMPTS]
+        if dropped:
+            metrics.incr("webhook_events_dropped_total", len(dropped))
+            print(f"⚠️ Dropping {len(dropped)} events after {WEBHOOK_RETRY_ATTEMPTS} retries; the next poll collects them")
+            for delivery_id, _, _, _ in dropped:
+                # A manual redelivery from GitHub is accepted again
+                self.seen.set(delivery_id, False)
+        items = [item for item in items if item[3] <= WEBHOOK_RETRY_ATTEMPTS]
+        if not items:
+            return
+        delay = min(RETRY_BACKOFF_SECONDS * 2 ** (max(item[3] for item in items) - 1), RETRY_MAX_SLEEP_SECONDS)
+
+        def requeue():
+            with self.retries_lock:
+                if self.retries.pop(timer, None) is None:
+                    return  # Already written by the stopping writer
+            for item in items:
+                self.queue.put(item)
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        with self.retries_lock:
+            self.retries[timer] = items
+        timer.start()
+
+    def _next_batch(self):
+        batch = []
+        item = self.queue.get()
+        deadline = time.monotonic() + WEBHOOK_BATCH_WAIT_SECONDS
+        while item is not None:
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= WEBHOOK_BATCH_SIZE or remaining <= 0:
+                return batch
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch
+        self.closing = True
+        return batch
+
+    def run(self):
+        while not self.closing:
+            batch = self._next_batch()
+            if batch:
+                self.process(batch)
+        # Stopping: events waiting out a backoff are written now (failures retry until out of attempts)
+        while True:
+            with self.retries_lock:
+                pending, self.retries = self.retries, {}
+            if not pending:
+                break
+            for timer in pending:
+                timer.cancel()
+            self.process([item for items in pending.values() for item in items])
+
+    def process(self, batch):
+        """Writes one batch and alerts on the jobs it completed. Returns save_runs' counts."""
+        try:
+            with metrics.span("webhook.batch"):
+                # Delivery ids seen by an earlier process (the in-memory set starts empty)
+                seen = get_seen_deliveries([delivery_id for delivery_id, _, _, _ in batch])
+                for delivery_id, event, _, _ in batch:
+                    if delivery_id in seen:
+                        metrics.incr("webhook_deliveries_total", event=event, result="duplicate")
+                fresh = [item for item in batch if item[0] not in seen]
+                rows = batch_rows([(event, payload) for _, event, payload, _ in fresh], self.session, self.limiter)
+                counts = save_runs(_latest_per_row(rows))
+                record_deliveries([(delivery_id, event) for delivery_id, event, _, _ in fresh])
+                print(
+                    f"Ingested {len(fresh)} events ({len(seen)} duplicates): "
+                    f"{counts['inserted']} rows inserted, {counts['updated']} updated"
+                )
+        except Exception as e:
+            metrics.incr("webhook_batch_errors_total")
+            print(f"⚠️ Webhook batch failed, retrying it: {e!r}")
+            self._retry(batch)
+            metrics.flush()
+            return None
+        finally:
+            metrics.set_gauge("webhook_queue_depth", self.queue.qsize())
+
+        try:
+            jobs = {(row["repository"], row.get("job_name", row["name"])) for row in rows if row["status"] == "completed"}
+            if jobs:
+                run_notifier(self.notifiers, jobs=jobs)
+        except Exception as e:
+            # The runs are stored; the next notifier cycle alerts on them
+            metrics.incr("webhook_notify_errors_total")
+            print(f"⚠️ Notifier failed after a webhook batch: {e!r}")
+        finally:
+            metrics.flush()
+        return counts
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    # Set by serve()
+    ingester = None
+    secret = None
+    recorder = None
+    record_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, result, event=None):
+        metrics.incr("webhook_deliveries_total", event=event or "none", result=result)
+        body = json.dumps({"status": result}).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if urlparse(self.path).path != WEBHOOK_PATH:
+            return self._reply(404, "not_found")
+        if length > MAX_BODY_BYTES:
+            return self._reply(413, "too_large")
+        body = self.rfile.read(length)
+        event = self.headers.get("X-GitHub-Event")
+        delivery_id = self.headers.get("X-GitHub-Delivery")
+
+        if not verify_signature(self.secret, body, self.headers.get("X-Hub-Signature-256")):
+            return self._reply(401, "bad_signature", event)
+        if event == "ping":
+            return self._reply(200, "pong", event)
+        if event not in EVENTS:
+            return self._reply(202, "ignored", event)
+        try:
+            payload = json.loads(body)
+            tracked = is_tracked(event, payload)
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return self._reply(400, "bad_payload", event)
+        if not delivery_id:
+            return self._reply(400, "no_delivery_id", event)
+        if not tracked:
+            return self._reply(202, "ignored", event)
+        if not self.ingester.submit(delivery_id, event, payload):
+            return self._reply(200, "duplicate", event)
+
+        if self.recorder:
+            with self.record_lock:
+                self.recorder.write(json.dumps({"delivery": delivery_id, "event": event, "payload": payload}) + "\n")
+                self.recorder.flush()
+        self._reply(202, "queued", event)
+
+def serve(port=WEBHOOK_PORT, secret=WEBHOOK_SECRET, record=None, ingester=None):
+    """Starts the receiver on a background thread. Returns (server, ingester, url)."""
+    ingester = ingester or WebhookIngester()
+    ingester.start()
+    handler = type("BoundHandler", (WebhookHandler,), {
+        "ingester": ingester, "secret": secret, "recorder": open(record, "a") if record else None,
+    })
+    server = ThreadingHTTPServer(("", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, ingester, f"http://localhost:{server.server_address[1]}{WEBHOOK_PATH}"
+
+def replay(path, url, secret=WEBHOOK_SECRET):
+    """
+    POSTs recorded deliveries (JSON lines of delivery, event, payload) to a running
+    receiver, signed like GitHub signs them. Returns {status: count} of the replies.
+    """
+    session = requests.Session()
+    results = {}
+    with open(path, "r") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            body = json.dumps(record["payload"]).encode()
+            response = session.post(url, data=body, timeout=10, headers={
+                "Content-Type": "application/json",
+                "X-GitHub-Event": record["event"],
+                "X-GitHub-Delivery": record["delivery"],
+                "X-Hub-Signature-256": sign(secret, body),
+            })
+            status = response.json().get("status", response.status_code)
+            results[status] = results.get(status, 0) + 1
+    print(f"Replayed {sum(results.values())} deliveries to {url}: {results}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Receive GitHub workflow_run/workflow_job webhooks")
+    parser.add_argument("--port", type=int, default=WEBHOOK_PORT)
+    parser.add_argument("--record", metavar="FILE", help="Append every accepted delivery to FILE (JSON lines)")
+    parser.add_argument("--replay", metavar="FILE", help="POST the deliveries recorded in FILE to --url and exit")
+    parser.add_argument("--url", default=f"http://localhost:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+    args = parser.parse_args()
+
+    if not WEBHOOK_SECRET:
+        print("⚠️ WEBHOOK_SECRET not set. Refusing to accept unsigned deliveries.")
+        sys.exit(1)
+    if args.replay:
+        replay(args.replay, args.url)
+        sys.exit(0)
+
+    metrics.configure("webhook_server")
+    init_db()
+    server, ingester, url = serve(args.port, record=args.record)
+    print(f"Listening for GitHub webhooks at {url}")
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.set())
+    stopping.wait()
+    print("Shutting down, writing queued events...")
+    server.shutdown()
+    ingester.stop()
@@ -0,0 +1,119 @@
+# workload.py
+# Seeded synthetic CI history at any scale, for benchmarks and load tests:
+#   python workload.py --runs-per-job 10000 --jobs 5 --workflows 8
+import argparse
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+# Job name pool, handed out in order and suffixed once it runs out
+JOB_NAMES = [
+    "unit-test (amd64)", "unit-test (arm64)", "lint", "build (amd64)", "build (arm64)",
+    "e2e (fedora)", "e2e (ubuntu)", "nightly-e2e", "benchmarks", "experimental-isolation",
+]
+WORKFLOW_NAMES = ["CI", "Unit Tests", "Lint code", "E2E test", "Nightly Build", "Release", "Experimental", "Benchmarks"]
+
+def generate_runs(repos=1, workflows=4, jobs=3, runs_per_job=100, span_days=30,
+                  failure_rate=0.05, mean_streak=4, flake_rate=0.03, cancel_rate=0.01,
+                  seed=0, start_id=1, end=None):
+    """
+    Yields GitHub-shaped job rows, oldest first, for `repos` x `workflows` workflows of
+    `jobs` jobs each, every job running `runs_per_job` times over `span_days` days.
+
+    Each job is a two-state chain: a healthy job breaks with probability `failure_rate`
+    per run and then fails for `mean_streak` runs on average (real regressions); a
+    healthy run also fails on its own with probability `flake_rate` (flakes). The same
+    seed always produces the same rows, and ids are sequential from `start_id`, so
+    consecutive batches never collide. Rows are produced lazily, so millions of them
+    can be streamed straight into save_runs.
+    """
+    rng = random.Random(seed)
+    end = end or datetime(2026, 1, 1, tzinfo=timezone.utc)
+    start = end - timedelta(days=span_days)
+    step = timedelta(days=span_days) / max(runs_per_job, 1)
+
+    pipelines = []
+    # Job names are unique across workflows (the history is keyed on job name)
+    job_index = 0
+    for r in range(repos):
+        repo = f"containers/urunc-{r}" if repos > 1 else "containers/urunc"
+        for w in range(workflows):
+            name = WORKFLOW_NAMES[w % len(WORKFLOW_NAMES)] + (f" {w // len(WORKFLOW_NAMES)}" if w >= len(WORKFLOW_NAMES) else "")
+            job_names = []
+            for _ in range(jobs):
+                suffix = f" #{job_index // len(JOB_NAMES)}" if job_index >= len(JOB_NAMES) else ""
+                job_names.append(JOB_NAMES[job_index % len(JOB_NAMES)] + suffix)
+                job_index += 1
+            # Per-job chain state: True while in a failure streak
+            pipelines.append((repo, name, job_names, [False] * jobs))
+
+    next_id = start_id
+    for i in range(runs_per_job):
+        slot = start + step * i
+        for repo, name, job_names, broken in pipelines:
+            workflow_run_id = next_id
+            next_id += 1
+            created = (slot + timedelta(seconds=rng.uniform(0, step.total_seconds() * 0.9))).replace(microsecond=0)
+            sha = f"{rng.getrandbits(160):040x}"
+            branch = "main" if rng.random() < 0.8 else f"pr-{rng.randint(1, 500)}"
+            for j, job_name in enumerate(job_names):
+                if broken[j]:
+                    broken[j] = rng.random() >= 1 / mean_streak
+                else:
+                    broken[j] = rng.random() < failure_rate
+                if rng.random() < cancel_rate:
+                    conclusion = "cancelled"
+                elif broken[j] or rng.random() < flake_rate:
+                    conclusion = "failure"
+                else:
+                    conclusion = "success"
+                job_id = next_id
+                next_id += 1
+                # Jobs of one workflow run start a second apart
+                job_created = created + timedelta(seconds=j)
+                yield {
+                    "id": job_id,
+                    "run_id": workflow_run_id,
+                    "name": name,
+                    "job_name": job_name,
+                    "repository": repo,
+                    "status": "completed",
+                    "conclusion": conclusion,
+                    "created_at": job_created.isoformat().replace("+00:00", "Z"),
+                    "updated_at": (job_created + timedelta(seconds=rng.randint(60, 1800))).isoformat().replace("+00:00", "Z"),
+                    "head_sha": sha,
+                    "head_branch": branch,
+                    "html_url": f"https://github.com/{repo}/actions/runs/{workflow_run_id}/job/{job_id}",
+                }
+
+def workload_size(repos=1, workflows=4, jobs=3, runs_per_job=100):
+    """Number of rows generate_runs yields for these parameters."""
+    return repos * workflows * jobs * runs_per_job
+
+if __name__ == "__main__":
+    from database import init_db, save_runs, get_db_connection
+
+    parser = argparse.ArgumentParser(description="Load a seeded synthetic CI history into the database")
+    parser.add_argument("--repos", type=int, default=1)
+    parser.add_argument("--workflows", type=int, default=4)
+    parser.add_argument("--jobs", type=int, default=3)
+    parser.add_argument("--runs-per-job", type=int, default=100)
+    parser.add_argument("--span-days", type=int, default=30)
+    parser.add_argument("--failure-rate", type=float, default=0.05)
+    parser.add_argument("--flake-rate", type=float, default=0.03)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    init_db()
+    # Append after whatever is already stored
+    with get_db_connection() as conn:
+        start_id = conn.execute("SELECT COALESCE(MAX(run_id), 0) + 1 FROM workflow_runs").fetchone()[0]
+    size = workload_size(args.repos, args.workflows, args.jobs, args.runs_per_job)
+    start = time.perf_counter()
+    counts = save_runs(generate_runs(
+        repos=args.repos, workflows=args.workflows, jobs=args.jobs, runs_per_job=args.runs_per_job,
+        span_days=args.span_days, failure_rate=args.failure_rate, flake_rate=args.flake_rate, seed=args.seed,
+        start_id=start_id, end=datetime.now(timezone.utc)
+    ))
+    print(f"Generated {size:,} runs in {time.perf_counter() - start:.1f}s "
+          f"({counts['inserted']:,} inserted, {counts['updated']:,} updated).")